@@ -0,0 +1,142 @@
+from concurrent.futures import ThreadPoolExecutor
+from functools import wraps
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.handlers.asgi import ASGIHandler
+from django.db import close_old_connections, connections
+from rest_framework.routers import DefaultRouter
+
+READ_METHODS = ('GET', 'HEAD')
+END = object()
+
+_executor = None
+
+
+def get_executor():
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(
+            max_workers=settings.ASYNC_VIEWS_THREADS,
+            thread_name_prefix='async-views',
+        )
+    return _executor
+
+
+def run_read_view(view, request, *args, **kwargs):
+    """
+    Выполняет синхронное представление в потоке пула.
+    Соединения с БД потока проверяются и закрываются так же, как
+    сигналы request_started и request_finished делают это для обычных
+    запросов. Ответ рендерится здесь же, потоковый ответ
+    читает по частям StreamingASGIHandler.
+    """
+    close_old_connections()
+    try:
+        response = view(request, *args, **kwargs)
+        if hasattr(response, 'render') and callable(response.render):
+            response.render()
+        return response
+    finally:
+        close_old_connections()
+
+
+def close_streaming_response(response):
+    """Закрывает ответ и соединения с БД потока, который его читал."""
+    try:
+        response.close()
+    finally:
+        connections.close_all()
+
+
+class StreamingASGIHandler(ASGIHandler):
+    """
+    ASGI-обработчик, который читает потоковые ответы вне цикла событий.
+    Django 3.2 перебирает streaming_content прямо в цикле событий,
+    где обращаться к БД нельзя. Здесь каждая часть ответа читается
+    через sync_to_async в отдельном для ответа потоке: курсор БД,
+    открытый при чтении первой части, привязан к соединению этого
+    потока. В память попадает только текущая часть.
+    """
+
+    async def send_response(self, response, send):
+        if not response.streaming:
+            return await super().send_response(response, send)
+        headers = [
+            (str(header).encode('ascii'), str(value).encode('latin1'))
+            for header, value in response.items()
+        ]
+        headers.extend(
+            (b'Set-Cookie', cookie.output(header='').encode('ascii').strip())
+            for cookie in response.cookies.values()
+        )
+        await send({
+            'type': 'http.response.start',
+            'status': response.status_code,
+            'headers': headers,
+        })
+        executor = ThreadPoolExecutor(
+            max_workers=1, thread_name_prefix='async-stream'
+        )
+        parts = iter(response)
+        read = sync_to_async(next, thread_sensitive=False, executor=executor)
+        try:
+            while True:
+                part = await read(parts, END)
+                if part is END:
+                    break
+                for chunk, _ in self.chunk_bytes(part):
+                    await send({
+                        'type': 'http.response.body',
+                        'body': chunk,
+                        'more_body': True,
+                    })
+            await send({'type': 'http.response.body'})
+        finally:
+            await sync_to_async(
+                close_streaming_response, thread_sensitive=False,
+                executor=executor,
+            )(response)
+            executor.shutdown(wait=False)
+
+
+def async_read_view(view):
+    """
+    Асинхронная обёртка представления вьюсета.
+    GET-запросы к действиям из async_actions вьюсета выполняются
+    в отдельном пуле потоков (thread_sensitive=False) и не ждут друг
+    друга. Остальные запросы выполняются, как и без обёртки,
+    в общем потоке для синхронного кода.
+    """
+    read_action = view.actions.get('get')
+    if read_action not in view.cls.async_actions:
+        return view
+    run_sync = sync_to_async(view, thread_sensitive=True)
+
+    @wraps(view)
+    async def wrapper(request, *args, **kwargs):
+        if request.method not in READ_METHODS:
+            return await run_sync(request, *args, **kwargs)
+        return await sync_to_async(
+            run_read_view, thread_sensitive=False, executor=get_executor()
+        )(view, request, *args, **kwargs)
+
+    return wrapper
+
+
+class AsyncReadRouter(DefaultRouter):
+    """
+    Роутер, который при ASYNC_VIEWS = True (запуск через backend.asgi)
+    подключает действия из async_actions вьюсетов асинхронными
+    представлениями. Под WSGI представления остаются синхронными.
+    """
+
+    def get_urls(self):
+        urls = super().get_urls()
+        if not settings.ASYNC_VIEWS:
+            return urls
+        for url in urls:
+            view = url.callback
+            if getattr(getattr(view, 'cls', None), 'async_actions', None):
+                url.callback = async_read_view(view)
+        return urls
@@ -0,0 +1,188 @@
+import copy
+import hashlib
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+
+from recipes.models import FavoriteRecipe, Follow, ShopingCart
+from .replicas import record_write, replica_may_lag
+
+RECIPES_VERSION_KEY = 'recipes:version'
+RECIPES_CATALOG_VERSION_KEY = 'recipes:catalog:version'
+RECIPE_VERSION_KEY = 'recipes:version:{}'
+USER_FLAGS_VERSION_KEY = 'users:flags:version:{}'
+MODIFIED_KEY = '{}:modified'
+
+USER_FILTERS = ('is_favorited', 'is_in_shopping_cart', 'is_subscribed')
+
+
+def get_version(key):
+    """
+    Текущее значение счётчика версий.
+    Если счётчик вытеснен из кеша, он создаётся заново от текущего
+    времени, чтобы не совпасть со старыми версиями.
+    """
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, time.time_ns(), timeout=None)
+        version = cache.get(key)
+    return version
+
+
+def get_modified(key):
+    """
+    Время последнего увеличения счётчика версий key (Unix time).
+    Если время вытеснено из кеша, им становится текущее.
+    """
+    modified_key = MODIFIED_KEY.format(key)
+    modified = cache.get(modified_key)
+    if modified is None:
+        cache.add(modified_key, time.time(), timeout=None)
+        modified = cache.get(modified_key)
+    return modified
+
+
+def get_versions(keys):
+    """
+    Версии и время изменения счётчиков keys одним обращением к кешу.
+    Возвращает два списка в порядке keys.
+    """
+    modified_keys = [MODIFIED_KEY.format(key) for key in keys]
+    values = cache.get_many([*keys, *modified_keys])
+    versions = [values.get(key) or get_version(key) for key in keys]
+    modified = [
+        values.get(modified_key) or get_modified(key)
+        for key, modified_key in zip(keys, modified_keys)
+    ]
+    return versions, modified
+
+
+def bump_version(key):
+    """
+    Увеличивает счётчик версий, делая устаревшими ключи на его основе,
+    и запоминает время изменения для заголовка Last-Modified.
+    Возвращает новое значение счётчика.
+    """
+    cache.set(MODIFIED_KEY.format(key), time.time(), timeout=None)
+    try:
+        return cache.incr(key)
+    except ValueError:
+        cache.add(key, time.time_ns(), timeout=None)
+        return cache.get(key)
+
+
+def bump_recipe_version(recipe_id=None):
+    """Сбрасывает кеш списков и, если передан id, кеш одного рецепта."""
+    record_write()
+    bump_version(RECIPES_VERSION_KEY)
+    if recipe_id is not None:
+        bump_version(RECIPE_VERSION_KEY.format(recipe_id))
+
+
+def bump_catalog_version():
+    """Сбрасывает кеш всех рецептов, например при изменении тегов."""
+    record_write()
+    bump_version(RECIPES_VERSION_KEY)
+    bump_version(RECIPES_CATALOG_VERSION_KEY)
+
+
+def bump_user_flags_version(user_id):
+    """
+    Отмечает изменение избранного, корзины или подписок пользователя:
+    от них зависят флаги is_favorited, is_in_shopping_cart
+    и is_subscribed в ответах для него.
+    """
+    bump_version(USER_FLAGS_VERSION_KEY.format(user_id))
+
+
+def _digest(request, params):
+    data = '&'.join(
+        f'{name}={",".join(sorted(params.getlist(name)))}'
+        for name in sorted(params)
+    )
+    return hashlib.md5(
+        f'{request.scheme}://{request.get_host()}?{data}'.encode()
+    ).hexdigest()
+
+
+def recipe_list_cache_key(request, state=''):
+    """
+    Ключ кеша для списка рецептов.
+    Строится из параметров запроса, общей версии рецептов и состояния
+    state подходящих рецептов (см. conditional.Validators).
+    Для фильтров, зависящих от пользователя, кеш не используется.
+    """
+    params = request.query_params
+    if any(name in params for name in USER_FILTERS):
+        return None
+    version = get_version(RECIPES_VERSION_KEY)
+    return f'recipes:list:{version}:{state}:{_digest(request, params)}'
+
+
+def recipe_detail_cache_key(request, pk, state=''):
+    """Ключ кеша для одного рецепта с состоянием его строки state."""
+    versions = cache.get_many([
+        RECIPE_VERSION_KEY.format(pk), RECIPES_CATALOG_VERSION_KEY
+    ])
+    recipe_version = (
+        versions.get(RECIPE_VERSION_KEY.format(pk))
+        or get_version(RECIPE_VERSION_KEY.format(pk))
+    )
+    catalog_version = (
+        versions.get(RECIPES_CATALOG_VERSION_KEY)
+        or get_version(RECIPES_CATALOG_VERSION_KEY)
+    )
+    return (
+        f'recipes:detail:{pk}:{recipe_version}:{catalog_version}:{state}:'
+        f'{_digest(request, request.query_params)}'
+    )
+
+
+def cache_recipes(key, data):
+    """
+    Сохраняет ответ в кеш без флагов текущего пользователя,
+    чтобы одной записью можно было пользоваться для всех.
+    Ответ, прочитанный с реплики сразу после изменения рецептов,
+    не кешируется: реплика могла ещё не получить изменение.
+    """
+    if replica_may_lag():
+        return
+    data = copy.deepcopy(data)
+    recipes = data['results'] if 'results' in data else [data]
+    for recipe in recipes:
+        recipe['is_favorited'] = False
+        recipe['is_in_shopping_cart'] = False
+        recipe['author']['is_subscribed'] = False
+    cache.set(key, data, timeout=settings.RECIPES_CACHE_TIMEOUT)
+
+
+def merge_user_flags(data, user):
+    """
+    Проставляет в ответ из кеша флаги is_favorited, is_in_shopping_cart
+    и is_subscribed текущего пользователя. Для всех рецептов страницы
+    выполняется по одному запросу на каждый флаг.
+    """
+    if not user.is_authenticated:
+        return data
+
+    recipes = data['results'] if 'results' in data else [data]
+    recipe_ids = [recipe['id'] for recipe in recipes]
+    author_ids = {recipe['author']['id'] for recipe in recipes}
+    favorited = set(FavoriteRecipe.objects.filter(
+        user=user, recipe_id__in=recipe_ids
+    ).values_list('recipe_id', flat=True))
+    in_shopping_cart = set(ShopingCart.objects.filter(
+        user=user, recipe_id__in=recipe_ids
+    ).values_list('recipe_id', flat=True))
+    subscribed = set(Follow.objects.filter(
+        user=user, author_id__in=author_ids
+    ).values_list('author_id', flat=True))
+
+    for recipe in recipes:
+        recipe['is_favorited'] = recipe['id'] in favorited
+        recipe['is_in_shopping_cart'] = recipe['id'] in in_shopping_cart
+        recipe['author']['is_subscribed'] = (
+            recipe['author']['id'] in subscribed
+        )
+    return data
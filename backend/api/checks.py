@@ -0,0 +1,81 @@
+from django.conf import settings
+from django.core.checks import Warning, register
+
+PGBOUNCER_PORT = '6432'
+HEALTH_CHECK_ENGINE = 'backend.postgresql'
+# Кеши, которые каждый процесс хранит у себя: версии кеша, увеличенные
+# в одном процессе, другие процессы не видят.
+PER_PROCESS_CACHES = ('django.core.cache.backends.locmem.LocMemCache',)
+
+
+@register()
+def check_database_connections(app_configs, **kwargs):
+    """
+    Предупреждает о настройках соединений с PostgreSQL,
+    при которых каждый запрос платит за установку соединения
+    или падает после перезапуска БД и pgbouncer.
+    """
+    messages = []
+    for alias, database in settings.DATABASES.items():
+        engine = database.get('ENGINE', '')
+        if 'postgresql' not in engine:
+            continue
+        max_age = database.get('CONN_MAX_AGE', 0)
+        health_checks = database.get('CONN_HEALTH_CHECKS', False)
+
+        if max_age == 0 and not settings.DEBUG:
+            messages.append(Warning(
+                f'{alias}: постоянные соединения с БД отключены, '
+                'каждый запрос открывает новое соединение.',
+                hint='Задайте DB_CONN_MAX_AGE, например 60.',
+                id='api.W001',
+            ))
+        if health_checks and engine != HEALTH_CHECK_ENGINE:
+            messages.append(Warning(
+                f'{alias}: CONN_HEALTH_CHECKS в Django 3.2 поддерживается '
+                f'только движком {HEALTH_CHECK_ENGINE}.',
+                hint=f"Укажите 'ENGINE': '{HEALTH_CHECK_ENGINE}'.",
+                id='api.W002',
+            ))
+        if max_age != 0 and not health_checks:
+            messages.append(Warning(
+                f'{alias}: постоянные соединения не проверяются, после '
+                'перезапуска БД первый запрос каждого процесса завершится '
+                'ошибкой.',
+                hint='Задайте DB_CONN_HEALTH_CHECKS=True.',
+                id='api.W003',
+            ))
+        if (
+            str(database.get('PORT')) == PGBOUNCER_PORT
+            and not database.get('DISABLE_SERVER_SIDE_CURSORS')
+        ):
+            messages.append(Warning(
+                f'{alias}: порт {PGBOUNCER_PORT} обычно принадлежит '
+                'pgbouncer, а серверные курсоры не отключены. В режиме '
+                'pool_mode = transaction запросы с iterator() будут '
+                'падать.',
+                hint='Задайте DB_PGBOUNCER=True.',
+                id='api.W004',
+            ))
+    return messages
+
+
+@register()
+def check_shared_cache(app_configs, **kwargs):
+    """
+    Предупреждает о кеше, не общем для процессов: воркеры gunicorn,
+    обработчики задач и команды управления сбрасывают версии кеша
+    ответов, индексов и привязки к основной БД только у себя.
+    """
+    if settings.DEBUG:
+        return []
+    return [
+        Warning(
+            f'{alias}: кеш {cache["BACKEND"]} хранится в памяти процесса, '
+            'другие процессы продолжат отдавать устаревшие данные.',
+            hint='Задайте CACHE_BACKEND и CACHE_LOCATION, например Redis.',
+            id='api.W005',
+        )
+        for alias, cache in settings.CACHES.items()
+        if cache.get('BACKEND') in PER_PROCESS_CACHES
+    ]
@@ -0,0 +1,143 @@
+import hashlib
+from collections import namedtuple
+from datetime import datetime
+
+from django.conf import settings
+from django.db.models import Count, Max
+from django.utils.cache import (
+    get_conditional_response, patch_cache_control, patch_vary_headers)
+from django.utils.http import http_date, quote_etag
+
+from recipes.models import Recipe
+from .cache import (
+    RECIPE_VERSION_KEY, RECIPES_CATALOG_VERSION_KEY, RECIPES_VERSION_KEY,
+    USER_FLAGS_VERSION_KEY, _digest, get_versions)
+
+# public - ответ не зависит от пользователя, и его могут хранить
+# общие кеши (nginx). Иначе ответ хранит только клиент
+# и перепроверяет его при каждом запросе.
+# state - состояние строк в БД, от которого зависит ETag. Оно входит
+# и в ключ кеша ответа: счётчики меняют updated_at без сброса версий кеша.
+Validators = namedtuple(
+    'Validators', 'etag last_modified public state', defaults=('',)
+)
+
+
+def _timestamp(value):
+    if isinstance(value, datetime):
+        return value.timestamp()
+    return value
+
+
+def make_validators(request, parts, timestamps, public=True, state=''):
+    """
+    ETag из частей parts и параметров запроса,
+    Last-Modified - самое позднее из timestamps.
+    """
+    data = '|'.join(str(part) for part in parts)
+    etag = quote_etag(hashlib.md5(
+        f'{data}|{_digest(request, request.query_params)}'.encode()
+    ).hexdigest())
+    last_modified = max(
+        _timestamp(timestamp) for timestamp in timestamps
+        if timestamp is not None
+    )
+    return Validators(etag, int(last_modified), public, state)
+
+
+def recipes_state(request, keys):
+    """
+    Версии кеша keys и, для авторизованного пользователя, версия его
+    избранного, корзины и подписок: от них зависят флаги в ответе.
+    """
+    user = request.user
+    if user.is_authenticated:
+        keys = [*keys, USER_FLAGS_VERSION_KEY.format(user.id)]
+    versions, modified = get_versions(keys)
+    return [user.id, *versions], modified
+
+
+def recipes_validators(request, queryset):
+    """
+    Валидаторы списка рецептов: время последнего изменения и число
+    рецептов, подходящих под фильтры запроса (один агрегирующий запрос
+    без сериализации), и версии кеша рецептов и справочников.
+    """
+    stats = queryset.order_by().values('pk').aggregate(
+        last=Max('updated_at'), total=Count('pk')
+    )
+    parts, timestamps = recipes_state(
+        request, [RECIPES_VERSION_KEY, RECIPES_CATALOG_VERSION_KEY]
+    )
+    return make_validators(
+        request, [stats['last'], stats['total'], *parts],
+        [stats['last'], *timestamps],
+        public=not request.user.is_authenticated,
+        state=f"{_timestamp(stats['last'])}:{stats['total']}",
+    )
+
+
+def recipe_validators(request, pk):
+    """Валидаторы одного рецепта. None, если рецепта нет."""
+    try:
+        pk = int(pk)
+    except ValueError:
+        return None
+    updated_at = Recipe.objects.filter(pk=pk).values_list(
+        'updated_at', flat=True
+    ).first()
+    if updated_at is None:
+        return None
+    parts, timestamps = recipes_state(
+        request, [RECIPE_VERSION_KEY.format(pk), RECIPES_CATALOG_VERSION_KEY]
+    )
+    return make_validators(
+        request, [pk, updated_at, *parts], [updated_at, *timestamps],
+        public=not request.user.is_authenticated,
+        state=_timestamp(updated_at),
+    )
+
+
+def catalog_validators(request, queryset):
+    """
+    Валидаторы списка тегов: время последнего изменения и число строк.
+    Удаление учитывается через время изменения справочников.
+    """
+    stats = queryset.order_by().aggregate(
+        last=Max('updated_at'), total=Count('pk')
+    )
+    _, modified = get_versions([RECIPES_CATALOG_VERSION_KEY])
+    return make_validators(
+        request, [stats['last'], stats['total']], [stats['last'], *modified]
+    )
+
+
+def object_validators(request, obj):
+    """Валидаторы одного тега или ингредиента."""
+    return make_validators(request, [obj.pk, obj.updated_at], [obj.updated_at])
+
+
+def conditional_response(request, validators, build):
+    """
+    Отдаёт 304, если If-None-Match или If-Modified-Since запроса
+    совпадают с validators, иначе ответ build(). В оба ответа
+    добавляются ETag, Last-Modified и Cache-Control.
+    """
+    response = get_conditional_response(
+        request, etag=validators.etag, last_modified=validators.last_modified
+    )
+    if response is None:
+        response = build()
+    if response.status_code not in (200, 304):
+        return response
+
+    response['ETag'] = validators.etag
+    response['Last-Modified'] = http_date(validators.last_modified)
+    if validators.public:
+        patch_cache_control(
+            response, public=True, max_age=settings.HTTP_CACHE_MAX_AGE
+        )
+    else:
+        patch_cache_control(response, private=True, no_cache=True)
+    patch_vary_headers(response, ('Authorization',))
+    return response
@@ -0,0 +1,54 @@
+import binascii
+import re
+import uuid
+
+from django.core.files.uploadedfile import TemporaryUploadedFile
+from drf_base64.fields import Base64ImageField
+
+# Символы вне алфавита base64 (переносы строк, пробелы), которые
+# base64.b64decode, как и a2b_base64, пропускает.
+NOT_BASE64 = re.compile(r'[^A-Za-z0-9+/=]')
+
+
+class RecipeImageField(Base64ImageField):
+    """
+    Поле для изображения рецепта в base64.
+    Строка декодируется порциями сразу во временный файл на диске,
+    поэтому раскодированное изображение не хранится в памяти целиком.
+    Порция декодируется целыми группами по 4 символа без переносов
+    строк, остаток переходит в следующую.
+    Уменьшенные копии создаются позже фоновой задачей (api.images).
+    """
+    chunk_size = 4 * 64 * 1024
+
+    def _decode(self, data):
+        if not (isinstance(data, str) and data.startswith('data:')):
+            return super()._decode(data)
+
+        header, _, encoded = data.partition(';base64,')
+        if not encoded:
+            self.fail('invalid')
+        ext = header.split('/')[-1]
+        file = TemporaryUploadedFile(
+            name=f'{uuid.uuid4()}.{ext}',
+            content_type=header[len('data:'):],
+            size=None,
+            charset=None,
+        )
+        rest = ''
+        try:
+            for start in range(0, len(encoded), self.chunk_size):
+                chunk = rest + NOT_BASE64.sub(
+                    '', encoded[start:start + self.chunk_size]
+                )
+                end = len(chunk) - len(chunk) % 4
+                file.write(binascii.a2b_base64(chunk[:end]))
+                rest = chunk[end:]
+            if rest:
+                file.write(binascii.a2b_base64(rest))
+        except binascii.Error:
+            file.close()
+            self.fail('invalid')
+        file.size = file.tell()
+        file.seek(0)
+        return file
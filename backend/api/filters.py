@@ -1,7 +1,14 @@
+from django.contrib.postgres.search import SearchQuery, SearchRank
+from django.db import connections
+from django.db.models import (
+    Case, Exists, F, FloatField, OuterRef, Q, Value, When)
 from django_filters import rest_framework as filters
 from rest_framework.filters import OrderingFilter
 
-from recipes.models import FavoriteRecipe, Ingredient, Recipe, ShopingCart, Tag
+from recipes.models import (
+    SEARCH_CONFIG, FavoriteRecipe, Ingredient, IngredientInRecipe, Recipe,
+    ShopingCart, Tag
+)
 
 
 class IngredientsFilter(filters.FilterSet):
@@ -32,6 +39,11 @@ class RecipeFilter(filters.FilterSet):
     is_subscribed = filters.BooleanFilter(
         method='filter_is_subscribed'
     )
+    search = filters.CharFilter(method='filter_search')
+    max_kcal = filters.NumberFilter(field_name='total_kcal', lookup_expr='lte')
+    max_price = filters.NumberFilter(
+        field_name='total_price', lookup_expr='lte'
+    )
 
     class Meta:
         model = Recipe
@@ -57,8 +69,93 @@ class RecipeFilter(filters.FilterSet):
         user = self.request.user
         return queryset.filter(author=user)
 
+    def filter_search(self, queryset, name, value):
+        """
+        Полнотекстовый поиск по названию, описанию и ингредиентам.
+        В PostgreSQL используется столбец search_vector с GIN индексом,
+        который поддерживают триггеры, а результаты ранжируются
+        по релевантности (аннотация rank).
+        На других СУБД поиск выполняется через icontains,
+        совпадения в названии ставятся выше.
+        """
+        value = value.strip()
+        if not value:
+            return queryset
+
+        if connections[queryset.db].vendor == 'postgresql':
+            query = SearchQuery(
+                value, config=SEARCH_CONFIG, search_type='websearch'
+            )
+            return queryset.filter(search_vector=query).annotate(
+                rank=SearchRank(F('search_vector'), query)
+            )
+
+        in_ingredients = Exists(IngredientInRecipe.objects.filter(
+            recipe=OuterRef('pk'), ingredient__name__icontains=value
+        ))
+        return queryset.filter(
+            Q(name__icontains=value) | Q(text__icontains=value)
+            | in_ingredients
+        ).annotate(rank=Case(
+            When(name__icontains=value, then=Value(1.0)),
+            default=Value(0.1),
+            output_field=FloatField(),
+        ))
+
 
 class RecipeOrderingFilter(OrderingFilter):
+    """
+    Сортировка рецептов параметром ordering.
+    Для одинаковых значений рецепты дополнительно упорядочиваются
+    по убыванию ID, чтобы страницы не пересекались.
+    Значения popular и trending сортируют по оценкам из таблицы
+    RecipeScore (-popular - сначала популярные). Оценка есть у каждого
+    рецепта, поэтому таблицы соединяются внутренним JOIN, а страница
+    читается по индексу оценок. Оценки добавляются в queryset
+    аннотацией, поэтому с ними работает и курсорная пагинация.
+    При поиске без явной сортировки рецепты идут по релевантности.
+    """
+    ordering_fields = (
+        'id', 'name', 'cooking_time', 'favorites_count', 'in_carts_count',
+        'total_kcal', 'total_price', 'popular', 'trending',
+    )
+    score_orderings = {
+        'popular': 'popular_score',
+        'trending': 'trending_score',
+    }
+
+    def get_ordering(self, request, queryset, view):
+        if (
+            request.query_params.get('search', '').strip()
+            and not request.query_params.get(self.ordering_param)
+        ):
+            return ['-rank', '-id']
+        ordering = []
+        tie_breaker = '-id'
+        for field in super().get_ordering(request, queryset, view):
+            name = field.lstrip('-')
+            if name in self.score_orderings:
+                # При равных оценках id идёт в ту же сторону, что и
+                # оценка: порядок совпадает с индексом (-оценка, -рецепт)
+                # при прямом или обратном проходе.
+                sign = field[:-len(name)]
+                field = sign + self.score_orderings[name]
+                tie_breaker = sign + 'id'
+            ordering.append(field)
+        if not any(field.lstrip('-') == 'id' for field in ordering):
+            ordering.append(tie_breaker)
+        return ordering
+
+    def filter_queryset(self, request, queryset, view):
+        ordering = self.get_ordering(request, queryset, view)
+        fields = {field.lstrip('-') for field in ordering}
+        for name, annotation in self.score_orderings.items():
+            if annotation in fields:
+                queryset = queryset.filter(score__isnull=False).annotate(
+                    **{annotation: F(f'score__{name}')}
+                )
+        return queryset.order_by(*ordering)
+
     def get_default_ordering(self, view):
         """
         Определяет значение сортировки по умолчанию.
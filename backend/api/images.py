@@ -0,0 +1,91 @@
+import io
+import os
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.utils import timezone
+from PIL import Image, ImageOps
+
+from recipes.models import Recipe
+from tasks.queue import task
+from .cache import bump_recipe_version
+
+
+def get_image_formats():
+    """Форматы копий, которые поддерживает установленный Pillow."""
+    Image.init()
+    return [
+        image_format for image_format in settings.RECIPE_IMAGE_FORMATS
+        if image_format.upper() in Image.SAVE
+    ]
+
+
+def variants_outdated(recipe):
+    """Проверяет, нужно ли заново строить копии изображения."""
+    return bool(recipe.image) and (
+        recipe.image_variants.get('source') != recipe.image.name
+    )
+
+
+def schedule_image_variants(recipe_id):
+    """
+    Ставит построение уменьшенных копий изображения в очередь фоновых
+    задач. Повторные изменения рецепта, пока задача ждёт в очереди,
+    новых задач не создают: копии строятся по изображению на момент
+    запуска.
+    """
+    build_image_variants.enqueue(
+        key=f'recipe-image-variants:{recipe_id}', recipe_id=recipe_id
+    )
+
+
+@task()
+def build_image_variants(recipe_id):
+    """
+    Строит уменьшенные копии изображения рецепта для всех размеров
+    из RECIPE_IMAGE_VARIANTS и форматов из RECIPE_IMAGE_FORMATS
+    и сохраняет пути к ним в Recipe.image_variants.
+    """
+    recipe = Recipe.objects.filter(id=recipe_id).first()
+    if recipe is None or not variants_outdated(recipe):
+        return
+
+    source = recipe.image.name
+    stem = os.path.splitext(os.path.basename(source))[0]
+    variants = {'source': source}
+    with recipe.image.open('rb') as file, Image.open(file) as image:
+        image = ImageOps.exif_transpose(image)
+        if image.mode not in ('RGB', 'RGBA'):
+            mode = 'RGBA' if 'A' in image.getbands() else 'RGB'
+            image = image.convert(mode)
+        for name, size in settings.RECIPE_IMAGE_VARIANTS.items():
+            variant = image.copy()
+            variant.thumbnail(size, Image.LANCZOS)
+            variants[name] = {}
+            for image_format in get_image_formats():
+                buffer = io.BytesIO()
+                variant.save(buffer, image_format.upper(), quality=80)
+                variants[name][image_format] = default_storage.save(
+                    f'recipes/variants/{stem}_{name}.{image_format}',
+                    ContentFile(buffer.getvalue())
+                )
+
+    updated = Recipe.objects.filter(id=recipe_id, image=source).update(
+        image_variants=variants, updated_at=timezone.now()
+    )
+    if not updated:
+        delete_image_variants(variants)
+        return
+    delete_image_variants(recipe.image_variants)
+    bump_recipe_version(recipe_id)
+
+
+@task()
+def delete_image_variants(variants):
+    """Удаляет файлы уменьшенных копий."""
+    for name, formats in variants.items():
+        if name == 'source':
+            continue
+        for path in formats.values():
+            default_storage.delete(path)
@@ -0,0 +1,247 @@
+import threading
+from array import array
+from bisect import bisect_left
+from collections import Counter, defaultdict
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Max
+
+from recipes.models import Ingredient, IngredientInRecipe
+from .cache import bump_version, get_version
+from .replicas import read_from_primary
+
+INGREDIENTS_VERSION_KEY = 'ingredients:version'
+
+
+class IngredientIndex:
+    """
+    Индекс названий ингредиентов в памяти процесса.
+    Названия в нижнем регистре хранятся в отсортированном списке,
+    поиск по началу названия выполняется через bisect.
+    Индекс строится при первом обращении и перестраивается,
+    когда меняется версия ингредиентов в общем кеше.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._version = None
+        self._index = ([], [])
+        self.updated_at = None
+
+    def refresh(self):
+        """
+        Перестраивает индекс, если ингредиенты изменились.
+        Возвращает актуальную версию индекса.
+        """
+        version = get_version(INGREDIENTS_VERSION_KEY)
+        if version != self._version:
+            with self._lock, read_from_primary():
+                if version != self._version:
+                    self._build(version)
+        return version
+
+    def _build(self, version):
+        ingredients = sorted(
+            Ingredient.objects.values('id', 'name', 'measurement_unit'),
+            key=lambda item: (item['name'].lower(), item['id'])
+        )
+        names = [item['name'].lower() for item in ingredients]
+        self._index = (names, ingredients)
+        self.updated_at = Ingredient.objects.aggregate(
+            last=Max('updated_at')
+        )['last']
+        self._version = version
+
+    def search(self, name=''):
+        """
+        Ингредиенты, название которых содержит name.
+        Сначала идут совпадения по началу названия,
+        затем совпадения по вхождению в середину.
+        """
+        names, ingredients = self._index
+        name = name.lower()
+        if not name:
+            return list(ingredients)
+
+        start = bisect_left(names, name)
+        end = bisect_left(names, name + '\U0010ffff', start)
+        substring_matches = [
+            ingredient
+            for ingredient_name, ingredient in zip(names, ingredients)
+            if name in ingredient_name
+            and not ingredient_name.startswith(name)
+        ]
+        return ingredients[start:end] + substring_matches
+
+
+def invalidate_ingredient_index():
+    """Сбрасывает индекс ингредиентов во всех процессах."""
+    bump_version(INGREDIENTS_VERSION_KEY)
+
+
+ingredient_index = IngredientIndex()
+
+
+RECIPE_INGREDIENTS_VERSION_KEY = 'recipes:ingredients:version'
+RECIPE_INGREDIENTS_CHANGE_KEY = 'recipes:ingredients:change:{}'
+
+
+class RecipeIngredientIndex:
+    """
+    Обратный индекс ингредиентов рецептов в памяти процесса
+    для подбора рецептов по имеющимся ингредиентам.
+    Для каждого ингредиента хранится отсортированный массив id рецептов,
+    для каждого рецепта - массив id его ингредиентов.
+    Изменения рецептов записываются в общий кеш под номерами версий,
+    и процессы применяют их к своему индексу по отдельности.
+    Если часть изменений вытеснена из кеша или их слишком много,
+    индекс строится заново.
+    """
+    max_changes = 1000
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._version = None
+        self._postings = {}
+        self._recipes = {}
+
+    def refresh(self):
+        """
+        Применяет изменения рецептов из кеша или строит индекс заново.
+        Возвращает актуальную версию индекса.
+        """
+        version = get_version(RECIPE_INGREDIENTS_VERSION_KEY)
+        if version == self._version:
+            return version
+        with self._lock, read_from_primary():
+            if version == self._version:
+                return version
+            if not self._apply_changes(version):
+                self._build(version)
+        return version
+
+    def _apply_changes(self, version):
+        if self._version is None:
+            return False
+        if not 0 < version - self._version <= self.max_changes:
+            return False
+        keys = [
+            RECIPE_INGREDIENTS_CHANGE_KEY.format(number)
+            for number in range(self._version + 1, version + 1)
+        ]
+        changes = cache.get_many(keys)
+        if len(changes) != len(keys):
+            return False
+        self._update(set(changes.values()))
+        self._version = version
+        return True
+
+    def _build(self, version):
+        postings = defaultdict(list)
+        recipes = defaultdict(list)
+        for recipe_id, ingredient_id in IngredientInRecipe.objects.order_by(
+            'recipe_id'
+        ).values_list('recipe_id', 'ingredient_id').iterator():
+            postings[ingredient_id].append(recipe_id)
+            recipes[recipe_id].append(ingredient_id)
+        self._postings = {
+            ingredient_id: array('q', recipe_ids)
+            for ingredient_id, recipe_ids in postings.items()
+        }
+        self._recipes = {
+            recipe_id: array('q', ingredient_ids)
+            for recipe_id, ingredient_ids in recipes.items()
+        }
+        self._version = version
+
+    def _update(self, recipe_ids):
+        """
+        Заменяет ингредиенты рецептов recipe_ids актуальными из БД.
+        Массивы не меняются на месте, а заменяются новыми, чтобы
+        параллельный поиск в других потоках видел согласованные данные.
+        """
+        current = defaultdict(list)
+        for recipe_id, ingredient_id in IngredientInRecipe.objects.filter(
+            recipe_id__in=recipe_ids
+        ).values_list('recipe_id', 'ingredient_id'):
+            current[recipe_id].append(ingredient_id)
+
+        removed, added = defaultdict(set), defaultdict(set)
+        for recipe_id in recipe_ids:
+            old = set(self._recipes.get(recipe_id, ()))
+            new = set(current.get(recipe_id, ()))
+            for ingredient_id in old - new:
+                removed[ingredient_id].add(recipe_id)
+            for ingredient_id in new - old:
+                added[ingredient_id].add(recipe_id)
+            if new:
+                self._recipes[recipe_id] = array('q', sorted(new))
+            else:
+                self._recipes.pop(recipe_id, None)
+
+        for ingredient_id in removed.keys() | added.keys():
+            recipe_ids = (
+                set(self._postings.get(ingredient_id, ()))
+                - removed[ingredient_id]
+            ) | added[ingredient_id]
+            if recipe_ids:
+                self._postings[ingredient_id] = array('q', sorted(recipe_ids))
+            else:
+                self._postings.pop(ingredient_id, None)
+
+    def match(self, ingredient_ids, max_missing=None):
+        """
+        Рецепты, в которых есть хотя бы один из ингредиентов ingredient_ids.
+        Возвращает список пар (id рецепта, число недостающих ингредиентов),
+        отсортированный по числу недостающих, затем по убыванию id.
+        """
+        hits = Counter()
+        for ingredient_id in set(ingredient_ids):
+            hits.update(self._postings.get(ingredient_id, ()))
+
+        recipes = self._recipes
+        matches = []
+        for recipe_id, count in hits.items():
+            ingredients = recipes.get(recipe_id)
+            if ingredients is None:
+                continue
+            missing = len(ingredients) - count
+            if max_missing is None or missing <= max_missing:
+                matches.append((missing, -recipe_id))
+        matches.sort()
+        return [(-recipe_id, missing) for missing, recipe_id in matches]
+
+    def missing_ingredients(self, recipe_id, ingredient_ids):
+        """id ингредиентов рецепта, которых нет среди ingredient_ids."""
+        ingredient_ids = set(ingredient_ids)
+        return [
+            ingredient_id
+            for ingredient_id in self._recipes.get(recipe_id, ())
+            if ingredient_id not in ingredient_ids
+        ]
+
+
+def record_recipe_ingredients_change(recipe_id):
+    """
+    Сообщает индексам всех процессов, что ингредиенты рецепта
+    изменились. Вызывается после фиксации транзакции.
+    """
+    version = bump_version(RECIPE_INGREDIENTS_VERSION_KEY)
+    cache.set(
+        RECIPE_INGREDIENTS_CHANGE_KEY.format(version), recipe_id,
+        timeout=settings.RECIPE_INGREDIENTS_CHANGES_TIMEOUT
+    )
+
+
+def invalidate_recipe_ingredient_index():
+    """
+    Заставляет процессы построить индекс заново, например после
+    массовой загрузки рецептов через bulk_create, где сигналы
+    не отправляются. Новая версия без записи изменений
+    не может быть применена по частям.
+    """
+    bump_version(RECIPE_INGREDIENTS_VERSION_KEY)
+
+
+recipe_ingredient_index = RecipeIngredientIndex()
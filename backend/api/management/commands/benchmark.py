@@ -0,0 +1,284 @@
+import json
+import statistics
+import time
+import tracemalloc
+from collections import namedtuple
+
+from django.core.management.base import CommandError
+from django.db import connection
+from django.utils import timezone
+from rest_framework.test import APIRequestFactory
+
+from api.cache import bump_catalog_version
+from recipes.models import IngredientInRecipe, Recipe, Tag
+from .explain_hot_queries import Command as ExplainCommand
+
+# cold - перед каждым повтором кеш рецептов сбрасывается,
+# и замеряется построение ответа из БД.
+Scenario = namedtuple('Scenario', 'name path max_queries cold')
+# Пик памяти одного запроса заметно колеблется (сборка мусора,
+# ленивые кеши), поэтому берётся наименьший из нескольких замеров.
+MEMORY_RUNS = 3
+
+
+class Command(ExplainCommand):
+    help = (
+        'Замеряет время ответа, число запросов к БД и пиковую память '
+        'основных эндпоинтов API. Падает, если превышен бюджет запросов '
+        'или результат хуже сохранённого базового (--baseline). '
+        'Рассчитана на данные, созданные командой seed_perf.'
+    )
+
+    def add_arguments(self, parser):
+        super().add_arguments(parser)
+        parser.add_argument(
+            '--repeat', type=int, default=20,
+            help='Число замеров каждого эндпоинта.'
+        )
+        parser.add_argument(
+            '--warmup', type=int, default=2,
+            help='Число прогонов перед замерами.'
+        )
+        parser.add_argument(
+            '--baseline',
+            help='JSON с базовыми результатами для сравнения.'
+        )
+        parser.add_argument(
+            '--save-baseline',
+            help='Сохранить результаты в JSON как базовые.'
+        )
+        parser.add_argument(
+            '--queries-only', action='store_true',
+            help='Сравнивать с базовыми только число запросов к БД.'
+        )
+        parser.add_argument(
+            '--tolerance', type=float, default=0.25,
+            help='Допустимое ухудшение времени и памяти (0.25 - на 25%%).'
+        )
+        parser.add_argument(
+            '--min-regression-ms', type=float, default=2.0,
+            help='Меньшие ухудшения медианы не считаются регрессией.'
+        )
+
+    def get_scenarios(self, user):
+        """
+        Сценарии для всех эндпоинтов api/urls.py.
+        Бюджет запросов - верхняя граница, не зависящая от объёма данных.
+        """
+        recipe = Recipe.objects.order_by('-favorites_count', '-id').first()
+        if recipe is None:
+            raise CommandError('В базе нет рецептов, запустите seed_perf.')
+        tags = list(Tag.objects.order_by('id').values_list('slug', flat=True))
+        ingredient_ids = ','.join(str(ingredient_id) for ingredient_id in (
+            IngredientInRecipe.objects.filter(recipe=recipe).values_list(
+                'ingredient_id', flat=True
+            )[:5]
+        ))
+        word = recipe.name.split()[0]
+        recipes = '/api/recipes/'
+        return [
+            Scenario('recipes', recipes, 6, True),
+            Scenario('recipes-cached', recipes, 4, False),
+            Scenario('recipes-page-100', f'{recipes}?page=100', 6, True),
+            Scenario('recipes-cursor', f'{recipes}?cursor=', 5, True),
+            Scenario(
+                'recipes-tags', f'{recipes}?tags={"&tags=".join(tags[:2])}',
+                7, True
+            ),
+            Scenario(
+                'recipes-author', f'{recipes}?author={recipe.author_id}',
+                7, True
+            ),
+            Scenario(
+                'recipes-favorited', f'{recipes}?is_favorited=1', 7, True
+            ),
+            Scenario(
+                'recipes-in-cart', f'{recipes}?is_in_shopping_cart=1',
+                7, True
+            ),
+            Scenario('recipes-search', f'{recipes}?search={word}', 6, True),
+            Scenario(
+                'recipes-popular', f'{recipes}?ordering=-popular', 6, True
+            ),
+            Scenario(
+                'recipes-trending', f'{recipes}?ordering=-trending&cursor=',
+                5, True
+            ),
+            Scenario(
+                'recipes-max-kcal',
+                f'{recipes}?max_kcal={recipe.total_kcal}&ordering=total_kcal',
+                6, True
+            ),
+            Scenario('recipe-detail', f'{recipes}{recipe.id}/', 5, True),
+            Scenario(
+                'recipe-detail-cached', f'{recipes}{recipe.id}/', 4, False
+            ),
+            Scenario(
+                'what-can-i-cook',
+                f'{recipes}what_can_i_cook/?ingredients={ingredient_ids}',
+                4, False
+            ),
+            Scenario('feed', f'{recipes}feed/', 6, False),
+            Scenario(
+                'shopping-list', f'{recipes}shopping_cart/', 2, False
+            ),
+            Scenario(
+                'download-shopping-cart-txt',
+                f'{recipes}download_shopping_cart/', 1, False
+            ),
+            Scenario(
+                'download-shopping-cart-pdf',
+                f'{recipes}download_shopping_cart/?format=pdf', 1, False
+            ),
+            Scenario('users', '/api/users/', 2, False),
+            Scenario('users-me', '/api/users/me/', 0, False),
+            Scenario('user-detail', f'/api/users/{user.id}/', 2, False),
+            Scenario(
+                'subscriptions', '/api/users/subscriptions/?recipes_limit=3',
+                3, False
+            ),
+            Scenario('tags', '/api/tags/', 2, False),
+            Scenario(
+                'ingredients-search', f'/api/ingredients/?name={word[:3]}',
+                0, False
+            ),
+        ]
+
+    def measure_memory(self, factory, user, scenario):
+        """Пиковая память одного запроса в байтах."""
+        if scenario.cold:
+            bump_catalog_version()
+        tracemalloc.start()
+        try:
+            self.run_endpoint(factory, user, scenario.path)
+            return tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+
+    def measure(self, factory, user, scenario, repeat, warmup):
+        durations = []
+        for number in range(warmup + repeat):
+            if scenario.cold:
+                bump_catalog_version()
+            started = time.perf_counter()
+            response, queries = self.run_endpoint(factory, user, scenario.path)
+            duration = time.perf_counter() - started
+            if response.status_code != 200:
+                raise CommandError(
+                    f'{scenario.name}: GET {scenario.path} вернул '
+                    f'{response.status_code}.'
+                )
+            if number >= warmup:
+                durations.append(duration * 1000)
+
+        peak = min(
+            self.measure_memory(factory, user, scenario)
+            for _ in range(MEMORY_RUNS)
+        )
+
+        durations.sort()
+        return {
+            'queries': len(queries),
+            'median_ms': round(statistics.median(durations), 2),
+            'p95_ms': round(
+                durations[min(len(durations) - 1,
+                              int(len(durations) * 0.95))], 2
+            ),
+            'peak_kb': round(peak / 1024),
+        }
+
+    def compare(self, name, result, baseline, options, timings=True):
+        """
+        Список регрессий сценария относительно базового результата.
+        Время и память сравниваются, только если timings: замеры
+        на другой СУБД или другом объёме данных несопоставимы.
+        """
+        tolerance = 1 + options['tolerance']
+        problems = []
+        if result['queries'] > baseline['queries']:
+            problems.append(
+                f'{name}: запросов {result["queries"]}, '
+                f'в базовом {baseline["queries"]}'
+            )
+        if not timings:
+            return problems
+        if (
+            result['median_ms'] > baseline['median_ms'] * tolerance
+            and result['median_ms'] - baseline['median_ms']
+            > options['min_regression_ms']
+        ):
+            problems.append(
+                f'{name}: медиана {result["median_ms"]} мс, '
+                f'в базовом {baseline["median_ms"]} мс'
+            )
+        if result['peak_kb'] > max(baseline['peak_kb'], 64) * tolerance:
+            problems.append(
+                f'{name}: память {result["peak_kb"]} КБ, '
+                f'в базовом {baseline["peak_kb"]} КБ'
+            )
+        return problems
+
+    def handle(self, *args, **options):
+        user = self.get_user(options['user'])
+        factory = APIRequestFactory()
+        baseline, timings = {}, not options['queries_only']
+        if options['baseline']:
+            with open(options['baseline'], encoding='utf-8') as file:
+                saved = json.load(file)
+            baseline = saved['scenarios']
+            comparable = (
+                saved.get('database') == connection.vendor
+                and saved.get('recipes') == Recipe.objects.count()
+            )
+            if timings and not comparable:
+                timings = False
+                self.stdout.write(self.style.WARNING(
+                    f'Базовые результаты получены на {saved.get("database")} '
+                    f'с {saved.get("recipes")} рецептами, сравнивается '
+                    'только число запросов.'
+                ))
+
+        results, problems = {}, []
+        self.stdout.write(
+            f'{"сценарий":<28}{"запросы":>8}{"медиана":>10}'
+            f'{"p95":>10}{"память":>10}'
+        )
+        for scenario in self.get_scenarios(user):
+            if options['endpoint'] and not any(
+                part in scenario.name or part in scenario.path
+                for part in options['endpoint']
+            ):
+                continue
+            result = self.measure(
+                factory, user, scenario, options['repeat'], options['warmup']
+            )
+            results[scenario.name] = result
+            self.stdout.write(
+                f'{scenario.name:<28}{result["queries"]:>8}'
+                f'{result["median_ms"]:>8} мс{result["p95_ms"]:>7} мс'
+                f'{result["peak_kb"]:>7} КБ'
+            )
+            if result['queries'] > scenario.max_queries:
+                problems.append(
+                    f'{scenario.name}: запросов {result["queries"]}, '
+                    f'бюджет {scenario.max_queries}'
+                )
+            if scenario.name in baseline:
+                problems += self.compare(
+                    scenario.name, result, baseline[scenario.name], options,
+                    timings
+                )
+
+        if options['save_baseline']:
+            with open(options['save_baseline'], 'w', encoding='utf-8') as file:
+                json.dump({
+                    'created': timezone.now().isoformat(),
+                    'database': connection.vendor,
+                    'recipes': Recipe.objects.count(),
+                    'scenarios': results,
+                }, file, ensure_ascii=False, indent=2)
+        if problems:
+            raise CommandError(
+                'Регрессии производительности:\n' + '\n'.join(problems)
+            )
+        self.stdout.write(self.style.SUCCESS('Регрессий не найдено.'))
@@ -0,0 +1,144 @@
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections, reset_queries
+from django.db.models import Count
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.urls import resolve
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from recipes.models import Recipe, ShopingCart, Tag
+
+User = get_user_model()
+
+NO_CACHE = {
+    'default': {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'}
+}
+
+
+class Command(BaseCommand):
+    help = (
+        'Выполняет запросы к основным эндпоинтам API и выводит '
+        'EXPLAIN ANALYZE для каждого SQL-запроса.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--user',
+            help='Email пользователя, от имени которого выполняются запросы. '
+                 'По умолчанию - пользователь с самой большой корзиной.'
+        )
+        parser.add_argument(
+            '--endpoint', action='append', default=[],
+            help='Проверить только эндпоинты, содержащие эту строку.'
+        )
+
+    def get_user(self, email):
+        if email:
+            user = User.objects.filter(email=email).first()
+            if user is None:
+                raise CommandError(f'Пользователь {email} не найден.')
+            return user
+        cart = ShopingCart.objects.values('user').order_by('user').annotate(
+            size=Count('id')
+        ).order_by('-size').first()
+        if cart is not None:
+            return User.objects.get(id=cart['user'])
+        user = User.objects.order_by('id').first()
+        if user is None:
+            raise CommandError('В базе нет пользователей.')
+        return user
+
+    def get_endpoints(self, user):
+        recipe = Recipe.objects.order_by('-id').first()
+        tag = Tag.objects.order_by('id').first()
+        endpoints = [
+            '/api/recipes/',
+            f'/api/recipes/?author={user.id}',
+            '/api/recipes/?is_favorited=1',
+            '/api/recipes/?is_in_shopping_cart=1',
+            '/api/recipes/download_shopping_cart/',
+            '/api/users/subscriptions/?recipes_limit=3',
+            '/api/tags/',
+            '/api/ingredients/1/',
+        ]
+        if tag is not None:
+            endpoints.append(f'/api/recipes/?tags={tag.slug}')
+        if recipe is not None:
+            endpoints.append(f'/api/recipes/{recipe.id}/')
+        return endpoints
+
+    def explain(self, sql, alias):
+        connection = connections[alias]
+        if connection.vendor == 'postgresql':
+            prefix = connection.ops.explain_query_prefix(analyze=True)
+        else:
+            prefix = connection.ops.explain_query_prefix()
+        with connection.cursor() as cursor:
+            cursor.execute(f'{prefix} {sql}')
+            return [
+                ' '.join(str(column) for column in row)
+                for row in cursor.fetchall()
+            ]
+
+    def run_endpoint(self, factory, user, path):
+        host = next(
+            (host for host in settings.ALLOWED_HOSTS if host and host != '*'),
+            'localhost'
+        )
+        request = factory.get(path, HTTP_HOST=host.lstrip('.'))
+        force_authenticate(request, user=user)
+        match = resolve(path.split('?')[0])
+        # Журнал запросов ограничен queries_limit записей: после заполнения
+        # его, например, командой seed_perf при DEBUG новые запросы
+        # не увеличивают длину журнала и не попадают в замер.
+        reset_queries()
+        # Запросы учитываются во всех БД: при DATABASE_REPLICAS чтение
+        # идёт через реплики, а не через default.
+        with ExitStack() as stack:
+            contexts = {
+                alias: stack.enter_context(
+                    CaptureQueriesContext(connections[alias])
+                )
+                for alias in connections
+            }
+            response = match.func(request, *match.args, **match.kwargs)
+            if getattr(response, 'streaming', False):
+                for _ in response.streaming_content:
+                    pass
+            elif hasattr(response, 'render'):
+                response.render()
+        return response, [
+            {**query, 'alias': alias}
+            for alias, context in contexts.items()
+            for query in context.captured_queries
+        ]
+
+    @override_settings(CACHES=NO_CACHE)
+    def handle(self, *args, **options):
+        user = self.get_user(options['user'])
+        factory = APIRequestFactory()
+        endpoints = [
+            path for path in self.get_endpoints(user)
+            if not options['endpoint']
+            or any(part in path for part in options['endpoint'])
+        ]
+
+        for path in endpoints:
+            response, queries = self.run_endpoint(factory, user, path)
+            self.stdout.write(self.style.MIGRATE_HEADING(
+                f'GET {path} -> {response.status_code}, '
+                f'запросов: {len(queries)}'
+            ))
+            for number, query in enumerate(queries, start=1):
+                sql = query['sql']
+                self.stdout.write(self.style.SQL_KEYWORD(
+                    f'[{number}] {query["alias"]} {query["time"]}s {sql}'
+                ))
+                if not sql.lstrip().upper().startswith('SELECT'):
+                    continue
+                for line in self.explain(sql, query['alias']):
+                    self.stdout.write(f'    {line}')
+            self.stdout.write('')
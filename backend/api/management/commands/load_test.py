@@ -0,0 +1,118 @@
+import statistics
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from rest_framework.authtoken.models import Token
+
+from .benchmark import Command as BenchmarkCommand
+
+# Смесь быстрых ответов из кеша и долгих запросов:
+# долгие под WSGI занимают процесс целиком.
+DEFAULT_SCENARIOS = (
+    'recipes-cached', 'recipe-detail-cached', 'recipes-search',
+    'subscriptions', 'tags', 'ingredients-search',
+    'download-shopping-cart-txt',
+)
+
+
+class Command(BenchmarkCommand):
+    help = (
+        'Нагрузочный тест запущенного сервера: параллельные GET-запросы '
+        'к эндпоинтам для чтения. Если передать несколько адресов, '
+        'например gunicorn с backend.wsgi и с backend.asgi, результаты '
+        'выводятся для сравнения.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'urls', nargs='+',
+            help='Адреса серверов, например http://localhost:8000.'
+        )
+        parser.add_argument(
+            '--user',
+            help='Email пользователя, от имени которого выполняются запросы. '
+                 'По умолчанию - пользователь с самой большой корзиной.'
+        )
+        parser.add_argument(
+            '--endpoint', action='append', default=[],
+            help='Сценарий из команды benchmark (можно несколько).'
+        )
+        parser.add_argument('--concurrency', type=int, default=50)
+        parser.add_argument(
+            '--duration', type=float, default=30,
+            help='Длительность теста каждого сервера в секундах.'
+        )
+
+    def run_client(self, url, paths, token, deadline, offset):
+        """Запросы по кругу до deadline: список задержек и число ошибок."""
+        latencies, errors = [], 0
+        session = requests.Session()
+        session.headers['Authorization'] = f'Token {token}'
+        number = offset
+        while time.monotonic() < deadline:
+            path = paths[number % len(paths)]
+            number += 1
+            started = time.perf_counter()
+            try:
+                response = session.get(url + path, timeout=60)
+                ok = response.status_code == 200
+            except requests.RequestException:
+                ok = False
+            if ok:
+                latencies.append(time.perf_counter() - started)
+            else:
+                errors += 1
+        return latencies, errors
+
+    def run_server(self, url, paths, token, options):
+        concurrency = options['concurrency']
+        start = threading.Barrier(concurrency)
+
+        def client(offset):
+            start.wait()
+            return self.run_client(
+                url, paths, token,
+                time.monotonic() + options['duration'], offset
+            )
+
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            results = list(executor.map(client, range(concurrency)))
+        latencies = sorted(
+            latency for client_latencies, _ in results
+            for latency in client_latencies
+        )
+        errors = sum(client_errors for _, client_errors in results)
+        if len(latencies) < 2:
+            return len(latencies), errors, 0, 0, 0, 0
+        quantiles = statistics.quantiles(latencies, n=100)
+        return (
+            len(latencies), errors, len(latencies) / options['duration'],
+            quantiles[49] * 1000, quantiles[94] * 1000, quantiles[98] * 1000
+        )
+
+    def handle(self, *args, **options):
+        user = self.get_user(options['user'])
+        token, _ = Token.objects.get_or_create(user=user)
+        names = options['endpoint'] or DEFAULT_SCENARIOS
+        paths = [
+            scenario.path for scenario in self.get_scenarios(user)
+            if scenario.name in names
+        ]
+        self.stdout.write(
+            f'Сценарии: {", ".join(names)}; '
+            f'клиентов: {options["concurrency"]}.'
+        )
+        self.stdout.write(
+            f'{"сервер":<32}{"запросы":>9}{"ошибки":>8}{"RPS":>9}'
+            f'{"p50":>10}{"p95":>10}{"p99":>10}'
+        )
+        for url in options['urls']:
+            total, errors, rps, p50, p95, p99 = self.run_server(
+                url.rstrip('/'), paths, token.key, options
+            )
+            self.stdout.write(
+                f'{url:<32}{total:>9}{errors:>8}{rps:>9.1f}'
+                f'{p50:>7.0f} мс{p95:>7.0f} мс{p99:>7.0f} мс'
+            )
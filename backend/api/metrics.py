@@ -0,0 +1,333 @@
+import logging
+import os
+import socket
+import sys
+import threading
+import time
+from bisect import bisect_left
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.core.cache import cache
+from rest_framework.serializers import BaseSerializer
+
+logger = logging.getLogger(__name__)
+
+DURATION_BUCKETS = (
+    0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10,
+)
+QUERY_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200, 500)
+BYTES_BUCKETS = (
+    256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304,
+)
+
+HISTOGRAMS = {
+    'foodgram_request_duration_seconds': (
+        'Время обработки запроса.', DURATION_BUCKETS
+    ),
+    'foodgram_request_db_queries': (
+        'Число запросов к БД за запрос.', QUERY_BUCKETS
+    ),
+    'foodgram_request_db_duration_seconds': (
+        'Время запросов к БД за запрос.', DURATION_BUCKETS
+    ),
+    'foodgram_request_serializer_duration_seconds': (
+        'Время сериализации ответа.', DURATION_BUCKETS
+    ),
+    'foodgram_response_bytes': (
+        'Размер ответа (без потоковых ответов).', BYTES_BUCKETS
+    ),
+    'foodgram_task_duration_seconds': (
+        'Время выполнения фоновой задачи.', DURATION_BUCKETS
+    ),
+    'foodgram_task_wait_seconds': (
+        'Время ожидания фоновой задачи в очереди.', DURATION_BUCKETS
+    ),
+}
+COUNTERS = {
+    'foodgram_requests_total': 'Число обработанных запросов.',
+    'foodgram_n_plus_one_total': 'Число найденных повторяющихся запросов.',
+    'foodgram_tasks_total': 'Число выполненных фоновых задач.',
+}
+
+PROCESSES_KEY = 'metrics:processes'
+PROCESS_KEY = 'metrics:process:{}'
+
+current_request = ContextVar('current_request_metrics', default=None)
+
+
+class RequestMetrics:
+    """
+    Метрики одного запроса: число и время запросов к БД,
+    время сериализации и повторяющиеся SQL-запросы.
+    """
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.view = None
+        self.queries = 0
+        self.db_time = 0.0
+        self.serializer_time = 0.0
+        self.statements = {}
+        self.n_plus_one = {}
+
+    def duration(self):
+        return time.perf_counter() - self.started
+
+    def __call__(self, execute, sql, params, many, context):
+        """Обёртка connection.execute_wrapper."""
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.db_time += time.perf_counter() - started
+            self.queries += 1
+            count = self.statements.get(sql, 0) + 1
+            self.statements[sql] = count
+            if count == settings.METRICS_N_PLUS_ONE_THRESHOLD:
+                self.n_plus_one[sql] = find_query_source()
+
+
+def execute_wrapper(execute, sql, params, many, context):
+    """
+    Обёртка execute_wrapper, постоянно подключённая ко всем соединениям.
+    Запросы учитываются в метриках текущего запроса, если он замеряется.
+    Текущий запрос берётся из contextvars, поэтому учитываются и запросы
+    из потоков, в которых выполняются асинхронные представления.
+    """
+    request_metrics = current_request.get()
+    if request_metrics is None:
+        return execute(sql, params, many, context)
+    return request_metrics(execute, sql, params, many, context)
+
+
+def find_query_source():
+    """
+    Метод сериализатора (или иной код проекта), из которого
+    выполнен текущий запрос к БД. Стек просматривается только
+    при обнаружении повторов, поэтому на обычные запросы не влияет.
+    """
+    frame = sys._getframe(2)
+    project_frame = None
+    while frame is not None:
+        instance = frame.f_locals.get('self')
+        if (
+            isinstance(instance, BaseSerializer)
+            and frame.f_code.co_filename.startswith(str(settings.BASE_DIR))
+        ):
+            return f'{type(instance).__name__}.{frame.f_code.co_name}'
+        if (
+            project_frame is None
+            and frame.f_code.co_filename.startswith(str(settings.BASE_DIR))
+            and frame.f_code.co_filename != __file__
+        ):
+            project_frame = frame
+        frame = frame.f_back
+    if project_frame is None:
+        return 'unknown'
+    filename = os.path.relpath(
+        project_frame.f_code.co_filename, settings.BASE_DIR
+    )
+    return f'{filename}:{project_frame.f_lineno}'
+
+
+class Registry:
+    """
+    Счётчики и гистограммы процесса.
+    Снимок периодически сохраняется в общий кеш, чтобы /api/metrics/
+    отдавал сумму по всем процессам gunicorn, а не по одному.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters = {}
+        self._histograms = {}
+        self._flushed = 0.0
+        self.key = PROCESS_KEY.format(f'{socket.gethostname()}:{os.getpid()}')
+
+    def inc(self, name, labels, value=1):
+        key = (name, labels)
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def observe(self, name, labels, value):
+        buckets = HISTOGRAMS[name][1]
+        key = (name, labels)
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = [
+                    [0] * (len(buckets) + 1), 0.0
+                ]
+            histogram[0][bisect_left(buckets, value)] += 1
+            histogram[1] += value
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                'counters': dict(self._counters),
+                'histograms': {
+                    key: [list(counts), total]
+                    for key, (counts, total) in self._histograms.items()
+                },
+            }
+
+    def flush(self, force=False):
+        """Сохраняет снимок процесса в кеш не чаще METRICS_FLUSH_INTERVAL."""
+        now = time.monotonic()
+        if not force and now - self._flushed < settings.METRICS_FLUSH_INTERVAL:
+            return
+        self._flushed = now
+        timeout = settings.METRICS_PROCESS_TIMEOUT
+        cache.set(self.key, self.snapshot(), timeout=timeout)
+        processes = cache.get(PROCESSES_KEY) or {}
+        if self.key not in processes:
+            processes[self.key] = time.time()
+            cache.set(PROCESSES_KEY, processes, timeout=None)
+
+
+registry = Registry()
+
+
+def record(request_metrics, method, status, response_bytes=None):
+    """Записывает метрики завершённого запроса в реестр процесса."""
+    view = request_metrics.view or 'unresolved'
+    labels = (('view', view), ('method', method))
+    duration = request_metrics.duration()
+
+    registry.inc(
+        'foodgram_requests_total', labels + (('status', str(status)),)
+    )
+    registry.observe('foodgram_request_duration_seconds', labels, duration)
+    registry.observe(
+        'foodgram_request_db_queries', labels, request_metrics.queries
+    )
+    registry.observe(
+        'foodgram_request_db_duration_seconds', labels,
+        request_metrics.db_time
+    )
+    registry.observe(
+        'foodgram_request_serializer_duration_seconds', labels,
+        request_metrics.serializer_time
+    )
+    if response_bytes is not None:
+        registry.observe('foodgram_response_bytes', labels, response_bytes)
+
+    for sql, source in request_metrics.n_plus_one.items():
+        count = request_metrics.statements[sql]
+        registry.inc(
+            'foodgram_n_plus_one_total', labels + (('source', source),)
+        )
+        logger.warning(
+            'Возможный N+1 в %s: запрос выполнен %s раз из %s: %s',
+            view, count, source, sql[:200]
+        )
+    registry.flush()
+
+
+def record_task(name, status, duration, wait):
+    """
+    Записывает метрики выполненной фоновой задачи. Обработчики
+    сохраняют снимки в тот же кеш, что и процессы gunicorn.
+    """
+    labels = (('task', name),)
+    registry.inc('foodgram_tasks_total', labels + (('status', status),))
+    registry.observe('foodgram_task_duration_seconds', labels, duration)
+    registry.observe('foodgram_task_wait_seconds', labels, max(wait, 0))
+    registry.flush()
+
+
+def merge(snapshots):
+    counters, histograms = {}, {}
+    for snapshot in snapshots:
+        for key, value in snapshot['counters'].items():
+            counters[key] = counters.get(key, 0) + value
+        for key, (counts, total) in snapshot['histograms'].items():
+            merged = histograms.setdefault(key, [[0] * len(counts), 0.0])
+            merged[0] = [a + b for a, b in zip(merged[0], counts)]
+            merged[1] += total
+    return counters, histograms
+
+
+def format_labels(labels, extra=()):
+    labels = tuple(labels) + tuple(extra)
+    if not labels:
+        return ''
+    values = ','.join(
+        '{}="{}"'.format(
+            name, value.replace('\\', '\\\\').replace('"', '\\"')
+        )
+        for name, value in labels
+    )
+    return '{' + values + '}'
+
+
+def render_prometheus():
+    """
+    Метрики всех процессов в текстовом формате Prometheus.
+    Снимок текущего процесса берётся актуальным, остальных - из кеша.
+    """
+    registry.flush(force=True)
+    processes = cache.get(PROCESSES_KEY) or {}
+    snapshots = cache.get_many(list(processes))
+    alive = {key: processes[key] for key in snapshots}
+    if len(alive) != len(processes):
+        cache.set(PROCESSES_KEY, alive, timeout=None)
+    counters, histograms = merge(snapshots.values())
+
+    lines = [
+        '# HELP foodgram_metrics_sample_rate Доля запросов с метриками.',
+        '# TYPE foodgram_metrics_sample_rate gauge',
+        f'foodgram_metrics_sample_rate {settings.METRICS_SAMPLE_RATE}',
+    ]
+    for name, help_text in COUNTERS.items():
+        lines.append(f'# HELP {name} {help_text}')
+        lines.append(f'# TYPE {name} counter')
+        for (metric, labels), value in sorted(counters.items()):
+            if metric == name:
+                lines.append(f'{name}{format_labels(labels)} {value}')
+    for name, (help_text, buckets) in HISTOGRAMS.items():
+        lines.append(f'# HELP {name} {help_text}')
+        lines.append(f'# TYPE {name} histogram')
+        for (metric, labels), (counts, total) in sorted(histograms.items()):
+            if metric != name:
+                continue
+            cumulative = 0
+            for bound, count in zip(buckets + ('+Inf',), counts):
+                cumulative += count
+                lines.append('{}_bucket{} {}'.format(
+                    name, format_labels(labels, (('le', str(bound)),)),
+                    cumulative
+                ))
+            lines.append(f'{name}_sum{format_labels(labels)} {total}')
+            lines.append(f'{name}_count{format_labels(labels)} {cumulative}')
+    return '\n'.join(lines) + '\n'
+
+
+class SerializerTimingMixin:
+    """
+    Примесь для вьюсетов: учитывает в метриках запроса время,
+    затраченное на сериализацию ответа.
+    """
+
+    def get_serializer(self, *args, **kwargs):
+        return self.time_serializer(super().get_serializer(*args, **kwargs))
+
+    def time_serializer(self, serializer):
+        """Оборачивает to_representation сериализатора замером времени."""
+        request_metrics = current_request.get()
+        if request_metrics is None:
+            return serializer
+        to_representation = serializer.to_representation
+
+        def timed_to_representation(instance):
+            started = time.perf_counter()
+            try:
+                return to_representation(instance)
+            finally:
+                request_metrics.serializer_time += (
+                    time.perf_counter() - started
+                )
+
+        serializer.to_representation = timed_to_representation
+        return serializer
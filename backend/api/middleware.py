@@ -0,0 +1,133 @@
+import random
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+
+from .metrics import RequestMetrics, current_request, record
+from .replicas import choose_replica, remember_write, request_replica
+
+
+class MetricsMiddleware:
+    """
+    Замеряет для каждого запроса время обработки, число и время запросов
+    к БД, время сериализации и размер ответа. Результат добавляется
+    в заголовок Server-Timing и в метрики /api/metrics/.
+    Замеряется доля запросов METRICS_SAMPLE_RATE, остальные проходят
+    без накладных расходов.
+    Работает и под WSGI, и под ASGI: запросы к БД учитываются
+    обёрткой соединений из api.signals через contextvars.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        if random.random() >= settings.METRICS_SAMPLE_RATE:
+            return self.get_response(request)
+
+        request_metrics = RequestMetrics()
+        token = current_request.set(request_metrics)
+        try:
+            response = self.get_response(request)
+        finally:
+            current_request.reset(token)
+        return self.finish(request, response, request_metrics)
+
+    async def __acall__(self, request):
+        if random.random() >= settings.METRICS_SAMPLE_RATE:
+            return await self.get_response(request)
+
+        request_metrics = RequestMetrics()
+        token = current_request.set(request_metrics)
+        try:
+            response = await self.get_response(request)
+        finally:
+            current_request.reset(token)
+        return self.finish(request, response, request_metrics)
+
+    def finish(self, request, response, request_metrics):
+        response_bytes = None
+        if not response.streaming:
+            response_bytes = len(response.content)
+        record(request_metrics, request.method, response.status_code,
+               response_bytes)
+        response['Server-Timing'] = server_timing(request_metrics)
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        request_metrics = current_request.get()
+        if request_metrics is not None:
+            request_metrics.view = view_name(request, view_func)
+
+
+class ReplicaMiddleware:
+    """
+    Выбирает реплику, с которой ReplicaRouter читает при обработке
+    безопасного запроса (GET, HEAD, OPTIONS). Клиент, только что
+    изменивший данные, DATABASE_REPLICA_STICKY_SECONDS секунд
+    читает с основной БД.
+    Без DATABASE_REPLICAS ничего не делает.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        if not settings.DATABASE_REPLICAS:
+            return self.get_response(request)
+
+        token = request_replica.set(choose_replica(request))
+        try:
+            response = self.get_response(request)
+        finally:
+            request_replica.reset(token)
+        remember_write(request, response)
+        return response
+
+    async def __acall__(self, request):
+        if not settings.DATABASE_REPLICAS:
+            return await self.get_response(request)
+
+        token = request_replica.set(choose_replica(request))
+        try:
+            response = await self.get_response(request)
+        finally:
+            request_replica.reset(token)
+        remember_write(request, response)
+        return response
+
+
+def view_name(request, view_func):
+    """
+    Имя обработчика в виде ViewSet.action, например
+    RecipesViewSet.list или CustomUsersViewSet.subscriptions.
+    """
+    view_class = getattr(view_func, 'cls', None)
+    if view_class is None:
+        return f'{view_func.__module__}.{view_func.__name__}'
+    actions = getattr(view_func, 'actions', None) or {}
+    action = actions.get(request.method.lower(), request.method.lower())
+    return f'{view_class.__name__}.{action}'
+
+
+def server_timing(request_metrics):
+    return (
+        f'db;dur={request_metrics.db_time * 1000:.1f};'
+        f'desc="{request_metrics.queries} queries", '
+        f'serializer;dur={request_metrics.serializer_time * 1000:.1f}, '
+        f'total;dur={request_metrics.duration() * 1000:.1f}'
+    )
@@ -0,0 +1,39 @@
+from recipes.models import Ingredient
+from recipes.nutrition import NUTRIENTS, recompute_for_ingredient
+from tasks.queue import task
+from .cache import bump_catalog_version
+
+
+def nutrition_changed(ingredient):
+    """
+    Изменились ли пищевая ценность или цена ингредиента
+    по сравнению с сохранённой в БД.
+    """
+    if ingredient.pk is None:
+        return False
+    saved = Ingredient.objects.filter(pk=ingredient.pk).values(
+        *NUTRIENTS
+    ).first()
+    return saved is not None and any(
+        saved[nutrient] != getattr(ingredient, nutrient)
+        for nutrient in NUTRIENTS
+    )
+
+
+def schedule_ingredient_recompute(ingredient_id):
+    """
+    Ставит пересчёт сумм рецептов с ингредиентом в очередь фоновых
+    задач. У популярного ингредиента рецептов может быть много,
+    поэтому они пересчитываются пачками вне запроса.
+    """
+    recompute_ingredient_recipes.enqueue(
+        key=f'ingredient-nutrition:{ingredient_id}',
+        ingredient_id=ingredient_id,
+    )
+
+
+@task()
+def recompute_ingredient_recipes(ingredient_id):
+    recompute_for_ingredient(
+        ingredient_id, on_batch=lambda batch: bump_catalog_version()
+    )
@@ -0,0 +1,81 @@
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import (
+    CursorPagination, Cursor, PageNumberPagination)
+
+
+class CursorOptInPagination(PageNumberPagination):
+    """
+    Постраничная пагинация с переходом на курсорную по параметру cursor.
+    Курсорная пагинация строится по ключу сортировки (по умолчанию -id),
+    поэтому стоимость страницы не зависит от её глубины,
+    а запрос COUNT(*) не выполняется.
+    Первая страница в курсорном режиме запрашивается с пустым ?cursor=.
+    """
+    cursor_query_param = 'cursor'
+    ordering = '-id'
+
+    def __init__(self):
+        self.cursor_paginator = None
+
+    def get_cursor_paginator(self, request):
+        paginator = CursorPagination()
+        paginator.cursor_query_param = self.cursor_query_param
+        paginator.ordering = self.ordering
+        paginator.page_size = self.get_page_size(request)
+        return paginator
+
+    def paginate_queryset(self, queryset, request, view=None):
+        if self.cursor_query_param in request.query_params:
+            self.cursor_paginator = self.get_cursor_paginator(request)
+            return self.cursor_paginator.paginate_queryset(
+                queryset, request, view
+            )
+        return super().paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        if self.cursor_paginator is not None:
+            return self.cursor_paginator.get_paginated_response(data)
+        return super().get_paginated_response(data)
+
+
+class FeedPagination(CursorPagination):
+    """
+    Курсорная пагинация ленты по id рецептов.
+    Страница строится из списка id (recipes.feed.recipe_ids),
+    а не из queryset, поэтому переход возможен только вперёд.
+    """
+    ordering = '-id'
+
+    def paginate_ids(self, fetch_ids, request):
+        """
+        Вызывает fetch_ids(before, limit) с позицией курсора
+        и возвращает id рецептов текущей страницы.
+        """
+        self.request = request
+        self.base_url = request.build_absolute_uri()
+        self.page_size = self.get_page_size(request)
+        cursor = self.decode_cursor(request)
+        before = None
+        if cursor is not None and cursor.position is not None:
+            try:
+                before = int(cursor.position)
+            except ValueError:
+                raise NotFound(self.invalid_cursor_message)
+
+        ids = fetch_ids(before, self.page_size + 1)
+        self.has_next = len(ids) > self.page_size
+        ids = ids[:self.page_size]
+        self.has_previous = False
+        if self.has_next:
+            self.next_position = ids[-1]
+        return ids
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        return self.encode_cursor(
+            Cursor(offset=0, reverse=False, position=self.next_position)
+        )
+
+    def get_previous_link(self):
+        return None
@@ -0,0 +1,125 @@
+import abc
+import csv
+import io
+import json
+
+from django.conf import settings
+from reportlab.lib.pagesizes import A4
+from reportlab.pdfbase import pdfmetrics
+from reportlab.pdfbase.ttfonts import TTFont
+from reportlab.pdfgen import canvas
+from rest_framework.renderers import BaseRenderer
+
+
+class ShoppingListRenderer(BaseRenderer, metaclass=abc.ABCMeta):
+    """
+    Базовый рендерер списка покупок.
+    Список отдаётся потоком: метод stream принимает итератор строк
+    (название, единица измерения, количество) и по частям выдаёт файл,
+    не собирая его целиком в памяти.
+    Метод render используется только для ответов с ошибками.
+    """
+    charset = 'utf-8'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        return json.dumps(data, ensure_ascii=False).encode(self.charset)
+
+    @abc.abstractmethod
+    def stream(self, title, rows):
+        """Итератор частей файла со списком покупок."""
+
+
+class ShoppingListTxtRenderer(ShoppingListRenderer):
+    """Список покупок в текстовом формате."""
+    media_type = 'text/plain'
+    format = 'txt'
+
+    def stream(self, title, rows):
+        yield f'{title}:\n'
+        for number, (name, unit, amount) in enumerate(rows, start=1):
+            yield f'\n {number}. {name} ({unit}) - {amount}'
+
+
+class ShoppingListCsvRenderer(ShoppingListRenderer):
+    """Список покупок в формате CSV."""
+    media_type = 'text/csv'
+    format = 'csv'
+
+    def stream(self, title, rows):
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow(('name', 'measurement_unit', 'amount'))
+        for row in rows:
+            writer.writerow(row)
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+        yield buffer.getvalue()
+
+
+class ShoppingListJsonRenderer(ShoppingListRenderer):
+    """Список покупок в формате JSON."""
+    media_type = 'application/json'
+    format = 'json'
+
+    def stream(self, title, rows):
+        yield '{"title": %s, "ingredients": [' % json.dumps(
+            title, ensure_ascii=False
+        )
+        separator = ''
+        for name, unit, amount in rows:
+            yield separator + json.dumps(
+                {'name': name, 'measurement_unit': unit, 'amount': amount},
+                ensure_ascii=False
+            )
+            separator = ', '
+        yield ']}'
+
+
+class ShoppingListPdfRenderer(ShoppingListRenderer):
+    """
+    Список покупок в формате PDF.
+    Страницы рисуются по мере чтения строк, но сам документ
+    формируется в памяти: таблица ссылок PDF пишется в конце файла.
+    Для кириллицы нужен TTF-шрифт из SHOPPING_LIST_PDF_FONT.
+    """
+    media_type = 'application/pdf'
+    format = 'pdf'
+    font_name = 'ShoppingListFont'
+    font_size = 12
+    margin = 50
+
+    def stream(self, title, rows):
+        pdfmetrics.registerFont(
+            TTFont(self.font_name, settings.SHOPPING_LIST_PDF_FONT)
+        )
+        buffer = io.BytesIO()
+        document = canvas.Canvas(buffer, pagesize=A4)
+        _, height = A4
+        line_height = self.font_size * 1.5
+
+        document.setFont(self.font_name, self.font_size)
+        position = height - self.margin
+        document.drawString(self.margin, position, f'{title}:')
+        position -= line_height * 2
+
+        for number, (name, unit, amount) in enumerate(rows, start=1):
+            if position < self.margin:
+                document.showPage()
+                document.setFont(self.font_name, self.font_size)
+                position = height - self.margin
+            document.drawString(
+                self.margin, position, f'{number}. {name} ({unit}) - {amount}'
+            )
+            position -= line_height
+
+        document.save()
+        yield buffer.getvalue()
+
+
+SHOPPING_LIST_RENDERERS = (
+    ShoppingListTxtRenderer,
+    ShoppingListCsvRenderer,
+    ShoppingListJsonRenderer,
+    ShoppingListPdfRenderer,
+)
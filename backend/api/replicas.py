@@ -0,0 +1,126 @@
+import hashlib
+import random
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, connections
+
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+STICKY_KEY = 'db:sticky:{}'
+RECENT_WRITE_KEY = 'db:recent_write'
+# Модели, которые всегда читаются с основной БД: токен только что
+# вошедшего пользователя может ещё не дойти до реплики.
+PRIMARY_MODELS = {'authtoken.token'}
+
+# Реплика, выбранная для текущего запроса, или None - читать с основной БД.
+request_replica = ContextVar('request_replica', default=None)
+
+
+def client_key(request):
+    """Ключ кеша клиента по заголовку Authorization или сессии."""
+    credentials = (
+        request.headers.get('Authorization')
+        or request.COOKIES.get(settings.SESSION_COOKIE_NAME)
+    )
+    if not credentials:
+        return None
+    return STICKY_KEY.format(hashlib.sha256(credentials.encode()).hexdigest())
+
+
+def replica_allowed(request):
+    """
+    Можно ли читать с реплики при обработке запроса: только
+    в безопасных запросах и только если клиент недавно ничего не менял.
+    """
+    if request.method not in SAFE_METHODS:
+        return False
+    key = client_key(request)
+    return key is None or cache.get(key) is None
+
+
+def choose_replica(request):
+    """
+    Реплика для всего запроса или None. Одна реплика на запрос нужна,
+    чтобы, например, число рецептов и страница списка не читались
+    с реплик с разным отставанием.
+    """
+    if not settings.DATABASE_REPLICAS or not replica_allowed(request):
+        return None
+    return random.choice(settings.DATABASE_REPLICAS)
+
+
+def remember_write(request, response):
+    """
+    После успешного изменяющего запроса клиент
+    DATABASE_REPLICA_STICKY_SECONDS секунд читает с основной БД
+    и видит свои изменения, даже если реплика отстаёт.
+    """
+    if request.method in SAFE_METHODS or response.status_code >= 400:
+        return
+    key = client_key(request)
+    if key is not None:
+        cache.set(key, 1, timeout=settings.DATABASE_REPLICA_STICKY_SECONDS)
+
+
+def record_write():
+    """Отмечает недавнее изменение рецептов для replica_may_lag."""
+    if settings.DATABASE_REPLICAS:
+        cache.set(
+            RECENT_WRITE_KEY, 1,
+            timeout=settings.DATABASE_REPLICA_STICKY_SECONDS
+        )
+
+
+def replica_may_lag():
+    """
+    Данные прочитаны с реплики вскоре после изменения рецептов
+    и могут быть устаревшими. Такие ответы не кешируются.
+    """
+    return (
+        request_replica.get() is not None
+        and cache.get(RECENT_WRITE_KEY) is not None
+    )
+
+
+@contextmanager
+def read_from_primary():
+    """
+    Чтение с основной БД, например для построения индексов в памяти:
+    версия индекса уже новая, и устаревшие данные реплики остались бы
+    в нём до следующего изменения.
+    """
+    token = request_replica.set(None)
+    try:
+        yield
+    finally:
+        request_replica.reset(token)
+
+
+class ReplicaRouter:
+    """
+    Направляет чтение в безопасных HTTP-запросах на реплику,
+    выбранную для запроса ReplicaMiddleware, всё остальное - на основную
+    БД. Чтение внутри транзакции, команды управления и фоновые потоки
+    используют основную БД.
+    """
+
+    def db_for_read(self, model, **hints):
+        replica = request_replica.get()
+        if (
+            replica is None
+            or model._meta.label_lower in PRIMARY_MODELS
+            or connections[DEFAULT_DB_ALIAS].in_atomic_block
+        ):
+            return DEFAULT_DB_ALIAS
+        return replica
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == DEFAULT_DB_ALIAS
@@ -1,14 +1,16 @@
+from django.conf import settings
 from django.contrib.auth import get_user_model
-from django.db.models import F
+from django.core.files.storage import default_storage
 from djoser.serializers import UserSerializer
-from drf_base64.fields import Base64ImageField
 from rest_framework import serializers
 
 from recipes.models import (
     FavoriteRecipe, IngredientInRecipe, Ingredient,
-    Recipe, Follow, Tag, ShopingCart
+    Recipe, Follow, Tag, ShopingCart, ShoppingListItem
 )
-from .utils import create_update_recipes
+from .fields import RecipeImageField
+from .utils import (
+    create_update_recipes, get_recipes_limit, recipe_text_exists)
 User = get_user_model()
 
 
@@ -28,14 +30,17 @@ class CustomUserSerializer(UserSerializer):
     def get_is_subscribed(self, obj):
         """
         Получает значение, указывающее, подписан ли пользователь на автора.
+        Использует аннотацию is_subscribed, если она есть в queryset.
         """
+        if hasattr(obj, 'is_subscribed'):
+            return obj.is_subscribed
         request = self.context.get('request')
         user = request.user if request else None
         return (
             Follow.objects
             .filter(author_id=obj.id, user=user)
             .exists()
-        ) if user else False
+        ) if user and user.is_authenticated else False
 
 
 class TagSerializer(serializers.ModelSerializer):
@@ -70,22 +75,69 @@ class IngredientInRecipesSerializer(serializers.ModelSerializer):
         fields = ('id', 'amount',)
 
 
-class RecipeMinifiedSerializer(serializers.ModelSerializer):
+class ImageVariantsMixin:
+    """
+    Ссылки на уменьшенные копии изображения рецепта.
+    Пока копии не построены, возвращается пустой словарь,
+    и клиент показывает исходное изображение из поля image.
+    """
+
+    def get_image_variants(self, obj):
+        request = self.context.get('request')
+        variants = {}
+        for name, formats in obj.image_variants.items():
+            if name == 'source':
+                continue
+            variants[name] = {}
+            for image_format, path in formats.items():
+                url = default_storage.url(path)
+                if request is not None:
+                    url = request.build_absolute_uri(url)
+                variants[name][image_format] = url
+        return variants
+
+
+class NutritionSerializer(serializers.Serializer):
+    """
+    Пищевая ценность из сумм total_* рецепта или списка покупок.
+    """
+
+    kcal = serializers.DecimalField(
+        source='total_kcal', max_digits=14, decimal_places=2,
+        coerce_to_string=False, read_only=True
+    )
+    protein = serializers.DecimalField(
+        source='total_protein', max_digits=14, decimal_places=2,
+        coerce_to_string=False, read_only=True
+    )
+    fat = serializers.DecimalField(
+        source='total_fat', max_digits=14, decimal_places=2,
+        coerce_to_string=False, read_only=True
+    )
+    carbs = serializers.DecimalField(
+        source='total_carbs', max_digits=14, decimal_places=2,
+        coerce_to_string=False, read_only=True
+    )
+
+
+class RecipeMinifiedSerializer(ImageVariantsMixin,
+                               serializers.ModelSerializer):
     """
     Краткий вариант сериализатора c рецептами.
-    Состоит из id, name, image, cooking_time.
+    Состоит из id, name, image, image_variants, cooking_time.
     """
-    image = Base64ImageField(
+    image = RecipeImageField(
         required=False, allow_null=True
     )
+    image_variants = serializers.SerializerMethodField()
 
     class Meta:
         model = Recipe
-        fields = ('id', 'name', 'image', 'cooking_time',)
+        fields = ('id', 'name', 'image', 'image_variants', 'cooking_time',)
         read_only_fields = ('name', 'image', 'cooking_time',)
 
 
-class RecipeSerializer(serializers.ModelSerializer):
+class RecipeSerializer(ImageVariantsMixin, serializers.ModelSerializer):
     """
     Сериализатор для модели Recipe.
     """
@@ -94,26 +146,43 @@ class RecipeSerializer(serializers.ModelSerializer):
     ingredients = serializers.SerializerMethodField()
     is_favorited = serializers.SerializerMethodField()
     is_in_shopping_cart = serializers.SerializerMethodField()
+    image_variants = serializers.SerializerMethodField()
+    nutrition = NutritionSerializer(source='*', read_only=True)
+    price = serializers.DecimalField(
+        source='total_price', max_digits=14, decimal_places=2,
+        coerce_to_string=False, read_only=True
+    )
 
     class Meta(RecipeMinifiedSerializer.Meta):
         model = Recipe
         fields = (
             'id', 'tags', 'author', 'ingredients',
-            'is_favorited', 'is_in_shopping_cart', 'text',
+            'is_favorited', 'is_in_shopping_cart', 'text', 'favorites_count',
+            'nutrition', 'price',
         ) + RecipeMinifiedSerializer.Meta.fields
 
     def get_ingredients(self, obj):
-        """Игредиенты рецепта с требуемым количеством."""
-        return obj.ingredients.values(
-            'id', 'name', 'measurement_unit',
-            amount=F('ingredient_inrecipe__amount')
-        )
+        """
+        Игредиенты рецепта с требуемым количеством.
+        Читает связи ingredient_recipe, подгруженные через prefetch_related.
+        """
+        return [
+            {
+                'id': item.ingredient.id,
+                'name': item.ingredient.name,
+                'measurement_unit': item.ingredient.measurement_unit,
+                'amount': item.amount,
+            } for item in obj.ingredient_recipe.all()
+        ]
 
     def get_is_favorited(self, obj):
         """
         Получает значение, указывающее, добавлен
         ли рецепт в избранное у пользователя.
+        Использует аннотацию is_favorited, если она есть в queryset.
         """
+        if hasattr(obj, 'is_favorited'):
+            return obj.is_favorited
         request = self.context.get('request')
         return (
             request
@@ -128,10 +197,14 @@ class RecipeSerializer(serializers.ModelSerializer):
         """
         Получает значение, указывающее, добавлен
         ли рецепт в корзину у пользователя.
+        Использует аннотацию is_in_shopping_cart, если она есть в queryset.
         """
+        if hasattr(obj, 'is_in_shopping_cart'):
+            return obj.is_in_shopping_cart
         request = self.context.get('request')
         return (
             request
+            and request.user.is_authenticated
             and ShopingCart.objects.filter(
                 recipe_id=obj.id,
                 user=request.user
@@ -139,6 +212,19 @@ class RecipeSerializer(serializers.ModelSerializer):
         )
 
 
+class RecipeMatchSerializer(RecipeSerializer):
+    """
+    Рецепт, подобранный по имеющимся ингредиентам.
+    В missing_ingredients перечислены id недостающих ингредиентов.
+    """
+    missing_ingredients = serializers.ListField(
+        child=serializers.IntegerField(), read_only=True
+    )
+
+    class Meta(RecipeSerializer.Meta):
+        fields = RecipeSerializer.Meta.fields + ('missing_ingredients',)
+
+
 class RecipeAddSerializer(serializers.ModelSerializer):
     """
     Сериализатор для создания и обновления рецепта.
@@ -149,7 +235,7 @@ class RecipeAddSerializer(serializers.ModelSerializer):
         many=True, queryset=Tag.objects.all())
     ingredients = IngredientInRecipesSerializer(
         source='ingredientin_recipe', many=True)
-    image = Base64ImageField()
+    image = RecipeImageField()
 
     class Meta:
         model = Recipe
@@ -196,6 +282,19 @@ class RecipeAddSerializer(serializers.ModelSerializer):
 
             ingredients_id.append(ingredient.get('id'))
 
+        ingredients_by_id = Ingredient.objects.in_bulk(
+            [ingredient['id'] for ingredient in data]
+        )
+        missing = [
+            str(ingredient['id']) for ingredient in data
+            if ingredient['id'] not in ingredients_by_id
+        ]
+        if missing:
+            raise serializers.ValidationError(
+                f'Ингредиенты не найдены: {", ".join(missing)}.'
+            )
+        self.ingredients_by_id = ingredients_by_id
+
         return data
 
     def create(self, validated_data):
@@ -203,45 +302,38 @@ class RecipeAddSerializer(serializers.ModelSerializer):
         author = self.context.get('request').user
         text_recipe = self.validated_data.get('text')
 
-        if Recipe.objects.filter(
-            author=author,
-            text=text_recipe
-        ).exists():
+        if recipe_text_exists(author, text_recipe):
             raise serializers.ValidationError(
                 'У Вас уже есть рецепт с таким же описанием. '
                 'Проверьте свой рецепт.',
                 code=400,
             )
 
-        return create_update_recipes(validated_data, author=author)
+        recipe = create_update_recipes(
+            validated_data, self.ingredients_by_id, author=author
+        )
+        recipe.is_favorited = False
+        recipe.is_in_shopping_cart = False
+        recipe.author.is_subscribed = False
+        return recipe
 
     def update(self, instance, validated_data):
         """Обновление рецепта."""
-        instance.name = validated_data.get('name', instance.name)
-        instance.image = validated_data.get('image', instance.image)
-        instance.cooking_time = validated_data.get(
-            'cooking_time',
-            instance.cooking_time)
-
         new_text = validated_data.get('text', instance.text)
         author = self.context.get('request').user
 
         if new_text != instance.text:
-            if Recipe.objects.filter(author=author, text=new_text) \
-                    .exclude(id=instance.id).exists():
+            if recipe_text_exists(author, new_text, exclude_id=instance.id):
                 raise serializers.ValidationError(
                     'У Вас уже есть рецепт с таким же описанием. '
                     'Проверьте свой рецепт.'
                 )
-            instance.text = new_text
-
-        old_ingredients = IngredientInRecipe.objects.filter(
-            recipe_id=instance.id)
-        old_ingredients.delete()
-        create_update_recipes(validated_data, instance=instance)
 
-        instance.save()
-        return instance
+        return create_update_recipes(
+            validated_data,
+            getattr(self, 'ingredients_by_id', {}),
+            instance=instance
+        )
 
     def to_representation(self, instance):
         """Переопределение Response-ответа."""
@@ -259,7 +351,7 @@ class FollowSerializer(CustomUserSerializer):
     """
 
     recipes = serializers.SerializerMethodField()
-    recipes_count = serializers.SerializerMethodField()
+    recipes_count = serializers.IntegerField(read_only=True)
 
     class Meta(CustomUserSerializer.Meta):
         fields = (
@@ -285,23 +377,58 @@ class FollowSerializer(CustomUserSerializer):
         Функция выдаёт список рецептов автора,
         на которого подписан пользователь.
         В каждом списке хранится id, name, image, cooking_time.
+        Использует рецепты, подгруженные в limited_recipes, если они есть.
         """
-        limit = self.context.get('request')._request.GET.get('recipes_limit')
-        recipes_data = Recipe.objects.filter(
-            author=obj.id
-        )
-        if limit:
-            recipes_data = recipes_data[:int(limit)]
+        recipes = getattr(obj, 'limited_recipes', None)
+
+        if recipes is None:
+            limit = get_recipes_limit(self.context.get('request'))
+            recipes = obj.recipe.order_by('-id')
+            if limit:
+                recipes = recipes[:limit]
 
         serializer = RecipeMinifiedSerializer(
-            data=recipes_data,
-            many=True
+            recipes,
+            many=True,
+            context=self.context
         )
-        serializer.is_valid()
         return serializer.data
 
-    def get_recipes_count(self, obj):
-        """
-        Возвращает количество рецептов у избранного автора.
-        """
-        return obj.recipe.count()
+
+class ShoppingListItemSerializer(serializers.ModelSerializer):
+    """
+    Строка списка покупок.
+    """
+
+    class Meta:
+        model = ShoppingListItem
+        fields = ('name', 'measurement_unit', 'amount')
+
+
+class ShoppingListSerializer(serializers.Serializer):
+    """
+    Список покупок с пищевой ценностью и стоимостью рецептов в корзине.
+    """
+
+    items = ShoppingListItemSerializer(many=True, read_only=True)
+    nutrition = NutritionSerializer(source='totals', read_only=True)
+    price = serializers.DecimalField(
+        source='totals.total_price', max_digits=14, decimal_places=2,
+        coerce_to_string=False, read_only=True
+    )
+
+
+class BulkIdsSerializer(serializers.Serializer):
+    """
+    Список id для массовых операций, не длиннее BULK_MAX_ITEMS.
+    Повторы убираются с сохранением порядка.
+    """
+
+    ids = serializers.ListField(
+        child=serializers.IntegerField(min_value=1),
+        allow_empty=False,
+        max_length=settings.BULK_MAX_ITEMS,
+    )
+
+    def validate_ids(self, ids):
+        return list(dict.fromkeys(ids))
@@ -0,0 +1,150 @@
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.backends.signals import connection_created
+from django.db.models.signals import (
+    m2m_changed, post_delete, post_save, pre_save)
+from django.dispatch import receiver
+
+from recipes.models import (
+    FavoriteRecipe, Follow, Ingredient, IngredientInRecipe, Recipe,
+    ShopingCart, Tag)
+from .cache import (
+    bump_catalog_version, bump_recipe_version, bump_user_flags_version)
+from .images import (
+    delete_image_variants, schedule_image_variants, variants_outdated)
+from .indexes import (
+    invalidate_ingredient_index, record_recipe_ingredients_change)
+from .metrics import execute_wrapper
+from .nutrition import nutrition_changed, schedule_ingredient_recompute
+
+User = get_user_model()
+
+# Версии кеша увеличиваются после фиксации транзакции: иначе между
+# сбросом и фиксацией в кеш может попасть ещё не изменённый рецепт.
+
+
+@receiver(post_save, sender=Recipe)
+@receiver(post_delete, sender=Recipe)
+def recipe_changed(sender, instance, **kwargs):
+    """Сбрасывает кеш рецепта при его изменении или удалении."""
+    recipe_id = instance.id
+    transaction.on_commit(lambda: bump_recipe_version(recipe_id))
+
+
+@receiver(post_save, sender=Recipe)
+def recipe_image_changed(sender, instance, **kwargs):
+    """Запускает построение копий нового изображения рецепта."""
+    if variants_outdated(instance):
+        schedule_image_variants(instance.id)
+
+
+@receiver(post_delete, sender=Recipe)
+def recipe_image_deleted(sender, instance, **kwargs):
+    """Удаляет копии изображения вместе с рецептом."""
+    if instance.image_variants:
+        delete_image_variants.enqueue(variants=instance.image_variants)
+
+
+@receiver(post_save, sender=IngredientInRecipe)
+@receiver(post_delete, sender=IngredientInRecipe)
+def recipe_ingredients_changed(sender, instance, **kwargs):
+    """Сбрасывает кеш рецепта при изменении его ингредиентов."""
+    recipe_id = instance.recipe_id
+    transaction.on_commit(lambda: bump_recipe_version(recipe_id))
+
+
+@receiver(post_save, sender=IngredientInRecipe)
+@receiver(post_delete, sender=IngredientInRecipe)
+@receiver(post_delete, sender=Recipe)
+def recipe_ingredients_index_changed(sender, instance, **kwargs):
+    """
+    Обновляет индекс для подбора рецептов по ингредиентам.
+    Массовое сохранение ингредиентов в create_update_recipes
+    сигналы не отправляет и сообщает об изменении само.
+    """
+    recipe_id = instance.id if sender is Recipe else instance.recipe_id
+    transaction.on_commit(
+        lambda: record_recipe_ingredients_change(recipe_id)
+    )
+
+
+@receiver(m2m_changed, sender=Recipe.tags.through)
+def recipe_tags_changed(sender, instance, action, **kwargs):
+    """Сбрасывает кеш рецепта при изменении его тегов."""
+    if not action.startswith('post_'):
+        return
+    if isinstance(instance, Recipe):
+        recipe_id = instance.id
+        transaction.on_commit(lambda: bump_recipe_version(recipe_id))
+    else:
+        transaction.on_commit(bump_catalog_version)
+
+
+@receiver(post_save, sender=Tag)
+@receiver(post_delete, sender=Tag)
+@receiver(post_save, sender=Ingredient)
+@receiver(post_delete, sender=Ingredient)
+def catalog_changed(sender, **kwargs):
+    """Сбрасывает кеш всех рецептов при изменении тегов и ингредиентов."""
+    transaction.on_commit(bump_catalog_version)
+
+
+@receiver(post_save, sender=Ingredient)
+@receiver(post_delete, sender=Ingredient)
+def ingredient_changed(sender, **kwargs):
+    """Сбрасывает индекс для поиска ингредиентов."""
+    transaction.on_commit(invalidate_ingredient_index)
+
+
+@receiver(pre_save, sender=Ingredient)
+def ingredient_nutrition_changing(sender, instance, raw=False, **kwargs):
+    """Запоминает, изменились ли пищевая ценность или цена."""
+    instance._nutrition_changed = not raw and nutrition_changed(instance)
+
+
+@receiver(post_save, sender=Ingredient)
+def ingredient_nutrition_changed(sender, instance, **kwargs):
+    """
+    Пересчитывает суммы рецептов с ингредиентом в фоне:
+    у популярного ингредиента их слишком много для одного запроса.
+    """
+    if getattr(instance, '_nutrition_changed', False):
+        schedule_ingredient_recompute(instance.id)
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def author_changed(sender, update_fields=None, **kwargs):
+    """
+    Сбрасывает кеш всех рецептов при изменении данных пользователя.
+    Обновление только last_login при входе кеш не затрагивает.
+    """
+    if update_fields is not None and set(update_fields) == {'last_login'}:
+        return
+    transaction.on_commit(bump_catalog_version)
+
+
+@receiver(post_save, sender=FavoriteRecipe)
+@receiver(post_delete, sender=FavoriteRecipe)
+@receiver(post_save, sender=ShopingCart)
+@receiver(post_delete, sender=ShopingCart)
+@receiver(post_save, sender=Follow)
+@receiver(post_delete, sender=Follow)
+def user_flags_changed(sender, instance, **kwargs):
+    """
+    Меняет ETag ответов с рецептами для пользователя, у которого
+    изменились избранное, корзина или подписки.
+    """
+    user_id = instance.user_id
+    transaction.on_commit(lambda: bump_user_flags_version(user_id))
+
+
+@receiver(connection_created)
+def connection_opened(sender, connection, **kwargs):
+    """
+    Подключает учёт запросов к БД для метрик к каждому новому соединению,
+    в каком бы потоке оно ни было открыто. Обёртка ставится первой:
+    connection.execute_wrapper() снимает последнюю добавленную.
+    """
+    if execute_wrapper not in connection.execute_wrappers:
+        connection.execute_wrappers.insert(0, execute_wrapper)
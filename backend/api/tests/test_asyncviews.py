@@ -0,0 +1,44 @@
+import asyncio
+import threading
+
+import pytest
+from django.http import StreamingHttpResponse
+
+from api.asyncviews import StreamingASGIHandler
+from users.models import FoodgramUser
+
+
+def send_response(response):
+    messages = []
+
+    async def send(message):
+        messages.append(message)
+
+    asyncio.run(StreamingASGIHandler().send_response(response, send))
+    return messages
+
+
+@pytest.mark.django_db(transaction=True)
+def test_streaming_response_read_outside_event_loop(user):
+    threads = []
+    closed = []
+
+    def stream():
+        # Запрос к БД из цикла событий вызвал бы SynchronousOnlyOperation.
+        for user in FoodgramUser.objects.iterator(chunk_size=1):
+            threads.append(threading.current_thread())
+            yield f'{user.username}\n'
+        yield 'конец\n'
+
+    response = StreamingHttpResponse(stream(), content_type='text/plain')
+    response._resource_closers.append(lambda: closed.append(True))
+
+    messages = send_response(response)
+
+    assert messages[0]['type'] == 'http.response.start'
+    assert (b'Content-Type', b'text/plain') in messages[0]['headers']
+    assert [message.get('body') for message in messages[1:]] == [
+        b'user\n', 'конец\n'.encode(), None
+    ]
+    assert threads and threads[0] is not threading.main_thread()
+    assert closed == [True]
@@ -0,0 +1,70 @@
+from recipes.models import Recipe, ShopingCart, ShoppingListItem
+from users.models import FoodgramUser
+
+
+def test_single_then_bulk_add_counts_once(user, user_client, author,
+                                          make_recipes):
+    first, second = make_recipes(author, 2)
+
+    response = user_client.post(f'/api/recipes/{first.id}/shopping_cart/')
+    assert response.status_code == 200
+
+    response = user_client.post(
+        '/api/recipes/shopping_cart/bulk/',
+        {'ids': [first.id, second.id]}, format='json'
+    )
+
+    assert response.status_code == 200
+    assert response.json()['results'] == [
+        {'id': first.id, 'status': 'exists'},
+        {'id': second.id, 'status': 'created'},
+    ]
+    assert ShopingCart.objects.filter(user=user).count() == 2
+    counts = dict(Recipe.objects.values_list('id', 'in_carts_count'))
+    assert counts == {first.id: 1, second.id: 1}
+    amounts = dict(ShoppingListItem.objects.filter(user=user).values_list(
+        'name', 'amount'
+    ))
+    # Рецепты делят два ингредиента из трёх.
+    assert sum(amounts.values()) == 12
+
+
+def test_repeated_single_add_is_rejected(user_client, author, make_recipes):
+    recipe = make_recipes(author, 1)[0]
+    url = f'/api/recipes/{recipe.id}/favorite/'
+
+    assert user_client.post(url).status_code == 200
+    assert user_client.post(url).status_code == 400
+
+    recipe.refresh_from_db()
+    assert recipe.favorites_count == 1
+
+
+def test_bulk_subscribe_counts_new_follows(user, user_client, author,
+                                           make_user):
+    other = make_user('other')
+    user_client.post(f'/api/users/{author.id}/subscribe/')
+
+    response = user_client.post(
+        '/api/users/subscribe/bulk/',
+        {'ids': [author.id, other.id, user.id]}, format='json'
+    )
+
+    assert [result['status'] for result in response.json()['results']] == [
+        'exists', 'created', 'rejected'
+    ]
+    counts = dict(FoodgramUser.objects.values_list('id', 'followers_count'))
+    assert counts[author.id] == 1
+    assert counts[other.id] == 1
+    user.refresh_from_db()
+    assert user.following_count == 2
+
+
+def test_unsubscribe(user_client, author):
+    url = f'/api/users/{author.id}/subscribe/'
+    user_client.post(url)
+
+    assert user_client.delete(url).status_code == 204
+    assert user_client.delete(url).status_code == 404
+    author.refresh_from_db()
+    assert author.followers_count == 0
@@ -0,0 +1,28 @@
+from api.checks import check_shared_cache
+
+LOCMEM = {'default': {
+    'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+}}
+REDIS = {'default': {
+    'BACKEND': 'django_redis.cache.RedisCache',
+    'LOCATION': 'redis://foodgram_redis:6379/1',
+}}
+
+
+def test_per_process_cache_warning(settings):
+    settings.DEBUG = False
+    settings.CACHES = LOCMEM
+
+    assert [message.id for message in check_shared_cache(None)] == [
+        'api.W005'
+    ]
+
+
+def test_shared_or_debug_cache_not_reported(settings):
+    settings.DEBUG = False
+    settings.CACHES = REDIS
+    assert check_shared_cache(None) == []
+
+    settings.DEBUG = True
+    settings.CACHES = LOCMEM
+    assert check_shared_cache(None) == []
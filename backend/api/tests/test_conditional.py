@@ -0,0 +1,38 @@
+import pytest
+
+RECIPES_URL = '/api/recipes/'
+
+
+@pytest.mark.django_db
+def test_counter_change_refreshes_cached_recipes(
+    client, user_client, author, make_recipes
+):
+    recipe, = make_recipes(author, 1)
+    detail_url = f'{RECIPES_URL}{recipe.id}/'
+    list_response = client.get(RECIPES_URL)
+    detail_response = client.get(detail_url)
+    assert list_response.data['results'][0]['favorites_count'] == 0
+    assert detail_response.data['favorites_count'] == 0
+
+    assert user_client.post(f'{detail_url}favorite/').status_code == 200
+
+    response = client.get(
+        RECIPES_URL, HTTP_IF_NONE_MATCH=list_response['ETag']
+    )
+    assert response.status_code == 200
+    assert response.data['results'][0]['favorites_count'] == 1
+    response = client.get(
+        detail_url, HTTP_IF_NONE_MATCH=detail_response['ETag']
+    )
+    assert response.status_code == 200
+    assert response.data['favorites_count'] == 1
+
+
+@pytest.mark.django_db
+def test_unchanged_recipes_not_modified(client, author, make_recipes):
+    make_recipes(author, 2)
+    response = client.get(RECIPES_URL)
+
+    response = client.get(RECIPES_URL, HTTP_IF_NONE_MATCH=response['ETag'])
+
+    assert response.status_code == 304
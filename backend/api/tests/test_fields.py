@@ -0,0 +1,45 @@
+import base64
+import io
+
+import pytest
+from PIL import Image
+from rest_framework.exceptions import ValidationError
+
+from api.fields import RecipeImageField
+
+
+def png_bytes():
+    buffer = io.BytesIO()
+    Image.new('RGB', (64, 48), 'red').save(buffer, 'PNG')
+    return buffer.getvalue()
+
+
+@pytest.fixture
+def field():
+    field = RecipeImageField()
+    # Порции не кратны длине строки base64 с переносами (76 + 1).
+    field.chunk_size = 64
+    return field
+
+
+@pytest.mark.parametrize('encode', [
+    base64.b64encode,
+    base64.encodebytes,
+    lambda data: base64.encodebytes(data).replace(b'\n', b'\r\n'),
+])
+def test_decode_in_chunks(field, encode):
+    data = png_bytes()
+    payload = 'data:image/png;base64,' + encode(data).decode()
+
+    file = field._decode(payload)
+
+    assert file.read() == data
+    assert file.size == len(data)
+    assert file.name.endswith('.png')
+
+
+def test_decode_rejects_truncated_payload(field):
+    payload = base64.b64encode(png_bytes()).decode()[:-1]
+
+    with pytest.raises(ValidationError):
+        field._decode('data:image/png;base64,' + payload)
@@ -0,0 +1,33 @@
+import pytest
+
+METRICS_URL = '/api/metrics/'
+
+
+def test_metrics_hidden_without_token(client, user):
+    assert client.get(METRICS_URL).status_code == 403
+    client.force_login(user)
+    assert client.get(METRICS_URL).status_code == 403
+
+
+def test_metrics_for_staff_without_token(client, user):
+    user.is_staff = True
+    user.save()
+    client.force_login(user)
+
+    response = client.get(METRICS_URL)
+
+    assert response.status_code == 200
+    assert response['Content-Type'].startswith('text/plain')
+
+
+@pytest.mark.parametrize('header, expected', [
+    ('Bearer metrics-token', 200),
+    ('Bearer wrong-token', 403),
+    ('', 403),
+])
+def test_metrics_token(client, settings, header, expected):
+    settings.METRICS_TOKEN = 'metrics-token'
+
+    response = client.get(METRICS_URL, HTTP_AUTHORIZATION=header)
+
+    assert response.status_code == expected
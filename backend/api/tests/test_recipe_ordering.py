@@ -0,0 +1,41 @@
+import pytest
+
+from recipes.models import RecipeScore
+
+RECIPES_URL = '/api/recipes/'
+
+
+@pytest.fixture
+def scored_recipes(author, make_recipes):
+    """Рецепты с оценками 2, 1, 2, 0: у первого и третьего равные."""
+    recipes = make_recipes(author, 4)
+    for recipe, value in zip(recipes, (2, 1, 2, 0)):
+        RecipeScore.objects.filter(recipe=recipe).update(
+            popular=value, trending=value
+        )
+    first, second, third, fourth = (recipe.id for recipe in recipes)
+    return [third, first, second, fourth]
+
+
+def result_ids(response):
+    assert response.status_code == 200
+    return [recipe['id'] for recipe in response.data['results']]
+
+
+@pytest.mark.parametrize('name', ['popular', 'trending'])
+def test_score_ordering(client, scored_recipes, name):
+    descending = result_ids(client.get(RECIPES_URL, {'ordering': f'-{name}'}))
+    ascending = result_ids(client.get(RECIPES_URL, {'ordering': name}))
+
+    assert descending == scored_recipes
+    assert ascending == scored_recipes[::-1]
+
+
+def test_score_ordering_with_cursor(client, scored_recipes):
+    response = client.get(
+        RECIPES_URL, {'ordering': '-popular', 'cursor': '', 'limit': 3}
+    )
+    ids = result_ids(response)
+    ids += result_ids(client.get(response.data['next']))
+
+    assert ids == scored_recipes
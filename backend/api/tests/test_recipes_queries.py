@@ -0,0 +1,44 @@
+import pytest
+
+from recipes.models import FavoriteRecipe, Follow, ShopingCart
+
+# Авторизация по токену, время изменения для ETag, COUNT(*) пагинации,
+# страница рецептов, теги, ингредиенты и авторы с флагом is_subscribed.
+RECIPES_LIST_QUERIES = 7
+ANONYMOUS_RECIPES_LIST_QUERIES = 6
+
+
+@pytest.fixture
+def recipes(user, author, make_recipes):
+    recipes = make_recipes(author, 30)
+    FavoriteRecipe.objects.create(user=user, recipe=recipes[-1])
+    ShopingCart.objects.create(user=user, recipe=recipes[-2])
+    Follow.objects.create(user=user, author=author)
+    return recipes
+
+
+@pytest.mark.parametrize('limit', [6, 25])
+def test_recipes_list_queries(
+    user_client, recipes, django_assert_num_queries, limit
+):
+    with django_assert_num_queries(RECIPES_LIST_QUERIES):
+        response = user_client.get('/api/recipes/', {'limit': limit})
+
+    assert response.status_code == 200
+    results = response.json()['results']
+    assert len(results) == limit
+    assert results[0]['is_favorited'] is True
+    assert results[1]['is_in_shopping_cart'] is True
+    assert results[0]['author']['is_subscribed'] is True
+    assert len(results[0]['ingredients']) == 3
+
+
+@pytest.mark.parametrize('limit', [6, 25])
+def test_anonymous_recipes_list_queries(
+    client, recipes, django_assert_num_queries, limit
+):
+    with django_assert_num_queries(ANONYMOUS_RECIPES_LIST_QUERIES):
+        response = client.get('/api/recipes/', {'limit': limit})
+
+    assert response.status_code == 200
+    assert len(response.json()['results']) == limit
@@ -0,0 +1,83 @@
+import pytest
+from django.db import transaction
+from django.http import HttpResponse
+from django.test import RequestFactory
+from rest_framework.authtoken.models import Token
+
+from api.middleware import ReplicaMiddleware
+from recipes.models import Recipe
+
+TOKEN = 'Token 0123456789abcdef'
+
+
+@pytest.fixture(autouse=True)
+def replicas(settings):
+    settings.DATABASE_REPLICAS = ['replica_1']
+
+
+def route(method='get', read=lambda: Recipe.objects.all().db,
+          status=200, **headers):
+    """
+    Выполняет запрос через ReplicaMiddleware и возвращает БД,
+    которую ReplicaRouter выбрал для чтения внутри него.
+    """
+    databases = []
+
+    def view(request):
+        databases.append(read())
+        return HttpResponse(status=status)
+
+    request = getattr(RequestFactory(), method)('/api/recipes/', **headers)
+    ReplicaMiddleware(view)(request)
+    return databases[0]
+
+
+def test_get_reads_from_replica():
+    assert route() == 'replica_1'
+
+
+@pytest.mark.parametrize('method', ['post', 'patch', 'delete'])
+def test_unsafe_methods_read_from_primary(method):
+    assert route(method) == 'default'
+
+
+def test_primary_without_replicas(settings):
+    settings.DATABASE_REPLICAS = []
+
+    assert route() == 'default'
+
+
+def test_sticky_primary_after_write():
+    route('post', status=201, HTTP_AUTHORIZATION=TOKEN)
+
+    assert route(HTTP_AUTHORIZATION=TOKEN) == 'default'
+    assert route(HTTP_AUTHORIZATION='Token another') == 'replica_1'
+
+
+def test_failed_write_is_not_sticky():
+    route('post', status=400, HTTP_AUTHORIZATION=TOKEN)
+
+    assert route(HTTP_AUTHORIZATION=TOKEN) == 'replica_1'
+
+
+def test_tokens_read_from_primary():
+    assert route(read=lambda: Token.objects.all().db) == 'default'
+
+
+@pytest.mark.django_db(transaction=True)
+def test_reads_inside_atomic_from_primary():
+    def read():
+        with transaction.atomic():
+            return Recipe.objects.all().db
+
+    assert route(read=read) == 'default'
+
+
+def test_one_replica_per_request(settings):
+    settings.DATABASE_REPLICAS = ['replica_1', 'replica_2']
+
+    def read():
+        return {Recipe.objects.all().db for _ in range(20)}
+
+    for _ in range(10):
+        assert len(route(read=read)) == 1
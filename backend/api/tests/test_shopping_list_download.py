@@ -0,0 +1,64 @@
+import tracemalloc
+
+import pytest
+
+from recipes.models import ShoppingListItem
+
+
+def fill_shopping_list(user, count):
+    ShoppingListItem.objects.filter(user=user).delete()
+    ShoppingListItem.objects.bulk_create(
+        ShoppingListItem(
+            user=user,
+            name=f'Ингредиент {number:06}',
+            measurement_unit='г',
+            amount=number,
+        ) for number in range(count)
+    )
+
+
+def download_peak_memory(client, file_format):
+    """Пик памяти при чтении всего файла, в байтах."""
+    response = client.get(
+        '/api/recipes/download_shopping_cart/', {'format': file_format}
+    )
+    assert response.status_code == 200
+    tracemalloc.start()
+    try:
+        size = sum(len(part) for part in response.streaming_content)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    assert size > 0
+    return peak
+
+
+@pytest.mark.parametrize('file_format', ['txt', 'csv', 'json'])
+def test_download_memory_does_not_grow_with_list(
+    user, user_client, file_format
+):
+    fill_shopping_list(user, 1000)
+    small = download_peak_memory(user_client, file_format)
+    fill_shopping_list(user, 10000)
+    large = download_peak_memory(user_client, file_format)
+
+    # Строки читаются из БД порциями, поэтому в десять раз больший
+    # список не должен требовать заметно больше памяти.
+    assert large < small * 2
+
+
+def test_download_csv_contents(user, user_client):
+    fill_shopping_list(user, 3)
+
+    response = user_client.get(
+        '/api/recipes/download_shopping_cart/', {'format': 'csv'}
+    )
+
+    content = b''.join(response.streaming_content).decode()
+    assert response['Content-Type'].startswith('text/csv')
+    assert content.splitlines() == [
+        'name,measurement_unit,amount',
+        'Ингредиент 000000,г,0',
+        'Ингредиент 000001,г,1',
+        'Ингредиент 000002,г,2',
+    ]
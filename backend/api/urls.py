@@ -1,16 +1,17 @@
 from django.urls import include, path
-from rest_framework.routers import DefaultRouter
 
+from .asyncviews import AsyncReadRouter
 from .views import (CustomUsersViewSet, IngredientsViewSet, RecipesViewSet,
-                    TagsViewSet)
+                    TagsViewSet, metrics)
 
-router = DefaultRouter()
+router = AsyncReadRouter()
 router.register('users', CustomUsersViewSet, basename='users')
 router.register('tags', TagsViewSet, basename='tags')
 router.register('recipes', RecipesViewSet, basename='recipes')
 router.register('ingredients', IngredientsViewSet, basename='ingredients')
 
 urlpatterns = [
+    path('metrics/', metrics, name='metrics'),
     path('', include(router.urls)),
     path('', include('djoser.urls')),
     path('auth/', include('djoser.urls.authtoken')),
@@ -1,8 +1,18 @@
+import hashlib
+
+from django.db import transaction
+from django.db.models import F, Prefetch, Window, prefetch_related_objects
+from django.db.models.expressions import RawSQL
+from django.db.models.functions import MD5, RowNumber
 from django.shortcuts import get_object_or_404
 from rest_framework import status
 from rest_framework.response import Response
 
-from recipes.models import (IngredientInRecipe, Ingredient, Recipe)
+from recipes import nutrition, shopping_list
+from recipes.bulk import lock_user
+from recipes.models import IngredientInRecipe, Recipe
+from .cache import bump_user_flags_version
+from .indexes import record_recipe_ingredients_change
 
 
 def add_del_recipesview(request, model, recipeminifiedserializer, **kwargs):
@@ -14,34 +24,39 @@ def add_del_recipesview(request, model, recipeminifiedserializer, **kwargs):
     recipe_id = kwargs['pk']
     user = request.user
     recipe_obj = get_object_or_404(Recipe, pk=recipe_id)
-    data = {
-        "id": recipe_id,
-        "name": recipe_obj.name,
-        "image": recipe_obj.image,
-        "cooking_time": recipe_obj.cooking_time,
-    }
 
     if request.method == 'POST':
         serializer = recipeminifiedserializer(
-            instance=data,
+            instance=recipe_obj,
             data=request.data,
             context={'request': request}
         )
 
         if serializer.is_valid():
-            model.objects.create(
-                user=user, recipe_id=recipe_id
-            )
+            with transaction.atomic():
+                # Та же блокировка, что и в массовом добавлении:
+                # без неё параллельные запросы добавили бы рецепт дважды.
+                lock_user(user.id)
+                _, created = model.objects.get_or_create(
+                    user=user, recipe_id=recipe_id
+                )
+            if not created:
+                return Response(
+                    {'errors': 'Рецепт уже добавлен.'},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
             return Response(
                 serializer.data, status=status.HTTP_200_OK
             )
 
     if request.method == 'DELETE':
-        get_object_or_404(
-            model,
-            user=user,
-            recipe_id=recipe_id
-        ).delete()
+        with transaction.atomic():
+            lock_user(user.id)
+            get_object_or_404(
+                model,
+                user=user,
+                recipe_id=recipe_id
+            ).delete()
         return Response(status=status.HTTP_204_NO_CONTENT)
 
     return Response(
@@ -50,26 +65,228 @@ def add_del_recipesview(request, model, recipeminifiedserializer, **kwargs):
     )
 
 
-def create_update_recipes(validated_data, author=None, instance=None):
-    """Утилита для RecipesSerializer для методов create, update."""
-    tags = validated_data.pop('tags')
-    ingredients = validated_data.pop('ingredientin_recipe')
+BULK_CREATED = 'created'
+BULK_EXISTS = 'exists'
+BULK_NOT_FOUND = 'not_found'
+BULK_REJECTED = 'rejected'
+
+
+def bulk_add_view(request, ids, queryset, add, rejected=()):
+    """
+    Утилита для массовых операций. Проверяет существование объектов
+    с id из ids одним запросом, передаёт найденные в add и возвращает
+    результат по каждому id: created, exists, not_found или rejected
+    (id из rejected, например подписка на самого себя).
+    add получает список id и возвращает множество добавленных.
+    """
+    found = set(queryset.filter(id__in=ids).values_list('id', flat=True))
+    valid = [pk for pk in ids if pk in found and pk not in rejected]
+    created = add(valid) if valid else set()
+    if created:
+        user_id = request.user.id
+        transaction.on_commit(lambda: bump_user_flags_version(user_id))
+
+    results = []
+    for pk in ids:
+        if pk not in found:
+            result = BULK_NOT_FOUND
+        elif pk in rejected:
+            result = BULK_REJECTED
+        elif pk in created:
+            result = BULK_CREATED
+        else:
+            result = BULK_EXISTS
+        results.append({'id': pk, 'status': result})
+    return Response({'results': results}, status=status.HTTP_200_OK)
+
+
+def recipe_text_exists(author, text, exclude_id=None):
+    """
+    Проверяет, есть ли у автора рецепт с таким же описанием.
+    Сравнение идёт по MD5 описания, чтобы запрос использовал индекс
+    (author, md5(text)) вместо сравнения длинных текстов.
+    """
+    recipes = Recipe.objects.annotate(text_md5=MD5('text')).filter(
+        author=author,
+        text_md5=hashlib.md5(text.encode()).hexdigest(),
+        text=text,
+    )
+    if exclude_id is not None:
+        recipes = recipes.exclude(id=exclude_id)
+    return recipes.exists()
+
+
+def sync_recipe_ingredients(recipe, ingredients, ingredients_by_id):
+    """
+    Приводит ингредиенты рецепта к переданному списку.
+    Вставляются, обновляются и удаляются только изменившиеся строки.
+    Возвращает актуальные строки IngredientInRecipe с заполненным
+    ingredient.
+    """
+    current = {
+        row.ingredient_id: row for row in recipe.ingredient_recipe.all()
+    }
+    amounts = {
+        ingredient['id']: ingredient['amount'] for ingredient in ingredients
+    }
+    to_create, to_update, rows = [], [], []
+
+    for ingredient_id, amount in amounts.items():
+        row = current.get(ingredient_id)
+        if row is None:
+            row = IngredientInRecipe(
+                recipe=recipe,
+                ingredient=ingredients_by_id[ingredient_id],
+                amount=amount,
+            )
+            to_create.append(row)
+        else:
+            row.ingredient = ingredients_by_id[ingredient_id]
+            if row.amount != amount:
+                row.amount = amount
+                to_update.append(row)
+        rows.append(row)
+
+    to_delete = [
+        row.id for ingredient_id, row in current.items()
+        if ingredient_id not in amounts
+    ]
+    if to_create:
+        IngredientInRecipe.objects.bulk_create(to_create)
+    if to_update:
+        IngredientInRecipe.objects.bulk_update(to_update, ['amount'])
+    if to_delete:
+        IngredientInRecipe.objects.filter(id__in=to_delete).delete()
+
+    return sorted(rows, key=lambda row: row.ingredient.name)
+
 
-    if instance is None:
-        recipe = Recipe.objects.create(author=author, **validated_data)
-    else:
-        recipe = instance
+def create_update_recipes(validated_data, ingredients_by_id,
+                          author=None, instance=None):
+    """
+    Утилита для RecipesSerializer для методов create, update.
+    Все изменения выполняются в одной транзакции. Теги и ингредиенты
+    рецепта сохраняются в кеше prefetch_related, чтобы ответ строился
+    без повторных запросов к БД. Суммы пищевой ценности и стоимости
+    считаются по уже загруженным ингредиентам и сохраняются вместе
+    с рецептом.
+    """
+    tags = validated_data.pop('tags', None)
+    ingredients = validated_data.pop('ingredientin_recipe', None)
+    image = validated_data.get('image')
+    if ingredients is not None:
+        validated_data.update(nutrition.totals(
+            (ingredients_by_id[ingredient['id']], ingredient['amount'])
+            for ingredient in ingredients
+        ))
+
+    with transaction.atomic():
+        if instance is None:
+            recipe = Recipe.objects.create(author=author, **validated_data)
+        else:
+            recipe = instance
+            for field, value in validated_data.items():
+                setattr(recipe, field, value)
+            # Только изменённые поля: счётчики и уменьшенные копии могли
+            # измениться после чтения рецепта в начале запроса.
+            recipe.save(update_fields=[*validated_data, 'updated_at'])
+        if image is not None:
+            # Хранилище уже переместило временный файл изображения.
+            image.close()
 
-    recipe.tags.set(tags)
+        rows = None
+        if ingredients is not None:
+            rows = sync_recipe_ingredients(
+                recipe, ingredients, ingredients_by_id
+            )
+            recipe_id = recipe.id
+            nutrition.discard_recompute(recipe_id)
+            transaction.on_commit(
+                lambda: record_recipe_ingredients_change(recipe_id)
+            )
+            if instance is not None:
+                shopping_list.schedule_rebuild_for_recipe(recipe_id)
+        if tags is not None:
+            recipe.tags.set(tags)
 
-    IngredientInRecipe.objects.bulk_create([
-        IngredientInRecipe(
-            recipe=recipe,
-            amount=ingredient.get('amount'),
-            ingredient=Ingredient.objects.get(
-                id=ingredient.get('id')
-            ),
-        ) for ingredient in ingredients
-    ])
+    prefetched = getattr(recipe, '_prefetched_objects_cache', {})
+    if rows is not None:
+        prefetched['ingredient_recipe'] = rows
+    if tags is not None:
+        prefetched['tags'] = sorted(tags, key=lambda tag: tag.name)
+    recipe._prefetched_objects_cache = prefetched
 
     return recipe
+
+
+def get_recipes_limit(request):
+    """
+    Значение параметра recipes_limit из запроса.
+    Некорректные и неположительные значения игнорируются.
+    """
+    limit = request.query_params.get('recipes_limit')
+    try:
+        limit = int(limit)
+    except (TypeError, ValueError):
+        return None
+    return limit if limit > 0 else None
+
+
+def get_ingredient_ids(request):
+    """
+    id ингредиентов из параметра ingredients запроса.
+    Принимаются как повторяющиеся параметры, так и список через запятую,
+    некорректные значения игнорируются.
+    """
+    ingredient_ids = set()
+    for value in request.query_params.getlist('ingredients'):
+        for item in value.split(','):
+            if item.strip().isdigit():
+                ingredient_ids.add(int(item))
+    return ingredient_ids
+
+
+def get_max_missing(request):
+    """
+    Значение параметра max_missing из запроса.
+    Некорректные и отрицательные значения игнорируются.
+    """
+    try:
+        max_missing = int(request.query_params.get('max_missing'))
+    except (TypeError, ValueError):
+        return None
+    return max_missing if max_missing >= 0 else None
+
+
+def prefetch_limited_recipes(authors, limit=None):
+    """
+    Подгружает рецепты для списка авторов одним запросом.
+    Рецепты каждого автора сохраняются в атрибут limited_recipes.
+    При заданном limit у каждого автора остаются только limit
+    последних рецептов: они отбираются оконной функцией ROW_NUMBER,
+    разбитой по автору.
+    """
+    author_ids = [author.id for author in authors]
+    recipes = Recipe.objects.filter(author_id__in=author_ids)
+
+    if limit:
+        ranked = recipes.annotate(
+            row_number=Window(
+                expression=RowNumber(),
+                partition_by=F('author_id'),
+                order_by=F('id').desc(),
+            )
+        ).order_by().values('id', 'row_number')
+        sql, params = ranked.query.sql_with_params()
+        recipes = Recipe.objects.filter(id__in=RawSQL(
+            f'SELECT ranked.id FROM ({sql}) ranked '
+            'WHERE ranked.row_number <= %s',
+            (*params, limit)
+        ))
+
+    prefetch_related_objects(authors, Prefetch(
+        'recipe',
+        queryset=recipes.order_by('-id'),
+        to_attr='limited_recipes',
+    ))
+    return authors
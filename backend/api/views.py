@@ -1,41 +1,78 @@
+from hmac import compare_digest
+
+from django.conf import settings
 from django.contrib.auth import get_user_model
-from django.http import HttpResponse
+from django.core.cache import cache
+from django.http import HttpResponse, StreamingHttpResponse
 from django.shortcuts import get_object_or_404
-from django.db.models import Count
+from django.db import transaction
+from django.db.models import Exists, OuterRef, Prefetch, Value
 from django_filters.rest_framework import DjangoFilterBackend
 from djoser.views import UserViewSet
-from django.db.models import Sum
 from rest_framework import status, viewsets
 from rest_framework.decorators import action
+from rest_framework.pagination import PageNumberPagination
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
-from rest_framework.pagination import PageNumberPagination
 
 
+from recipes import bulk
+from recipes.feed import recipe_ids as feed_recipe_ids
+from recipes.nutrition import cart_totals
 from recipes.models import (
     ShopingCart, FavoriteRecipe, Follow,
-    Ingredient, Recipe, Tag, IngredientInRecipe)
+    Ingredient, Recipe, Tag, IngredientInRecipe, ShoppingListItem)
+from .cache import (
+    cache_recipes, get_versions, merge_user_flags, recipe_detail_cache_key,
+    recipe_list_cache_key)
+from .conditional import (
+    catalog_validators, conditional_response, make_validators,
+    object_validators, recipe_validators, recipes_validators)
+from .indexes import (
+    INGREDIENTS_VERSION_KEY, ingredient_index, recipe_ingredient_index)
+from .metrics import SerializerTimingMixin, render_prometheus
+from .pagination import CursorOptInPagination, FeedPagination
 from .permissions import IsAdminOrReadOnly, IsAuthorOrReadOnly
+from .renderers import SHOPPING_LIST_RENDERERS
 from .serializers import (
-    CustomUserSerializer, FollowSerializer, IngredientSerializer,
-    RecipeAddSerializer, RecipeMinifiedSerializer,
-    RecipeSerializer, TagSerializer)
-from .utils import add_del_recipesview
+    BulkIdsSerializer, CustomUserSerializer, FollowSerializer,
+    IngredientSerializer, RecipeAddSerializer, RecipeMatchSerializer,
+    RecipeMinifiedSerializer, RecipeSerializer, ShoppingListSerializer,
+    TagSerializer)
+from .utils import (
+    add_del_recipesview, bulk_add_view, get_ingredient_ids, get_max_missing,
+    get_recipes_limit, prefetch_limited_recipes)
 from .filters import (
     IngredientsFilter, RecipeFilter, RecipeOrderingFilter)
 
 User = get_user_model()
 
 
-class CustomUsersViewSet(UserViewSet):
+class CustomUsersViewSet(SerializerTimingMixin, UserViewSet):
     """Вьюсет для обработки всех запросов от пользователей."""
     queryset = User.objects.all()
     serializer_class = CustomUserSerializer
+    async_actions = ('subscriptions',)
 
-    class SubscriptionsPagination(PageNumberPagination):
+    class SubscriptionsPagination(CursorOptInPagination):
         page_size = 10  # Количество элементов на странице
         page_size_query_param = 'page_size'
         max_page_size = 100
+        ordering = 'username'
+
+    def get_queryset(self):
+        """
+        Пользователи с флагом is_subscribed, вычисленным подзапросом,
+        чтобы список не выполнял по запросу на каждого пользователя.
+        """
+        user = self.request.user
+        if not user.is_authenticated:
+            return super().get_queryset().annotate(is_subscribed=Value(False))
+        return super().get_queryset().annotate(
+            is_subscribed=Exists(Follow.objects.filter(
+                user=user, author=OuterRef('pk')
+            ))
+        )
 
     @action(
         detail=True,
@@ -48,16 +85,23 @@ class CustomUsersViewSet(UserViewSet):
         author_id = kwargs['id']
         author_obj = get_object_or_404(User, id=author_id)
 
-        serializer = FollowSerializer(
+        serializer = self.time_serializer(FollowSerializer(
             instance=author_obj,
             data=request.data,
             context={'request': request}
-        )
+        ))
 
         if serializer.is_valid():
-            Follow.objects.create(
-                user=user, author_id=author_id
-            )
+            with transaction.atomic():
+                bulk.lock_user(user.id)
+                _, created = Follow.objects.get_or_create(
+                    user=user, author_id=author_id
+                )
+            if not created:
+                return Response(
+                    {'errors': f'Вы уже подписаны на {author_obj}.'},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
             return Response(
                 serializer.data, status=status.HTTP_201_CREATED
             )
@@ -73,14 +117,34 @@ class CustomUsersViewSet(UserViewSet):
         user = request.user
         author_id = kwargs['id']
 
-        if get_object_or_404(
-            Follow,
-            user=user,
-            author_id=author_id
-        ).delete():
-            return Response(status=status.HTTP_204_NO_CONTENT)
+        with transaction.atomic():
+            bulk.lock_user(user.id)
+            get_object_or_404(
+                Follow,
+                user=user,
+                author_id=author_id
+            ).delete()
+        return Response(status=status.HTTP_204_NO_CONTENT)
 
-        return Response(status=status.HTTP_400_BAD_REQUEST)
+    @action(
+        detail=False,
+        methods=['POST'],
+        permission_classes=(IsAuthenticated,),
+        url_path='subscribe/bulk',
+    )
+    def subscribe_bulk(self, request):
+        """
+        Подписаться на несколько пользователей из списка ids.
+        Результат возвращается по каждому id.
+        """
+        serializer = BulkIdsSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        user_id = request.user.id
+        return bulk_add_view(
+            request, serializer.validated_data['ids'], User.objects.all(),
+            lambda author_ids: bulk.follow(user_id, author_ids),
+            rejected={user_id}
+        )
 
     @action(
         detail=False,
@@ -91,48 +155,226 @@ class CustomUsersViewSet(UserViewSet):
         Возвращает пользователей,
         на которых подписан текущий пользователь.
         В выдачу добавляются рецепты.
+        Число запросов к БД не зависит от количества авторов на странице.
         """
         subscriptions_data = User.objects.filter(
             following__user=request.user
-        ).annotate(recipes_count=Count('recipe'))
+        ).annotate(
+            is_subscribed=Value(True),
+        ).order_by('username')
 
         paginator = self.SubscriptionsPagination()
-        page = paginator.paginate_queryset(subscriptions_data, request)
-        serializer = FollowSerializer(
+        page = paginator.paginate_queryset(
+            subscriptions_data, request, view=self
+        )
+        prefetch_limited_recipes(page, get_recipes_limit(request))
+        serializer = self.time_serializer(FollowSerializer(
             page,
             many=True,
             context={'request': request}
-        )
+        ))
         return paginator.get_paginated_response(serializer.data)
 
 
-class TagsViewSet(viewsets.ReadOnlyModelViewSet):
+class ConditionalRetrieveMixin:
+    """
+    Один объект справочника с ETag и Last-Modified по его updated_at.
+    Неизменившийся объект отдаётся со статусом 304 без сериализации.
+    """
+
+    def retrieve(self, request, *args, **kwargs):
+        instance = self.get_object()
+        return conditional_response(
+            request, object_validators(request, instance),
+            lambda: Response(self.get_serializer(instance).data)
+        )
+
+
+class TagsViewSet(SerializerTimingMixin, ConditionalRetrieveMixin,
+                  viewsets.ReadOnlyModelViewSet):
     """Вьюсет для просмотра тегов."""
 
     queryset = Tag.objects.all()
     serializer_class = TagSerializer
+    async_actions = ('list', 'retrieve')
     pagination_class = None
     permission_classes = (IsAdminOrReadOnly,)
 
+    def list(self, request, *args, **kwargs):
+        """
+        Список тегов. Неизменившийся список отдаётся со статусом 304.
+        """
+        queryset = self.filter_queryset(self.get_queryset())
+        return conditional_response(
+            request, catalog_validators(request, queryset),
+            lambda: Response(self.get_serializer(queryset, many=True).data)
+        )
 
-class IngredientsViewSet(viewsets.ReadOnlyModelViewSet):
+
+class IngredientsViewSet(SerializerTimingMixin, ConditionalRetrieveMixin,
+                         viewsets.ReadOnlyModelViewSet):
     """Вьюсет для просмотра ингредиентов."""
 
     queryset = Ingredient.objects.all()
     serializer_class = IngredientSerializer
+    async_actions = ('list', 'retrieve')
     pagination_class = None
     filterset_class = IngredientsFilter
     permission_classes = (IsAdminOrReadOnly,)
 
+    def list(self, request, *args, **kwargs):
+        """
+        Поиск ингредиентов по названию через индекс в памяти.
+        Совпадения по началу названия идут перед совпадениями
+        по вхождению. Неизменившийся ответ отдаётся со статусом 304.
+        """
+        name = request.query_params.get('name', '')
+        version = ingredient_index.refresh()
+        _, modified = get_versions([INGREDIENTS_VERSION_KEY])
+        return conditional_response(
+            request,
+            make_validators(
+                request, [version], [ingredient_index.updated_at, *modified]
+            ),
+            lambda: Response(ingredient_index.search(name))
+        )
+
 
-class RecipesViewSet(viewsets.ModelViewSet):
+class RecipesViewSet(SerializerTimingMixin, viewsets.ModelViewSet):
     """Вьюсет для просмотра и редактирования рецептов."""
 
+    class RecipesPagination(CursorOptInPagination):
+        page_size_query_param = 'limit'
+        max_page_size = 100
+
     queryset = Recipe.objects.all()
     serializer_class = RecipeSerializer
     filter_backends = (DjangoFilterBackend, RecipeOrderingFilter)
+    pagination_class = RecipesPagination
     permission_classes = (IsAuthorOrReadOnly | IsAdminOrReadOnly,)
     filterset_class = RecipeFilter
+    async_actions = (
+        'list', 'retrieve', 'what_can_i_cook', 'feed', 'shopping_list',
+        'download_shopping_cart',
+    )
+
+    def get_queryset(self):
+        """
+        Рецепты с заранее подгруженными тегами, ингредиентами и автором.
+        Флаги is_favorited, is_in_shopping_cart и is_subscribed автора
+        вычисляются подзапросами Exists, поэтому число запросов к БД
+        не зависит от размера страницы.
+        """
+        user = self.request.user
+        authors = User.objects.all()
+        queryset = Recipe.objects.defer('search_vector').prefetch_related(
+            'tags',
+            Prefetch(
+                'ingredient_recipe',
+                queryset=IngredientInRecipe.objects.select_related(
+                    'ingredient'
+                ).order_by('ingredient__name')
+            ),
+        )
+
+        if user.is_authenticated:
+            queryset = queryset.annotate(
+                is_favorited=Exists(FavoriteRecipe.objects.filter(
+                    user=user, recipe=OuterRef('pk')
+                )),
+                is_in_shopping_cart=Exists(ShopingCart.objects.filter(
+                    user=user, recipe=OuterRef('pk')
+                )),
+            )
+            authors = authors.annotate(
+                is_subscribed=Exists(Follow.objects.filter(
+                    user=user, author=OuterRef('pk')
+                ))
+            )
+        else:
+            queryset = queryset.annotate(
+                is_favorited=Value(False),
+                is_in_shopping_cart=Value(False),
+            )
+            authors = authors.annotate(is_subscribed=Value(False))
+
+        return queryset.prefetch_related(
+            Prefetch('author', queryset=authors)
+        )
+
+    def list(self, request, *args, **kwargs):
+        """
+        Список рецептов.
+        Ответ кешируется общей для всех пользователей записью,
+        флаги текущего пользователя проставляются после чтения из кеша.
+        Если ETag или Last-Modified из запроса совпадают, ответ 304
+        отдаётся до чтения кеша и сериализации.
+        """
+        queryset = self.filter_queryset(self.get_queryset())
+
+        def build():
+            page = self.paginate_queryset(queryset)
+            serializer = self.get_serializer(page, many=True)
+            return self.get_paginated_response(serializer.data)
+
+        validators = recipes_validators(request, queryset)
+        return conditional_response(
+            request, validators, lambda: self.cached_response(
+                recipe_list_cache_key(request, validators.state), build
+            )
+        )
+
+    def retrieve(self, request, *args, **kwargs):
+        """
+        Один рецепт.
+        Кешируется и проверяется по ETag так же, как список рецептов.
+        """
+        retrieve = super().retrieve
+        validators = recipe_validators(request, kwargs['pk'])
+
+        state = validators.state if validators else ''
+
+        def build():
+            return self.cached_response(
+                recipe_detail_cache_key(request, kwargs['pk'], state),
+                lambda: retrieve(request, *args, **kwargs)
+            )
+
+        if validators is None:
+            return build()
+        return conditional_response(request, validators, build)
+
+    def cached_response(self, key, build):
+        """
+        Ответ из общего кеша рецептов с флагами текущего пользователя.
+        При промахе ответ строится build() и сохраняется в кеш.
+        """
+        if key is None:
+            return build()
+        data = cache.get(key)
+        if data is not None:
+            return Response(merge_user_flags(data, self.request.user))
+
+        response = build()
+        if response.status_code == status.HTTP_200_OK:
+            cache_recipes(key, response.data)
+        return response
+
+    def update(self, request, *args, **kwargs):
+        """
+        Обновление рецепта.
+        В отличие от UpdateModelMixin кеш prefetch_related не сбрасывается:
+        create_update_recipes сам записывает в него новые теги
+        и ингредиенты, и ответ строится без повторных запросов.
+        """
+        partial = kwargs.pop('partial', False)
+        instance = self.get_object()
+        serializer = self.get_serializer(
+            instance, data=request.data, partial=partial
+        )
+        serializer.is_valid(raise_exception=True)
+        self.perform_update(serializer)
+        return Response(serializer.data)
 
     def get_serializer_class(self):
         """
@@ -142,8 +384,69 @@ class RecipesViewSet(viewsets.ModelViewSet):
         """
         if self.action in ('create', 'partial_update'):
             return RecipeAddSerializer
+        if self.action == 'what_can_i_cook':
+            return RecipeMatchSerializer
         return RecipeSerializer
 
+    @action(detail=False)
+    def what_can_i_cook(self, request):
+        """
+        Рецепты, которые можно приготовить из ингредиентов
+        с id из параметра ingredients (например, ?ingredients=1,5,7).
+        Сначала идут рецепты, для которых есть все ингредиенты,
+        затем по возрастанию числа недостающих. Параметр max_missing
+        ограничивает число недостающих ингредиентов.
+        Подбор выполняется по индексу в памяти, из БД читаются
+        только рецепты текущей страницы.
+        """
+        ingredient_ids = get_ingredient_ids(request)
+        recipe_ingredient_index.refresh()
+        matches = recipe_ingredient_index.match(
+            ingredient_ids, get_max_missing(request)
+        )
+
+        paginator = PageNumberPagination()
+        page = paginator.paginate_queryset(matches, request, view=self)
+        recipes = self.get_queryset().in_bulk(
+            [recipe_id for recipe_id, _ in page]
+        )
+        results = []
+        for recipe_id, _ in page:
+            recipe = recipes.get(recipe_id)
+            if recipe is None:
+                continue
+            recipe.missing_ingredients = (
+                recipe_ingredient_index.missing_ingredients(
+                    recipe_id, ingredient_ids
+                )
+            )
+            results.append(recipe)
+
+        serializer = self.get_serializer(results, many=True)
+        return paginator.get_paginated_response(serializer.data)
+
+    @action(detail=False, permission_classes=(IsAuthenticated,))
+    def feed(self, request):
+        """
+        Лента: рецепты авторов, на которых подписан пользователь,
+        от новых к старым, с курсорной пагинацией.
+        id рецептов страницы берутся из заранее разложенной ленты
+        (recipes.feed), из БД читаются только рецепты страницы.
+        """
+        paginator = FeedPagination()
+        page = paginator.paginate_ids(
+            lambda before, limit: feed_recipe_ids(
+                request.user.id, before, limit
+            ),
+            request
+        )
+        recipes = self.get_queryset().in_bulk(page)
+        serializer = self.get_serializer(
+            [recipes[recipe_id] for recipe_id in page if recipe_id in recipes],
+            many=True
+        )
+        return paginator.get_paginated_response(serializer.data)
+
     @action(
         detail=True,
         methods=['POST', 'DELETE'],
@@ -169,22 +472,101 @@ class RecipesViewSet(viewsets.ModelViewSet):
 
     @action(
         detail=False,
-        permission_classes=(IsAuthenticated,)
+        methods=['POST'],
+        permission_classes=(IsAuthenticated,),
+        url_path='shopping_cart/bulk',
+    )
+    def cart_bulk(self, request):
+        """Добавить в список покупок рецепты из списка ids."""
+        return self.bulk_add_recipes(request, ShopingCart)
+
+    @action(
+        detail=False,
+        methods=['POST'],
+        permission_classes=(IsAuthenticated,),
+        url_path='favorite/bulk',
+    )
+    def favorite_bulk(self, request):
+        """Добавить в избранное рецепты из списка ids."""
+        return self.bulk_add_recipes(request, FavoriteRecipe)
+
+    def bulk_add_recipes(self, request, model):
+        """
+        Массовое добавление рецептов в избранное или корзину:
+        существование рецептов проверяется одним запросом, строки
+        вставляются одним INSERT в одной транзакции.
+        """
+        serializer = BulkIdsSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        user_id = request.user.id
+        return bulk_add_view(
+            request, serializer.validated_data['ids'], Recipe.objects.all(),
+            lambda recipe_ids: bulk.add_recipes(model, user_id, recipe_ids)
+        )
+
+    @action(
+        detail=False,
+        permission_classes=(IsAuthenticated,),
+        url_path='shopping_cart',
+        url_name='shopping-list',
+    )
+    def shopping_list(self, request):
+        """
+        Список покупок текущего пользователя в JSON.
+        Список хранится уже собранным (ShoppingListItem),
+        поэтому читается одним запросом, а пищевая ценность
+        и стоимость - ещё одним, по суммам рецептов в корзине.
+        """
+        serializer = self.time_serializer(ShoppingListSerializer({
+            'items': ShoppingListItem.objects.filter(user=request.user),
+            'totals': cart_totals(request.user.id),
+        }))
+        return Response(serializer.data)
+
+    @action(
+        detail=False,
+        permission_classes=(IsAuthenticated,),
+        renderer_classes=SHOPPING_LIST_RENDERERS,
     )
     def download_shopping_cart(self, request):
-        """Скачать файл со списком покупок. Формат TXT."""
-        shopping_cart = IngredientInRecipe.objects.filter(
-            recipe__shoppingcart_recipe__user=request.user,
-        ).order_by('ingredient__name').values_list(
-            'ingredient__name',
-            'ingredient__measurement_unit'
-        ).annotate(amount=Sum('amount'))
-
-        shopping_list = f'Список покупок {request.user}:\n'
-        for iter, (name, unit, amount) in enumerate(shopping_cart, start=1):
-            shopping_list += f'\n {iter}. {name} ({unit}) - {amount}'
-
-        filename = 'data.txt'
-        response = HttpResponse(shopping_list, content_type='text/plain')
+        """
+        Скачать файл со списком покупок.
+        Формат выбирается параметром format: txt (по умолчанию), csv,
+        json или pdf. Строки готового списка покупок читаются из БД
+        порциями и сразу отдаются клиенту.
+        """
+        shopping_cart = ShoppingListItem.objects.filter(
+            user=request.user
+        ).order_by('name').values_list(
+            'name', 'measurement_unit', 'amount'
+        ).iterator(chunk_size=settings.SHOPPING_LIST_CHUNK_SIZE)
+
+        renderer = request.accepted_renderer
+        response = StreamingHttpResponse(
+            renderer.stream(f'Список покупок {request.user}', shopping_cart),
+            content_type=f'{renderer.media_type}; charset={renderer.charset}'
+        )
+        filename = f'data.{renderer.format}'
         response['Content-Disposition'] = f'attachment; filename={filename}'
         return response
+
+
+def metrics(request):
+    """
+    Метрики запросов в формате Prometheus.
+    Если задан METRICS_TOKEN, нужен заголовок Authorization: Bearer <токен>,
+    иначе метрики доступны только администраторам, вошедшим на сайт.
+    """
+    token = settings.METRICS_TOKEN
+    if token:
+        allowed = compare_digest(
+            request.headers.get('Authorization', ''), f'Bearer {token}'
+        )
+    else:
+        allowed = request.user.is_staff
+    if not allowed:
+        return HttpResponse(status=status.HTTP_403_FORBIDDEN)
+    return HttpResponse(
+        render_prometheus(),
+        content_type='text/plain; version=0.0.4; charset=utf-8'
+    )
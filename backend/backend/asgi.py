@@ -0,0 +1,13 @@
+import os
+
+import django
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'backend.settings')
+os.environ.setdefault('ASYNC_VIEWS', 'True')
+# То же, что get_asgi_application(), но потоковые ответы читаются
+# вне цикла событий (см. api.asyncviews.StreamingASGIHandler).
+django.setup(set_prefix=False)
+
+from api.asyncviews import StreamingASGIHandler  # noqa: E402
+
+application = StreamingASGIHandler()
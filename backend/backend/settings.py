@@ -25,6 +25,7 @@ INSTALLED_APPS = [
     'users',
     'recipes',
     'api',
+    'tasks',
     'rest_framework',
     'corsheaders',
     'rest_framework.authtoken',
@@ -42,6 +43,8 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'api.middleware.ReplicaMiddleware',
+    'api.middleware.MetricsMiddleware',
 ]
 
 ROOT_URLCONF = 'backend.urls'
@@ -67,15 +70,62 @@ WSGI_APPLICATION = 'backend.wsgi.application'
 
 DATABASES = {
     'default': {
-        'ENGINE': 'django.db.backends.postgresql',
+        # django.db.backends.postgresql с проверкой соединений.
+        'ENGINE': 'backend.postgresql',
         'NAME': os.getenv('POSTGRES_DB', 'django'),
         'USER': os.getenv('POSTGRES_USER', 'django'),
         'PASSWORD': os.getenv('POSTGRES_PASSWORD', ''),
         'HOST': os.getenv('DB_HOST', ''),
-        'PORT': os.getenv('DB_PORT', 5432)
+        'PORT': os.getenv('DB_PORT', 5432),
+        # Соединение переиспользуется между запросами в течение
+        # CONN_MAX_AGE секунд (0 - новое соединение на каждый запрос).
+        'CONN_MAX_AGE': int(os.getenv('DB_CONN_MAX_AGE', 60)),
+        'CONN_HEALTH_CHECKS': get_bool_env('DB_CONN_HEALTH_CHECKS', True),
+        # pgbouncer в режиме pool_mode = transaction не сохраняет
+        # серверные курсоры между транзакциями.
+        'DISABLE_SERVER_SIDE_CURSORS': get_bool_env('DB_PGBOUNCER', False),
+        'OPTIONS': {
+            'connect_timeout': int(os.getenv('DB_CONNECT_TIMEOUT', 5)),
+        },
+    }
+}
+
+# Реплики для чтения: DB_REPLICA_HOSTS=host1,host2:5433.
+# Остальные параметры подключения такие же, как у основной БД.
+DATABASE_REPLICAS = []
+for number, replica in enumerate(
+    filter(None, os.getenv('DB_REPLICA_HOSTS', '').split(',')), start=1
+):
+    host, _, port = replica.strip().partition(':')
+    alias = f'replica_{number}'
+    DATABASES[alias] = {
+        **DATABASES['default'],
+        'HOST': host,
+        'PORT': port or DATABASES['default']['PORT'],
+        'TEST': {'MIRROR': 'default'},
+    }
+    DATABASE_REPLICAS.append(alias)
+DATABASE_ROUTERS = ['api.replicas.ReplicaRouter']
+# Сколько секунд после изменения клиент читает с основной БД.
+DATABASE_REPLICA_STICKY_SECONDS = int(
+    os.getenv('DB_REPLICA_STICKY_SECONDS', 10)
+)
+
+CACHES = {
+    'default': {
+        'BACKEND': os.getenv(
+            'CACHE_BACKEND',
+            'django.core.cache.backends.locmem.LocMemCache'
+        ),
+        'LOCATION': os.getenv('CACHE_LOCATION', ''),
     }
 }
 
+RECIPES_CACHE_TIMEOUT = int(os.getenv('RECIPES_CACHE_TIMEOUT', 300))
+# Сколько секунд общие кеши (nginx) и клиенты могут отдавать публичные
+# ответы API без перепроверки по ETag.
+HTTP_CACHE_MAX_AGE = int(os.getenv('HTTP_CACHE_MAX_AGE', 60))
+
 
 AUTH_PASSWORD_VALIDATORS = [
     {
@@ -126,6 +176,64 @@ REST_FRAMEWORK = {
     'DEFAULT_VERSIONING_CLASS': 'rest_framework.versioning.NamespaceVersioning',
 }
 
+SHOPPING_LIST_CHUNK_SIZE = int(os.getenv('SHOPPING_LIST_CHUNK_SIZE', 500))
+SHOPPING_LIST_PDF_FONT = os.getenv(
+    'SHOPPING_LIST_PDF_FONT',
+    '/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf'
+)
+
+RECIPE_IMAGE_FORMATS = ('webp', 'avif')
+RECIPE_IMAGE_VARIANTS = {
+    'card': (480, 360),
+    'detail': (1200, 900),
+    'mini': (160, 160),
+}
+# Асинхронные представления для чтения включаются запуском через
+# backend.asgi; потоки пула держат собственные соединения с БД.
+ASYNC_VIEWS = get_bool_env('ASYNC_VIEWS', False)
+ASYNC_VIEWS_THREADS = int(os.getenv('ASYNC_VIEWS_THREADS', 16))
+METRICS_SAMPLE_RATE = float(os.getenv('METRICS_SAMPLE_RATE', 1.0))
+METRICS_TOKEN = os.getenv('METRICS_TOKEN', '')
+METRICS_N_PLUS_ONE_THRESHOLD = int(
+    os.getenv('METRICS_N_PLUS_ONE_THRESHOLD', 10)
+)
+METRICS_FLUSH_INTERVAL = 10
+METRICS_PROCESS_TIMEOUT = 24 * 60 * 60
+RECIPE_INGREDIENTS_CHANGES_TIMEOUT = 24 * 60 * 60
+RECIPE_SCORE_HALF_LIFE_HOURS = float(
+    os.getenv('RECIPE_SCORE_HALF_LIFE_HOURS', 72)
+)
+RECIPE_SCORE_FAVORITE_WEIGHT = 1.0
+RECIPE_SCORE_CART_WEIGHT = 0.5
+RECIPE_SCORE_CHUNK_SIZE = 2000
+# Лента рецептов: рецепты авторов, у которых подписчиков больше
+# FEED_FANOUT_MAX_FOLLOWERS, не раскладываются по лентам при публикации,
+# а читаются при запросе ленты (не более FEED_PULL_MAX_AUTHORS авторов).
+FEED_FANOUT_MAX_FOLLOWERS = int(
+    os.getenv('FEED_FANOUT_MAX_FOLLOWERS', 10_000)
+)
+FEED_FANOUT_BATCH_SIZE = 1000
+FEED_FOLLOW_BACKFILL = 50
+FEED_PULL_MAX_AUTHORS = 100
+# Суммы пищевой ценности и цены рецептов после изменения ингредиента
+# пересчитываются фоновой задачей пачками по NUTRITION_BATCH_SIZE рецептов.
+NUTRITION_BATCH_SIZE = 1000
+# Фоновые задачи (tasks) хранятся в БД и выполняются командой run_workers.
+# При TASKS_EAGER задачи выполняются в процессе веб-сервера сразу после
+# фиксации транзакции - для разработки без обработчиков.
+TASKS_EAGER = get_bool_env('TASKS_EAGER', False)
+TASKS_WORKERS = int(os.getenv('TASKS_WORKERS', 2))
+TASKS_POLL_INTERVAL = float(os.getenv('TASKS_POLL_INTERVAL', 1))
+TASKS_DEFAULT_TIMEOUT = 300
+TASKS_RETRY_DELAY = 10
+TASKS_MAINTENANCE_INTERVAL = 60
+TASKS_KEEP_DONE = 24 * 60 * 60
+# Наибольшее число id в массовых запросах (избранное, корзина, подписки).
+BULK_MAX_ITEMS = int(os.getenv('BULK_MAX_ITEMS', 100))
+DATA_UPLOAD_MAX_MEMORY_SIZE = int(
+    os.getenv('DATA_UPLOAD_MAX_MEMORY_SIZE', 20 * 1024 * 1024)
+)
+
 DJOSER = {
     'HIDE_USERS': False,
     'SERIALIZERS': {
@@ -0,0 +1,30 @@
+import os
+import tempfile
+
+from .settings import *  # noqa: F401,F403
+from .settings import DATABASES
+
+# Настройки для pytest. В CI тесты идут на PostgreSQL (DB_HOST задан),
+# локально - на SQLite в памяти. В SQLite миграции recipes и users
+# с выражениями PostgreSQL не применяются, таблицы строятся по моделям.
+SECRET_KEY = 'test-secret-key'
+DEBUG = False
+ALLOWED_HOSTS = ['*']
+
+if not os.getenv('DB_HOST'):
+    DATABASES = {
+        'default': {'ENGINE': 'django.db.backends.sqlite3'},
+    }
+    MIGRATION_MODULES = {'recipes': None, 'users': None}
+
+# Реплика для тестов маршрутизации запросов (api.replicas): зеркало
+# default, отдельная БД не создаётся. Чтение с неё включают тесты,
+# задающие DATABASE_REPLICAS.
+DATABASES['replica_1'] = {
+    **DATABASES['default'],
+    'TEST': {'MIRROR': 'default'},
+}
+DATABASE_REPLICAS = []
+
+PASSWORD_HASHERS = ['django.contrib.auth.hashers.MD5PasswordHasher']
+MEDIA_ROOT = tempfile.mkdtemp(prefix='foodgram-media-')
@@ -0,0 +1,98 @@
+import pytest
+from django.core.cache import cache
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from recipes.models import Ingredient, IngredientInRecipe, Recipe, Tag
+from users.models import FoodgramUser
+
+
+@pytest.fixture(autouse=True)
+def clear_cache():
+    """Кеш ответов и счётчики версий не переходят между тестами."""
+    cache.clear()
+    yield
+    cache.clear()
+
+
+@pytest.fixture
+def make_user(db):
+    def make(username):
+        return FoodgramUser.objects.create_user(
+            email=f'{username}@foodgram.ru',
+            username=username,
+            first_name='Имя',
+            last_name='Фамилия',
+            password='foodgram-password',
+        )
+    return make
+
+
+@pytest.fixture
+def user(make_user):
+    return make_user('user')
+
+
+@pytest.fixture
+def author(make_user):
+    return make_user('author')
+
+
+@pytest.fixture
+def client():
+    return APIClient()
+
+
+@pytest.fixture
+def user_client(user):
+    client = APIClient()
+    token, _ = Token.objects.get_or_create(user=user)
+    client.credentials(HTTP_AUTHORIZATION=f'Token {token.key}')
+    return client
+
+
+@pytest.fixture
+def make_recipes(db):
+    """
+    Создаёт count рецептов автора с тегами и тремя ингредиентами.
+    """
+    def make(author, count):
+        tags = [
+            Tag.objects.get_or_create(
+                slug=f'tag{number}',
+                defaults={'name': f'Тег {number}', 'color': f'#00000{number}'}
+            )[0] for number in range(3)
+        ]
+        ingredients = [
+            Ingredient.objects.get_or_create(
+                name=f'Ингредиент {number}', measurement_unit='г'
+            )[0] for number in range(5)
+        ]
+        recipes = []
+        for number in range(count):
+            recipe = Recipe.objects.create(
+                author=author,
+                name=f'Рецепт {number}',
+                text='Описание',
+                cooking_time=10,
+                image='recipes/image.png',
+            )
+            recipe.tags.set(tags[:number % 3 + 1])
+            IngredientInRecipe.objects.bulk_create(
+                IngredientInRecipe(
+                    recipe=recipe,
+                    ingredient=ingredients[(number + shift) % 5],
+                    amount=shift + 1,
+                ) for shift in range(3)
+            )
+            recipes.append(recipe)
+        return recipes
+    return make
+
+
+@pytest.fixture
+def run_tasks(db):
+    """Выполняет фоновые задачи из очереди, как run_workers --burst."""
+    from tasks.worker import work
+
+    return lambda: work(lambda: False, 0, burst=True)
@@ -38,6 +38,13 @@ class IngredientInRecipeInline(admin.TabularInline):
 
 class RecipeAdmin(admin.ModelAdmin):
     inlines = (IngredientInRecipeInline,)
+    list_display = (
+        'name', 'author', 'favorites_count', 'in_carts_count', 'total_kcal'
+    )
+    readonly_fields = (
+        'favorites_count', 'in_carts_count', 'total_kcal', 'total_protein',
+        'total_fat', 'total_carbs', 'total_price',
+    )
     filter_horizontal = ['tags']
 
     def response_add(self, request, obj, post_url_continue=None):
@@ -0,0 +1,99 @@
+from django.db import transaction
+
+from users.models import FoodgramUser
+from . import feed, shopping_list
+from .counters import update_counters
+from .models import FavoriteRecipe, Follow, Recipe, ShopingCart
+
+# bulk_create не отправляет сигналы, поэтому счётчики, списки покупок
+# и ленты обновляются здесь явно, по одному запросу на всю пачку.
+RECIPE_COUNTERS = {
+    FavoriteRecipe: 'favorites_count',
+    ShopingCart: 'in_carts_count',
+}
+
+
+def lock_user(user_id):
+    """
+    Блокирует запись пользователя до конца транзакции. Блокировку берут
+    все пути добавления и удаления избранного, корзины и подписок
+    (массовые и по одному), поэтому параллельные запросы одного
+    пользователя не добавят строку дважды и не ждут друг друга
+    в разном порядке.
+    """
+    shopping_list.lock_users([user_id])
+
+
+def inserted(queryset, field, existing, candidates):
+    """
+    id из candidates, строки с которыми появились после INSERT.
+    Конфликтующие строки bulk_create(ignore_conflicts=True) пропускает
+    молча, поэтому добавленные определяются повторным чтением.
+    """
+    return set(queryset.filter(**{f'{field}__in': candidates}).values_list(
+        field, flat=True
+    )) - existing
+
+
+@transaction.atomic
+def add_recipes(model, user_id, recipe_ids):
+    """
+    Добавляет рецепты recipe_ids в избранное или корзину (model)
+    пользователя одним INSERT. Возвращает множество id добавленных
+    рецептов, уже добавленные ранее пропускаются.
+    """
+    lock_user(user_id)
+    existing = set(model.objects.filter(
+        user_id=user_id, recipe_id__in=recipe_ids
+    ).values_list('recipe_id', flat=True))
+    candidates = [
+        recipe_id for recipe_id in recipe_ids if recipe_id not in existing
+    ]
+    if not candidates:
+        return set()
+    model.objects.bulk_create([
+        model(user_id=user_id, recipe_id=recipe_id)
+        for recipe_id in candidates
+    ], ignore_conflicts=True)
+    created = inserted(
+        model.objects.filter(user_id=user_id), 'recipe_id', existing,
+        candidates
+    )
+    if not created:
+        return set()
+    update_counters(Recipe, created, **{RECIPE_COUNTERS[model]: 1})
+    if model is ShopingCart:
+        shopping_list.add_recipes(user_id, created)
+    return created
+
+
+@transaction.atomic
+def follow(user_id, author_ids):
+    """
+    Подписывает пользователя на авторов author_ids одним INSERT.
+    Возвращает множество id авторов новых подписок.
+    """
+    lock_user(user_id)
+    existing = set(Follow.objects.filter(
+        user_id=user_id, author_id__in=author_ids
+    ).values_list('author_id', flat=True))
+    candidates = [
+        author_id for author_id in author_ids
+        if author_id not in existing and author_id != user_id
+    ]
+    if not candidates:
+        return set()
+    Follow.objects.bulk_create([
+        Follow(user_id=user_id, author_id=author_id)
+        for author_id in candidates
+    ], ignore_conflicts=True)
+    created = inserted(
+        Follow.objects.filter(user_id=user_id), 'author_id', existing,
+        candidates
+    )
+    if not created:
+        return set()
+    update_counters(FoodgramUser, created, followers_count=1)
+    update_counters(FoodgramUser, [user_id], following_count=len(created))
+    feed.follow.enqueue(user_id=user_id, author_ids=sorted(created))
+    return created
@@ -0,0 +1,74 @@
+from django.db.models import Count, F, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce, Greatest
+from django.utils import timezone
+
+
+def touch(model, values):
+    """
+    Добавляет к обновляемым полям updated_at, если оно есть у модели:
+    счётчики входят в ответы API и должны менять их ETag.
+    """
+    if any(
+        field.name == 'updated_at' for field in model._meta.concrete_fields
+    ):
+        values['updated_at'] = timezone.now()
+    return values
+
+
+def update_counters(model, pks, **deltas):
+    """
+    Атомарно меняет счётчики у объектов model с id из pks
+    одним запросом UPDATE через F().
+    При уменьшении значение не опускается ниже нуля.
+    Применяется в сигналах и в массовых операциях,
+    где сигналы не отправляются (bulk_create, update).
+    """
+    pks = list(pks)
+    if not pks or not deltas:
+        return
+    values = {}
+    for field, delta in deltas.items():
+        value = F(field) + delta
+        if delta < 0:
+            value = Greatest(value, Value(0))
+        values[field] = value
+    model.objects.filter(pk__in=pks).update(**touch(model, values))
+
+
+def count_subquery(model, field):
+    """Подзапрос с количеством строк model, ссылающихся на объект."""
+    return Coalesce(Subquery(
+        model.objects.filter(**{field: OuterRef('pk')}).order_by().values(
+            field
+        ).annotate(total=Count('pk')).values('total')
+    ), 0)
+
+
+def get_counters():
+    """Счётчики в формате (модель, поле счётчика, модель строк, ссылка)."""
+    from users.models import FoodgramUser
+    from .models import FavoriteRecipe, Follow, Recipe, ShopingCart
+
+    return (
+        (Recipe, 'favorites_count', FavoriteRecipe, 'recipe'),
+        (Recipe, 'in_carts_count', ShopingCart, 'recipe'),
+        (FoodgramUser, 'recipes_count', Recipe, 'author'),
+        (FoodgramUser, 'followers_count', Follow, 'author'),
+        (FoodgramUser, 'following_count', Follow, 'user'),
+    )
+
+
+def recount(counters=None):
+    """
+    Пересчитывает счётчики по фактическим данным.
+    Для каждого счётчика выполняется один запрос UPDATE,
+    который меняет только разошедшиеся строки.
+    Возвращает словарь с количеством исправленных строк.
+    """
+    fixed = {}
+    for model, field, rows_model, link in counters or get_counters():
+        actual = count_subquery(rows_model, link)
+        fixed[f'{model._meta.label}.{field}'] = model.objects.exclude(
+            **{field: actual}
+        ).update(**touch(model, {field: actual}))
+    return fixed
@@ -0,0 +1,146 @@
+from itertools import islice
+
+from django.conf import settings
+
+from tasks.queue import task
+from users.models import FoodgramUser
+from .models import FeedItem, Follow, Recipe
+
+
+def is_fanned_out(followers_count):
+    """
+    Раскладываются ли рецепты автора по лентам подписчиков.
+    Рецепты авторов с большим числом подписчиков читаются
+    при запросе ленты, иначе публикация рецепта создавала бы
+    сотни тысяч строк.
+    """
+    return followers_count <= settings.FEED_FANOUT_MAX_FOLLOWERS
+
+
+def insert(user_ids, recipe_ids, author_id):
+    FeedItem.objects.bulk_create([
+        FeedItem(user_id=user_id, recipe_id=recipe_id, author_id=author_id)
+        for user_id in user_ids
+        for recipe_id in recipe_ids
+    ], batch_size=settings.FEED_FANOUT_BATCH_SIZE, ignore_conflicts=True)
+
+
+def follower_batches(author_id):
+    """id подписчиков автора пачками по FEED_FANOUT_BATCH_SIZE."""
+    user_ids = Follow.objects.filter(author_id=author_id).order_by(
+        'user_id'
+    ).values_list('user_id', flat=True).iterator(
+        chunk_size=settings.FEED_FANOUT_BATCH_SIZE
+    )
+    while True:
+        batch = list(islice(user_ids, settings.FEED_FANOUT_BATCH_SIZE))
+        if not batch:
+            return
+        yield batch
+
+
+def latest_recipe_ids(author_id):
+    """id последних FEED_FOLLOW_BACKFILL рецептов автора."""
+    return list(Recipe.objects.filter(author_id=author_id).order_by(
+        '-id'
+    ).values_list('id', flat=True)[:settings.FEED_FOLLOW_BACKFILL])
+
+
+@task()
+def fan_out(recipe_id, author_id, force=False):
+    """
+    Добавляет рецепт в ленты подписчиков автора пачками
+    по FEED_FANOUT_BATCH_SIZE. Вызывается после публикации рецепта.
+    force раскладывает рецепт независимо от числа подписчиков.
+    Возвращает число подписчиков, в ленты которых добавлен рецепт.
+    """
+    followers_count = FoodgramUser.objects.filter(
+        pk=author_id
+    ).values_list('followers_count', flat=True).first()
+    if followers_count is None:
+        return 0
+    if not force and not is_fanned_out(followers_count):
+        return 0
+    total = 0
+    for batch in follower_batches(author_id):
+        insert(batch, [recipe_id], author_id)
+        total += len(batch)
+    return total
+
+
+def fan_out_recipes(recipe_ids):
+    """Раскладывает по лентам рецепты, созданные без сигналов."""
+    for recipe_id, author_id in Recipe.objects.filter(
+        pk__in=recipe_ids
+    ).values_list('pk', 'author_id'):
+        fan_out(recipe_id, author_id)
+
+
+@task()
+def follow(user_id, author_ids):
+    """
+    Добавляет в ленту нового подписчика последние
+    FEED_FOLLOW_BACKFILL рецептов каждого из авторов author_ids.
+    """
+    for author_id in FoodgramUser.objects.filter(
+        pk__in=author_ids,
+        followers_count__lte=settings.FEED_FANOUT_MAX_FOLLOWERS,
+    ).values_list('pk', flat=True):
+        insert([user_id], latest_recipe_ids(author_id), author_id)
+
+
+def unfollow(user_id, author_id):
+    """
+    Убирает рецепты автора из ленты бывшего подписчика.
+    Вызывается после уменьшения счётчика подписчиков автора.
+    Если подписчиков стало ровно FEED_FANOUT_MAX_FOLLOWERS, рецепты
+    автора перестают читаться при запросе ленты, поэтому последние
+    из них раскладываются по лентам оставшихся подписчиков.
+    """
+    FeedItem.objects.filter(user_id=user_id, author_id=author_id).delete()
+    followers_count = FoodgramUser.objects.filter(
+        pk=author_id
+    ).values_list('followers_count', flat=True).first()
+    if followers_count == settings.FEED_FANOUT_MAX_FOLLOWERS:
+        backfill_author.enqueue(
+            key=f'feed-backfill-author:{author_id}', author_id=author_id
+        )
+
+
+@task()
+def backfill_author(author_id):
+    """
+    Добавляет последние FEED_FOLLOW_BACKFILL рецептов автора в ленты
+    всех его подписчиков. Рецепты, уже разложенные при публикации,
+    пропускаются.
+    """
+    recipe_ids = latest_recipe_ids(author_id)
+    if not recipe_ids:
+        return
+    for batch in follower_batches(author_id):
+        insert(batch, recipe_ids, author_id)
+
+
+def recipe_ids(user_id, before=None, limit=None):
+    """
+    id рецептов ленты пользователя по убыванию, меньше before.
+    Разложенные рецепты читаются из FeedItem, рецепты авторов
+    с большим числом подписчиков - из рецептов не более
+    FEED_PULL_MAX_AUTHORS таких авторов. Оба запроса ограничены
+    limit строк, результаты объединяются в памяти.
+    """
+    items = FeedItem.objects.filter(user_id=user_id)
+    pulled = Recipe.objects.filter(author_id__in=Follow.objects.filter(
+        user_id=user_id,
+        author__followers_count__gt=settings.FEED_FANOUT_MAX_FOLLOWERS,
+    ).order_by('-author__followers_count').values(
+        'author_id'
+    )[:settings.FEED_PULL_MAX_AUTHORS])
+    if before is not None:
+        items = items.filter(recipe_id__lt=before)
+        pulled = pulled.filter(id__lt=before)
+    ids = set(items.order_by('-recipe_id').values_list(
+        'recipe_id', flat=True
+    )[:limit])
+    ids.update(pulled.order_by('-id').values_list('id', flat=True)[:limit])
+    return sorted(ids, reverse=True)[:limit]
@@ -0,0 +1,140 @@
+import statistics
+import time
+
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.test.utils import override_settings
+
+from recipes import feed
+from recipes.counters import update_counters
+from recipes.models import FeedItem, Follow, Recipe
+from users.models import FoodgramUser
+from .seed_perf import PASSWORD, batches
+
+
+class Command(BaseCommand):
+    help = (
+        'Замеряет раскладку рецепта по лентам для автора с большим '
+        'числом подписчиков и чтение ленты подписчика при раскладке '
+        'и при чтении рецептов автора во время запроса. '
+        'Данные создаются в транзакции и откатываются.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--followers', type=int, default=100_000)
+        parser.add_argument(
+            '--recipes', type=int, default=20,
+            help='Число уже опубликованных рецептов автора.'
+        )
+        parser.add_argument(
+            '--repeat', type=int, default=20,
+            help='Число замеров чтения ленты.'
+        )
+        parser.add_argument('--batch-size', type=int, default=5000)
+        parser.add_argument('--prefix', default='feedbench')
+
+    def handle(self, *args, **options):
+        if options['followers'] < 1:
+            raise CommandError('Нужен хотя бы один подписчик.')
+        with transaction.atomic():
+            self.run(options)
+            transaction.set_rollback(True)
+
+    def run(self, options):
+        author, follower_ids = self.create_author(options)
+        recipe = Recipe.objects.create(
+            author=author, name='Новый рецепт', text='Текст',
+            cooking_time=10, image='recipes/perf.png'
+        )
+
+        started = time.monotonic()
+        total = feed.fan_out(recipe.id, author.id, force=True)
+        duration = time.monotonic() - started
+        self.stdout.write(
+            f'Раскладка по {total} лентам: {duration:.2f} с, '
+            f'{total / duration:.0f} строк/с, '
+            f'пачками по {settings.FEED_FANOUT_BATCH_SIZE}.'
+        )
+
+        if not feed.is_fanned_out(len(follower_ids)):
+            started = time.monotonic()
+            feed.fan_out(recipe.id, author.id)
+            self.stdout.write(
+                'Публикация без раскладки (подписчиков больше '
+                'FEED_FANOUT_MAX_FOLLOWERS='
+                f'{settings.FEED_FANOUT_MAX_FOLLOWERS}): '
+                f'{(time.monotonic() - started) * 1000:.1f} мс.'
+            )
+
+        follower_id = follower_ids[len(follower_ids) // 2]
+        self.stdout.write(
+            'Чтение ленты, разложенные рецепты: '
+            f'{self.measure_read(follower_id, options["repeat"])}'
+        )
+        FeedItem.objects.filter(author=author).delete()
+        with override_settings(FEED_FANOUT_MAX_FOLLOWERS=0):
+            self.stdout.write(
+                'Чтение ленты, рецепты автора при запросе: '
+                f'{self.measure_read(follower_id, options["repeat"])}'
+            )
+
+    def create_author(self, options):
+        """
+        Автор с options['followers'] подписчиками и options['recipes']
+        рецептами. Подписки создаются bulk_create, поэтому ленты
+        при этом не заполняются.
+        """
+        prefix = options['prefix']
+        if FoodgramUser.objects.filter(username__startswith=prefix).exists():
+            raise CommandError(
+                f'Пользователи с префиксом {prefix} уже есть, '
+                'укажите другой --prefix.'
+            )
+        password = make_password(PASSWORD)
+        users = [
+            FoodgramUser(
+                email=f'{prefix}{number}@example.com',
+                username=f'{prefix}{number}',
+                first_name='Имя',
+                last_name=f'Фамилия {number}',
+                password=password,
+            )
+            for number in range(options['followers'] + 1)
+        ]
+        for batch in batches(users, options['batch_size']):
+            FoodgramUser.objects.bulk_create(batch)
+        user_ids = list(FoodgramUser.objects.filter(
+            username__startswith=prefix
+        ).order_by('id').values_list('id', flat=True))
+        author_id, follower_ids = user_ids[0], user_ids[1:]
+
+        for batch in batches(follower_ids, options['batch_size']):
+            Follow.objects.bulk_create([
+                Follow(user_id=user_id, author_id=author_id)
+                for user_id in batch
+            ])
+        update_counters(
+            FoodgramUser, [author_id], followers_count=len(follower_ids)
+        )
+        Recipe.objects.bulk_create([
+            Recipe(
+                author_id=author_id, name=f'Рецепт {number}', text='Текст',
+                cooking_time=10, image='recipes/perf.png'
+            )
+            for number in range(options['recipes'])
+        ])
+        return FoodgramUser.objects.get(pk=author_id), follower_ids
+
+    def measure_read(self, user_id, repeat):
+        limit = settings.REST_FRAMEWORK['PAGE_SIZE']
+        durations = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            feed.recipe_ids(user_id, limit=limit)
+            durations.append((time.perf_counter() - started) * 1000)
+        return (
+            f'медиана {statistics.median(durations):.2f} мс, '
+            f'максимум {max(durations):.2f} мс'
+        )
@@ -0,0 +1,147 @@
+import csv
+import io
+import json
+import os
+import time
+from itertools import islice
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+
+from api.indexes import invalidate_ingredient_index
+from recipes.models import Ingredient
+
+DEFAULT_PATH = os.path.join(
+    os.path.dirname(settings.BASE_DIR), 'data', 'ingredients.csv'
+)
+CSV_HEADER = ['name', 'measurement_unit']
+
+
+def read_csv(path):
+    """
+    Строки (название, единица измерения) из CSV файла.
+    Строка заголовка, если она есть, пропускается.
+    """
+    with open(path, encoding='utf-8', newline='') as file:
+        for row in csv.reader(file):
+            if row == CSV_HEADER or len(row) < 2:
+                continue
+            yield row[0].strip(), row[1].strip()
+
+
+def read_json(path):
+    """Строки (название, единица измерения) из JSON файла."""
+    with open(path, encoding='utf-8') as file:
+        for item in json.load(file):
+            yield item['name'].strip(), item['measurement_unit'].strip()
+
+
+def batches(rows, size):
+    rows = iter(rows)
+    while True:
+        batch = list(islice(rows, size))
+        if not batch:
+            return
+        yield batch
+
+
+class Command(BaseCommand):
+    help = (
+        'Загружает ингредиенты из CSV или JSON файла. '
+        'Повторная загрузка не создаёт дубликатов.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'path', nargs='?', default=DEFAULT_PATH,
+            help='Путь к файлу с ингредиентами.'
+        )
+        parser.add_argument(
+            '--format', choices=('csv', 'json'),
+            help='Формат файла. По умолчанию определяется по расширению.'
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=1000,
+            help='Количество строк в одном INSERT или COPY.'
+        )
+        parser.add_argument(
+            '--copy', action='store_true',
+            help='Загрузка через COPY во временную таблицу (PostgreSQL).'
+        )
+
+    def handle(self, *args, **options):
+        path = options['path']
+        if not os.path.isfile(path):
+            raise CommandError(f'Файл не найден: {path}')
+
+        file_format = (
+            options['format'] or os.path.splitext(path)[1].lstrip('.')
+        ).lower()
+        readers = {'csv': read_csv, 'json': read_json}
+        if file_format not in readers:
+            raise CommandError(f'Неизвестный формат файла: {file_format}')
+        if options['copy'] and connection.vendor != 'postgresql':
+            raise CommandError('Загрузка через COPY доступна только для '
+                               'PostgreSQL.')
+
+        rows = readers[file_format](path)
+        load = self.copy_rows if options['copy'] else self.insert_rows
+        started = time.monotonic()
+        with transaction.atomic():
+            total, created = load(rows, options['batch_size'])
+        elapsed = max(time.monotonic() - started, 1e-6)
+        invalidate_ingredient_index()
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Обработано строк: {total}, добавлено ингредиентов: {created}, '
+            f'{total / elapsed:.0f} строк/с.'
+        ))
+
+    def insert_rows(self, rows, batch_size):
+        """Пакетная вставка через bulk_create, конфликты пропускаются."""
+        total = 0
+        before = Ingredient.objects.count()
+        for batch in batches(rows, batch_size):
+            Ingredient.objects.bulk_create(
+                [
+                    Ingredient(name=name, measurement_unit=unit)
+                    for name, unit in batch
+                ],
+                ignore_conflicts=True,
+            )
+            total += len(batch)
+        return total, Ingredient.objects.count() - before
+
+    def copy_rows(self, rows, batch_size):
+        """
+        Загрузка через COPY во временную таблицу и одну вставку
+        из неё с пропуском уже существующих ингредиентов.
+        """
+        total = 0
+        table = connection.ops.quote_name(Ingredient._meta.db_table)
+        with connection.cursor() as cursor:
+            cursor.execute(
+                'CREATE TEMPORARY TABLE ingredient_staging '
+                '(name varchar(200), measurement_unit varchar(200)) '
+                'ON COMMIT DROP'
+            )
+            for batch in batches(rows, batch_size):
+                buffer = io.StringIO()
+                csv.writer(buffer).writerows(batch)
+                buffer.seek(0)
+                cursor.copy_expert(
+                    'COPY ingredient_staging (name, measurement_unit) '
+                    'FROM STDIN WITH (FORMAT csv)',
+                    buffer
+                )
+                total += len(batch)
+            cursor.execute(
+                f'INSERT INTO {table} (name, measurement_unit, '
+                'kcal, protein, fat, carbs, price, updated_at) '
+                'SELECT DISTINCT name, measurement_unit, 0, 0, 0, 0, 0, now() '
+                'FROM ingredient_staging '
+                'ON CONFLICT (name, measurement_unit) DO NOTHING'
+            )
+            created = cursor.rowcount
+        return total, created
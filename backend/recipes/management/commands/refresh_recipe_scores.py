@@ -0,0 +1,63 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import close_old_connections
+
+from api.cache import bump_recipe_version
+from recipes.scores import refresh_scores
+
+FULL_EVERY = 24 * 60 * 60
+
+
+class Command(BaseCommand):
+    help = (
+        'Обновляет оценки популярности рецептов для сортировки '
+        'ordering=-popular и ordering=-trending. '
+        'С ключом --every работает постоянно (сервис scores '
+        'в docker compose), иначе запускается из cron.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--full', action='store_true',
+            help='Пересчитать оценки по всем событиям, а не только по новым.'
+        )
+        parser.add_argument(
+            '--every', type=float,
+            help='Обновлять оценки каждые N секунд, не завершаясь.'
+        )
+        parser.add_argument(
+            '--full-every', type=float, default=FULL_EVERY,
+            help='С --every: полный пересчёт раз в N секунд, '
+                 'первый - при запуске.'
+        )
+
+    def handle(self, *args, **options):
+        every = options['every']
+        if every is None:
+            self.refresh(options['full'])
+            return
+        if every <= 0:
+            raise CommandError('Интервал --every должен быть больше нуля.')
+
+        last_full = None
+        while True:
+            started = time.monotonic()
+            full = (
+                last_full is None
+                or started - last_full >= options['full_every']
+            )
+            close_old_connections()
+            self.refresh(full)
+            if full:
+                last_full = started
+            time.sleep(max(0, every - (time.monotonic() - started)))
+
+    def refresh(self, full):
+        started = time.monotonic()
+        recipes = refresh_scores(full=full)
+        bump_recipe_version()
+        self.stdout.write(self.style.SUCCESS(
+            f'Обновлены оценки рецептов: {recipes} '
+            f'за {time.monotonic() - started:.2f} с.'
+        ))
@@ -0,0 +1,364 @@
+import random
+import time
+from array import array
+from itertools import islice
+
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.db.models import Max
+
+from api.cache import bump_catalog_version
+from api.indexes import (
+    invalidate_ingredient_index, invalidate_recipe_ingredient_index)
+from recipes.counters import recount
+from recipes.feed import fan_out_recipes
+from recipes.models import (
+    FavoriteRecipe, Follow, Ingredient, IngredientInRecipe, Recipe,
+    ShopingCart, Tag)
+from recipes.nutrition import recompute
+from recipes.scores import refresh_scores
+from recipes.shopping_list import REBUILD_BATCH_SIZE, rebuild
+from users.models import FoodgramUser
+
+DISHES = (
+    'Суп', 'Салат', 'Рагу', 'Пирог', 'Запеканка', 'Каша', 'Паста',
+    'Омлет', 'Плов', 'Соус', 'Котлеты', 'Блины', 'Оладьи', 'Жаркое',
+)
+WORDS = (
+    'нарезать', 'обжарить', 'смешать', 'добавить', 'посолить', 'варить',
+    'запекать', 'тушить', 'минут', 'духовке', 'сковороде', 'кастрюле',
+    'огне', 'перемешать', 'подавать', 'горячим', 'остудить', 'взбить',
+    'мелко', 'кубиками', 'соломкой', 'до', 'готовности', 'золотистой',
+    'корочки', 'зелень', 'специи', 'по', 'вкусу', 'и', 'с', 'в', 'на',
+)
+TAGS = (
+    ('Завтрак', '#e26c2d', 'breakfast'),
+    ('Обед', '#49b64e', 'lunch'),
+    ('Ужин', '#8775d2', 'dinner'),
+)
+PASSWORD = 'perf-password'
+HEAVY_USER_FACTOR = 20
+
+
+def power_law_index(rng, size, skew):
+    """
+    Случайный индекс от 0 до size - 1 со степенным распределением:
+    чем меньше индекс, тем чаще он выпадает.
+    """
+    return min(int(size * rng.random() ** skew), size - 1)
+
+
+def power_law_count(rng, mean, limit):
+    """Случайное количество со средним около mean и длинным хвостом."""
+    if mean <= 0:
+        return 0
+    return min(int(mean / 2 * rng.paretovariate(2)), limit)
+
+
+def power_law_sample(rng, ids, count, skew, exclude=None):
+    """count различных значений из ids со степенным распределением."""
+    count = min(count, len(ids) - (exclude is not None))
+    sample = set()
+    attempts = count * 10
+    while len(sample) < count and attempts:
+        value = ids[power_law_index(rng, len(ids), skew)]
+        if value != exclude:
+            sample.add(value)
+        attempts -= 1
+    return sample
+
+
+def batches(objects, size):
+    objects = iter(objects)
+    while True:
+        batch = list(islice(objects, size))
+        if not batch:
+            return
+        yield batch
+
+
+class Command(BaseCommand):
+    help = (
+        'Заполняет базу большим объёмом правдоподобных данных '
+        'для нагрузочного тестирования: пользователи, рецепты, '
+        'ингредиенты рецептов, избранное, корзины и подписки. '
+        'Популярность рецептов и авторов распределена по степенному '
+        'закону. Первый пользователь (<prefix>0) самый активный, '
+        'на нём удобно замерять тяжёлые запросы командой benchmark.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=100_000)
+        parser.add_argument('--recipes', type=int, default=1_000_000)
+        parser.add_argument(
+            '--ingredients-per-recipe', type=int, default=10,
+            help='Среднее число ингредиентов в рецепте.'
+        )
+        parser.add_argument(
+            '--favorites', type=int, default=20,
+            help='Среднее число избранных рецептов у пользователя.'
+        )
+        parser.add_argument(
+            '--carts', type=int, default=3,
+            help='Среднее число рецептов в корзине у пользователя.'
+        )
+        parser.add_argument(
+            '--follows', type=int, default=10,
+            help='Среднее число подписок у пользователя.'
+        )
+        parser.add_argument(
+            '--skew', type=float, default=3.0,
+            help='Степень неравномерности популярности: 1 - равномерно.'
+        )
+        parser.add_argument(
+            '--feed-recipes', type=int, default=10_000,
+            help='Сколько последних рецептов разложить по лентам.'
+        )
+        parser.add_argument('--batch-size', type=int, default=5000)
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument(
+            '--prefix', default='perf',
+            help='Префикс имён и почты создаваемых пользователей.'
+        )
+
+    def handle(self, *args, **options):
+        self.options = options
+        self.rng = random.Random(options['seed'])
+        self.batch_size = options['batch_size']
+        prefix = options['prefix']
+        if FoodgramUser.objects.filter(
+            username__startswith=prefix
+        ).exists():
+            raise CommandError(
+                f'Пользователи с префиксом {prefix} уже есть. '
+                'Укажите другой --prefix или очистите базу.'
+            )
+        if options['users'] < 2 or options['recipes'] < 1:
+            raise CommandError('Нужно хотя бы 2 пользователя и 1 рецепт.')
+
+        started = time.monotonic()
+        user_ids = self.stage('Пользователи', self.create_users)
+        tag_ids = self.get_tags()
+        ingredients = self.get_ingredients()
+        recipe_ids = self.stage(
+            'Рецепты', self.create_recipes, user_ids, ingredients
+        )
+        self.stage(
+            'Ингредиенты рецептов', self.create_recipe_ingredients,
+            recipe_ids, [ingredient_id for ingredient_id, _ in ingredients]
+        )
+        self.stage(
+            'Пищевая ценность рецептов', self.recompute_nutrition, recipe_ids
+        )
+        self.stage('Теги рецептов', self.create_recipe_tags, recipe_ids,
+                   tag_ids)
+        for model, mean in (
+            (FavoriteRecipe, options['favorites']),
+            (ShopingCart, options['carts']),
+        ):
+            self.stage(
+                model._meta.verbose_name_plural, self.create_events,
+                model, user_ids, recipe_ids, mean
+            )
+        self.stage('Подписки', self.create_follows, user_ids)
+        self.stage('Счётчики', recount)
+        self.stage(
+            'Ленты', fan_out_recipes,
+            recipe_ids[len(recipe_ids) - options['feed_recipes']:]
+        )
+        self.stage('Списки покупок', self.rebuild_shopping_lists, user_ids)
+        self.stage('Оценки рецептов', refresh_scores, True)
+
+        bump_catalog_version()
+        invalidate_ingredient_index()
+        invalidate_recipe_ingredient_index()
+        self.stdout.write(self.style.SUCCESS(
+            f'Данные созданы за {time.monotonic() - started:.0f} с.'
+        ))
+
+    def stage(self, title, function, *args):
+        started = time.monotonic()
+        result = function(*args)
+        self.stdout.write(
+            f'{title}: {time.monotonic() - started:.1f} с.'
+        )
+        return result
+
+    def insert(self, model, objects):
+        """Вставка пачками. Возвращает число переданных строк."""
+        total = 0
+        for batch in batches(objects, self.batch_size):
+            model.objects.bulk_create(batch, ignore_conflicts=True)
+            total += len(batch)
+        return total
+
+    def new_ids(self, model, before):
+        """id строк model, созданных после строки с id before."""
+        return array('q', model.objects.filter(id__gt=before).order_by(
+            'id'
+        ).values_list('id', flat=True).iterator())
+
+    def last_id(self, model):
+        return model.objects.aggregate(last=Max('id'))['last'] or 0
+
+    def create_users(self):
+        """
+        Пароль хешируется один раз: хеширование для каждого
+        пользователя заняло бы больше времени, чем вся вставка.
+        """
+        prefix = self.options['prefix']
+        password = make_password(PASSWORD)
+        before = self.last_id(FoodgramUser)
+        self.insert(FoodgramUser, (
+            FoodgramUser(
+                email=f'{prefix}{number}@example.com',
+                username=f'{prefix}{number}',
+                first_name='Имя',
+                last_name=f'Фамилия {number}',
+                password=password,
+            )
+            for number in range(self.options['users'])
+        ))
+        return self.new_ids(FoodgramUser, before)
+
+    def get_tags(self):
+        if not Tag.objects.exists():
+            Tag.objects.bulk_create([
+                Tag(name=name, color=color, slug=slug)
+                for name, color, slug in TAGS
+            ])
+        return list(Tag.objects.values_list('id', flat=True))
+
+    def get_ingredients(self):
+        """
+        Ингредиенты в случайном порядке, чтобы популярными
+        оказались не первые по алфавиту. Если ингредиенты ещё
+        не загружены (load_ingredients), создаются синтетические.
+        """
+        if not Ingredient.objects.exists():
+            units = ('г', 'кг', 'мл', 'л', 'шт.', 'по вкусу')
+            rng = self.rng
+            Ingredient.objects.bulk_create([
+                Ingredient(
+                    name=f'ингредиент {number}',
+                    measurement_unit=units[number % len(units)],
+                    kcal=round(rng.uniform(0, 9), 2),
+                    protein=round(rng.uniform(0, 0.3), 3),
+                    fat=round(rng.uniform(0, 0.5), 3),
+                    carbs=round(rng.uniform(0, 0.8), 3),
+                    price=round(rng.uniform(0, 2), 2),
+                )
+                for number in range(2000)
+            ])
+        ingredients = list(Ingredient.objects.values_list('id', 'name'))
+        self.rng.shuffle(ingredients)
+        return ingredients
+
+    def create_recipes(self, user_ids, ingredients):
+        """Авторы рецептов выбираются по степенному закону."""
+        rng, skew = self.rng, self.options['skew']
+        before = self.last_id(Recipe)
+
+        def recipes():
+            for number in range(self.options['recipes']):
+                _, ingredient = ingredients[
+                    power_law_index(rng, len(ingredients), skew)
+                ]
+                yield Recipe(
+                    author_id=user_ids[
+                        power_law_index(rng, len(user_ids), skew)
+                    ],
+                    name=f'{rng.choice(DISHES)} ({ingredient}) №{number}',
+                    text=' '.join(rng.choices(WORDS, k=rng.randint(20, 80))),
+                    cooking_time=rng.randint(5, 180),
+                    image='recipes/perf.png',
+                )
+
+        self.insert(Recipe, recipes())
+        return self.new_ids(Recipe, before)
+
+    def create_recipe_ingredients(self, recipe_ids, ingredient_ids):
+        rng, skew = self.rng, self.options['skew']
+        mean = self.options['ingredients_per_recipe']
+
+        def rows():
+            for recipe_id in recipe_ids:
+                count = rng.randint(max(1, mean // 2), mean + mean // 2)
+                for ingredient_id in power_law_sample(
+                    rng, ingredient_ids, count, skew
+                ):
+                    yield IngredientInRecipe(
+                        recipe_id=recipe_id, ingredient_id=ingredient_id,
+                        amount=rng.randint(1, 500)
+                    )
+
+        return self.insert(IngredientInRecipe, rows())
+
+    def create_recipe_tags(self, recipe_ids, tag_ids):
+        through = Recipe.tags.through
+        rng = self.rng
+        return self.insert(through, (
+            through(recipe_id=recipe_id, tag_id=tag_id)
+            for recipe_id in recipe_ids
+            for tag_id in rng.sample(tag_ids, rng.randint(1, len(tag_ids)))
+        ))
+
+    def event_count(self, number, mean, limit):
+        """У первого пользователя событий больше, чем у остальных."""
+        if number == 0:
+            return min(mean * HEAVY_USER_FACTOR, limit)
+        return power_law_count(self.rng, mean, limit)
+
+    def create_events(self, model, user_ids, recipe_ids, mean):
+        """
+        Избранное или корзины: популярные рецепты добавляют чаще.
+        В PostgreSQL даты событий распределяются по последним 30 дням,
+        иначе популярность за всё время и сейчас совпадала бы.
+        """
+        rng, skew = self.rng, self.options['skew']
+        limit = min(len(recipe_ids), mean * 50)
+        total = self.insert(model, (
+            model(user_id=user_id, recipe_id=recipe_id)
+            for number, user_id in enumerate(user_ids)
+            for recipe_id in power_law_sample(
+                rng, recipe_ids, self.event_count(number, mean, limit), skew
+            )
+        ))
+        if connection.vendor == 'postgresql':
+            table = connection.ops.quote_name(model._meta.db_table)
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    f'UPDATE {table} SET created = '
+                    "now() - random() * interval '30 days' "
+                    'WHERE user_id BETWEEN %s AND %s',
+                    [user_ids[0], user_ids[-1]]
+                )
+        return total
+
+    def create_follows(self, user_ids):
+        """Подписываются в основном на немногих популярных авторов."""
+        rng, skew = self.rng, self.options['skew']
+        mean = self.options['follows']
+        limit = min(len(user_ids) - 1, mean * 50)
+        return self.insert(Follow, (
+            Follow(user_id=user_id, author_id=author_id)
+            for number, user_id in enumerate(user_ids)
+            for author_id in power_law_sample(
+                rng, user_ids, self.event_count(number, mean, limit), skew,
+                exclude=user_id
+            )
+        ))
+
+    def recompute_nutrition(self, recipe_ids):
+        """Ингредиенты рецептов созданы без сигналов, суммы считаются здесь."""
+        for batch in batches(recipe_ids, self.batch_size):
+            recompute(batch)
+
+    def rebuild_shopping_lists(self, user_ids):
+        """Корзины созданы через bulk_create, поэтому сигналы не сработали."""
+        user_ids = list(ShopingCart.objects.filter(
+            user_id__gte=user_ids[0], user_id__lte=user_ids[-1]
+        ).values_list('user_id', flat=True).distinct().order_by('user_id'))
+        for batch in batches(user_ids, REBUILD_BATCH_SIZE):
+            rebuild(batch)
@@ -0,0 +1,66 @@
+# Generated by Django 3.2 on 2026-10-18 17:27
+
+from django.conf import settings
+import django.core.validators
+from django.db import migrations, models
+import recipes.models
+
+
+def merge_duplicate_ingredients(apps, schema_editor):
+    """
+    Объединяет ингредиенты с одинаковыми названием и единицей измерения.
+    Рецепты переводятся на ингредиент с наименьшим id.
+    """
+    Ingredient = apps.get_model('recipes', 'Ingredient')
+    IngredientInRecipe = apps.get_model('recipes', 'IngredientInRecipe')
+    duplicates = (
+        Ingredient.objects.values('name', 'measurement_unit')
+        .annotate(count=models.Count('id'), keep_id=models.Min('id'))
+        .filter(count__gt=1)
+    )
+    for duplicate in duplicates:
+        keep_id = duplicate['keep_id']
+        extra_ids = list(Ingredient.objects.filter(
+            name=duplicate['name'],
+            measurement_unit=duplicate['measurement_unit'],
+        ).exclude(id=keep_id).values_list('id', flat=True))
+        for extra_id in extra_ids:
+            IngredientInRecipe.objects.filter(
+                ingredient_id=extra_id,
+                recipe__ingredient_recipe__ingredient_id=keep_id,
+            ).delete()
+            IngredientInRecipe.objects.filter(
+                ingredient_id=extra_id
+            ).update(ingredient_id=keep_id)
+        Ingredient.objects.filter(id__in=extra_ids).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('recipes', '0002_initial'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='tag',
+            name='color',
+            field=models.CharField(max_length=7, unique=True, validators=[django.core.validators.RegexValidator(code='invalid_color', message='Неверное значение. Допускаются только цифры, символ #(обратите внимание,что символ # должен быть первым )и английские буквы в нижнем регистре.', regex='^#[a-z0-9]{0,6}$'), recipes.models.lowercase_validator], verbose_name='Цвет тега'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='favoriterecipe',
+            unique_together={('user', 'recipe')},
+        ),
+        migrations.AlterUniqueTogether(
+            name='shopingcart',
+            unique_together={('user', 'recipe')},
+        ),
+        migrations.RunPython(
+            merge_duplicate_ingredients, migrations.RunPython.noop
+        ),
+        migrations.AddConstraint(
+            model_name='ingredient',
+            constraint=models.UniqueConstraint(fields=('name', 'measurement_unit'), name='ingredient_name_unit_unique'),
+        ),
+    ]
@@ -0,0 +1,49 @@
+# Generated by Django 3.2 on 2026-10-18 17:28
+
+from django.db import migrations, models
+import django.db.models.expressions
+import django.db.models.functions.text
+
+INGREDIENT_NAME_INDEX = 'ingredient_name_upper_like_idx'
+
+
+def create_ingredient_name_index(apps, schema_editor):
+    """
+    Индекс для поиска ингредиентов по началу названия без учёта регистра.
+    Django строит такой запрос как UPPER(name::text) LIKE UPPER(...),
+    поэтому индекс строится по тому же выражению с text_pattern_ops.
+    Только для PostgreSQL.
+    """
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute(
+        f'CREATE INDEX IF NOT EXISTS {INGREDIENT_NAME_INDEX} '
+        'ON recipes_ingredient (UPPER(name::text) text_pattern_ops)'
+    )
+
+
+def drop_ingredient_name_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute(f'DROP INDEX IF EXISTS {INGREDIENT_NAME_INDEX}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0003_ingredient_name_unit_unique'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='recipe',
+            index=models.Index(fields=['author', '-id'], name='recipe_author_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='recipe',
+            index=models.Index(django.db.models.expressions.F('author'), django.db.models.functions.text.MD5('text'), name='recipe_author_text_md5_idx'),
+        ),
+        migrations.RunPython(
+            create_ingredient_name_index, drop_ingredient_name_index
+        ),
+    ]
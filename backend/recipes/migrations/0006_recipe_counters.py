@@ -0,0 +1,61 @@
+# Generated by Django 3.2 on 2026-10-18 17:35
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def count_subquery(model, field):
+    """Подзапрос с количеством строк model, ссылающихся на объект."""
+    return Coalesce(Subquery(
+        model.objects.filter(**{field: OuterRef('pk')}).order_by().values(
+            field
+        ).annotate(total=Count('pk')).values('total')
+    ), 0)
+
+
+def fill_counters(apps, schema_editor):
+    """
+    Заполняет новые счётчики по существующим данным, по одному
+    запросу UPDATE на счётчик. Модели берутся из состояния миграций,
+    а не из приложения, чтобы миграция не менялась вместе с ним.
+    """
+    recipe = apps.get_model('recipes', 'Recipe')
+    user = apps.get_model('users', 'FoodgramUser')
+    favorite = apps.get_model('recipes', 'FavoriteRecipe')
+    cart = apps.get_model('recipes', 'ShopingCart')
+    follow = apps.get_model('recipes', 'Follow')
+    for model, field, rows_model, link in (
+        (recipe, 'favorites_count', favorite, 'recipe'),
+        (recipe, 'in_carts_count', cart, 'recipe'),
+        (user, 'recipes_count', recipe, 'author'),
+        (user, 'followers_count', follow, 'author'),
+        (user, 'following_count', follow, 'user'),
+    ):
+        model.objects.update(**{field: count_subquery(rows_model, link)})
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0005_recipe_image_variants'),
+        ('users', '0002_user_counters'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='favorites_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Добавлений в избранное'),
+        ),
+        migrations.AddField(
+            model_name='recipe',
+            name='in_carts_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Добавлений в список покупок'),
+        ),
+        migrations.AddIndex(
+            model_name='recipe',
+            index=models.Index(fields=['-favorites_count', '-id'], name='recipe_favorites_count_idx'),
+        ),
+        migrations.RunPython(fill_counters, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,162 @@
+# Generated by Django 3.2 on 2026-10-18 17:40
+
+import django.contrib.postgres.search
+from django.db import migrations
+
+SEARCH_INDEX = 'recipe_search_vector_idx'
+
+# Вектор рецепта: название (вес A), названия ингредиентов (вес B)
+# и описание (вес C) с русской морфологией.
+CREATE_SEARCH_SQL = f"""
+CREATE OR REPLACE FUNCTION recipes_search_vector(
+    recipe_id bigint, recipe_name text, recipe_text text
+) RETURNS tsvector AS $$
+    SELECT
+        setweight(to_tsvector('russian', coalesce(recipe_name, '')), 'A')
+        || setweight(to_tsvector('russian', coalesce((
+            SELECT string_agg(ingredient.name, ' ')
+            FROM recipes_ingredientinrecipe AS link
+            JOIN recipes_ingredient AS ingredient
+                ON ingredient.id = link.ingredient_id
+            WHERE link.recipe_id = $1
+        ), '')), 'B')
+        || setweight(to_tsvector('russian', coalesce(recipe_text, '')), 'C')
+$$ LANGUAGE sql STABLE;
+
+CREATE OR REPLACE FUNCTION recipes_recipe_search_trigger()
+RETURNS trigger AS $$
+BEGIN
+    NEW.search_vector := recipes_search_vector(NEW.id, NEW.name, NEW.text);
+    RETURN NEW;
+END
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER recipes_recipe_search_update
+    BEFORE INSERT OR UPDATE OF name, text ON recipes_recipe
+    FOR EACH ROW EXECUTE FUNCTION recipes_recipe_search_trigger();
+
+-- Ингредиенты рецепта сохраняются пачками (bulk_create, delete),
+-- поэтому вектор пересчитывается один раз на запрос по таблицам
+-- переходов, а не на каждую строку.
+CREATE OR REPLACE FUNCTION recipes_ingredientinrecipe_search_trigger()
+RETURNS trigger AS $$
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        UPDATE recipes_recipe AS recipe SET search_vector =
+            recipes_search_vector(recipe.id, recipe.name, recipe.text)
+        WHERE recipe.id IN (SELECT recipe_id FROM new_rows);
+    ELSIF TG_OP = 'DELETE' THEN
+        UPDATE recipes_recipe AS recipe SET search_vector =
+            recipes_search_vector(recipe.id, recipe.name, recipe.text)
+        WHERE recipe.id IN (SELECT recipe_id FROM old_rows);
+    ELSE
+        UPDATE recipes_recipe AS recipe SET search_vector =
+            recipes_search_vector(recipe.id, recipe.name, recipe.text)
+        WHERE recipe.id IN (
+            SELECT new_rows.recipe_id
+            FROM new_rows JOIN old_rows ON old_rows.id = new_rows.id
+            WHERE old_rows.ingredient_id <> new_rows.ingredient_id
+                OR old_rows.recipe_id <> new_rows.recipe_id
+            UNION
+            SELECT old_rows.recipe_id
+            FROM new_rows JOIN old_rows ON old_rows.id = new_rows.id
+            WHERE old_rows.ingredient_id <> new_rows.ingredient_id
+                OR old_rows.recipe_id <> new_rows.recipe_id
+        );
+    END IF;
+    RETURN NULL;
+END
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER recipes_ingredientinrecipe_search_insert
+    AFTER INSERT ON recipes_ingredientinrecipe
+    REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT
+    EXECUTE FUNCTION recipes_ingredientinrecipe_search_trigger();
+
+CREATE TRIGGER recipes_ingredientinrecipe_search_delete
+    AFTER DELETE ON recipes_ingredientinrecipe
+    REFERENCING OLD TABLE AS old_rows
+    FOR EACH STATEMENT
+    EXECUTE FUNCTION recipes_ingredientinrecipe_search_trigger();
+
+CREATE TRIGGER recipes_ingredientinrecipe_search_change
+    AFTER UPDATE ON recipes_ingredientinrecipe
+    REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+    FOR EACH STATEMENT
+    EXECUTE FUNCTION recipes_ingredientinrecipe_search_trigger();
+
+CREATE OR REPLACE FUNCTION recipes_ingredient_search_trigger()
+RETURNS trigger AS $$
+BEGIN
+    UPDATE recipes_recipe AS recipe SET search_vector =
+        recipes_search_vector(recipe.id, recipe.name, recipe.text)
+    WHERE recipe.id IN (
+        SELECT recipe_id FROM recipes_ingredientinrecipe
+        WHERE ingredient_id = NEW.id
+    );
+    RETURN NULL;
+END
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER recipes_ingredient_search_rename
+    AFTER UPDATE OF name ON recipes_ingredient
+    FOR EACH ROW WHEN (OLD.name IS DISTINCT FROM NEW.name)
+    EXECUTE FUNCTION recipes_ingredient_search_trigger();
+
+UPDATE recipes_recipe
+SET search_vector = recipes_search_vector(id, name, text);
+
+CREATE INDEX IF NOT EXISTS {SEARCH_INDEX}
+    ON recipes_recipe USING gin (search_vector);
+"""
+
+DROP_SEARCH_SQL = f"""
+DROP INDEX IF EXISTS {SEARCH_INDEX};
+DROP TRIGGER IF EXISTS recipes_ingredient_search_rename
+    ON recipes_ingredient;
+DROP TRIGGER IF EXISTS recipes_ingredientinrecipe_search_change
+    ON recipes_ingredientinrecipe;
+DROP TRIGGER IF EXISTS recipes_ingredientinrecipe_search_delete
+    ON recipes_ingredientinrecipe;
+DROP TRIGGER IF EXISTS recipes_ingredientinrecipe_search_insert
+    ON recipes_ingredientinrecipe;
+DROP TRIGGER IF EXISTS recipes_recipe_search_update ON recipes_recipe;
+DROP FUNCTION IF EXISTS recipes_ingredient_search_trigger();
+DROP FUNCTION IF EXISTS recipes_ingredientinrecipe_search_trigger();
+DROP FUNCTION IF EXISTS recipes_recipe_search_trigger();
+DROP FUNCTION IF EXISTS recipes_search_vector(bigint, text, text);
+"""
+
+
+def create_search(apps, schema_editor):
+    """
+    Триггеры, поддерживающие search_vector, и GIN индекс по нему.
+    Только для PostgreSQL: на других СУБД поиск выполняется
+    через icontains (см. api.filters.RecipeFilter).
+    """
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute(CREATE_SEARCH_SQL)
+
+
+def drop_search(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute(DROP_SEARCH_SQL)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0007_recipe_scores'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True, verbose_name='Поисковый вектор'),
+        ),
+        migrations.RunPython(create_search, drop_search),
+    ]
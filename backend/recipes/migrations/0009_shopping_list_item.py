@@ -0,0 +1,66 @@
+# Generated by Django 3.2 on 2026-10-18 17:43
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+from django.db.models import Sum
+
+from recipes.shopping_list import aggregate
+
+
+def fill_shopping_lists(apps, schema_editor):
+    """Собирает списки покупок по существующим корзинам."""
+    shoping_cart = apps.get_model('recipes', 'ShopingCart')
+    shopping_list_item = apps.get_model('recipes', 'ShoppingListItem')
+    rows = shoping_cart.objects.values_list(
+        'user_id',
+        'recipe__ingredient_recipe__ingredient__name',
+        'recipe__ingredient_recipe__ingredient__measurement_unit',
+    ).annotate(
+        amount=Sum('recipe__ingredient_recipe__amount')
+    ).order_by('user_id')
+
+    by_user = {}
+    for user_id, name, measurement_unit, amount in rows.iterator():
+        if name is not None:
+            by_user.setdefault(user_id, []).append(
+                (name, measurement_unit, amount)
+            )
+    shopping_list_item.objects.bulk_create([
+        shopping_list_item(
+            user_id=user_id, name=name, measurement_unit=unit, amount=amount
+        )
+        for user_id, user_rows in by_user.items()
+        for (name, unit), amount in aggregate(user_rows).items()
+    ], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('recipes', '0008_recipe_search_vector'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ShoppingListItem',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=200, verbose_name='Название ингредиента')),
+                ('measurement_unit', models.CharField(max_length=200, verbose_name='Единица измерения')),
+                ('amount', models.PositiveBigIntegerField(verbose_name='Количество')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='shopping_list', to=settings.AUTH_USER_MODEL, verbose_name='Пользователь')),
+            ],
+            options={
+                'verbose_name': 'Строка списка покупок',
+                'verbose_name_plural': 'Списки покупок',
+                'ordering': ('name',),
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='shoppinglistitem',
+            constraint=models.UniqueConstraint(fields=('user', 'name', 'measurement_unit'), name='shopping_list_item_unique'),
+        ),
+        migrations.RunPython(fill_shopping_lists, migrations.RunPython.noop),
+    ]
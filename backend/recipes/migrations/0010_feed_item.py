@@ -0,0 +1,71 @@
+# Generated by Django 3.2 on 2026-10-18 17:59
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def fill_feeds(apps, schema_editor):
+    """
+    Раскладывает по лентам последние рецепты авторов
+    с существующими подписками.
+    """
+    follow = apps.get_model('recipes', 'Follow')
+    recipe = apps.get_model('recipes', 'Recipe')
+    feed_item = apps.get_model('recipes', 'FeedItem')
+    user = apps.get_model(settings.AUTH_USER_MODEL)
+    authors = user.objects.filter(
+        following__isnull=False,
+        followers_count__lte=settings.FEED_FANOUT_MAX_FOLLOWERS,
+    ).distinct().values_list('id', flat=True)
+    for author_id in authors.iterator():
+        recipe_ids = list(recipe.objects.filter(
+            author_id=author_id
+        ).order_by('-id').values_list(
+            'id', flat=True
+        )[:settings.FEED_FOLLOW_BACKFILL])
+        if not recipe_ids:
+            continue
+        feed_item.objects.bulk_create([
+            feed_item(
+                user_id=user_id, recipe_id=recipe_id, author_id=author_id
+            )
+            for user_id in follow.objects.filter(
+                author_id=author_id
+            ).values_list('user_id', flat=True)
+            for recipe_id in recipe_ids
+        ], batch_size=settings.FEED_FANOUT_BATCH_SIZE, ignore_conflicts=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('recipes', '0009_shopping_list_item'),
+        ('users', '0002_user_counters'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FeedItem',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('author', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL, verbose_name='Автор')),
+                ('recipe', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='feed_items', to='recipes.recipe', verbose_name='Рецепт')),
+                ('user', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='feed', to=settings.AUTH_USER_MODEL, verbose_name='Подписчик')),
+            ],
+            options={
+                'verbose_name': 'Рецепт в ленте',
+                'verbose_name_plural': 'Ленты рецептов',
+            },
+        ),
+        migrations.AddIndex(
+            model_name='feeditem',
+            index=models.Index(fields=['user', 'author'], name='feed_item_user_author_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='feeditem',
+            constraint=models.UniqueConstraint(fields=('user', 'recipe'), name='feed_item_unique'),
+        ),
+        migrations.RunPython(fill_feeds, migrations.RunPython.noop),
+    ]
@@ -1,11 +1,16 @@
+from django.contrib.postgres.search import SearchVectorField
 from django.db import models
+from django.db.models.functions import MD5
 from django.core.exceptions import ValidationError
 from django.core.validators import (
     RegexValidator, MinValueValidator, MaxValueValidator)
 
-from users.models import FoodgramUser
+from users.models import FoodgramUser, update_fields_except
 
 MAX_LENGHTH = 20
+# Конфигурация полнотекстового поиска, совпадает с LANGUAGE_CODE.
+# Используется в триггерах миграции 0008_recipe_search_vector.
+SEARCH_CONFIG = 'russian'
 
 
 def format_string(field1, field2):
@@ -58,6 +63,11 @@ class Tag(models.Model):
         max_length=200,
         unique=True,
     )
+    updated_at = models.DateTimeField(
+        'Дата изменения',
+        auto_now=True,
+        db_index=True,
+    )
 
     class Meta:
         ordering = ('name',)
@@ -75,11 +85,57 @@ class Ingredient(models.Model):
         'Название ингредиента', max_length=200)
     measurement_unit = models.CharField(
         'Единица измерения', max_length=200)
+    kcal = models.DecimalField(
+        'Калорийность единицы, ккал',
+        max_digits=10,
+        decimal_places=4,
+        default=0,
+        validators=[MinValueValidator(0)],
+    )
+    protein = models.DecimalField(
+        'Белки в единице, г',
+        max_digits=10,
+        decimal_places=4,
+        default=0,
+        validators=[MinValueValidator(0)],
+    )
+    fat = models.DecimalField(
+        'Жиры в единице, г',
+        max_digits=10,
+        decimal_places=4,
+        default=0,
+        validators=[MinValueValidator(0)],
+    )
+    carbs = models.DecimalField(
+        'Углеводы в единице, г',
+        max_digits=10,
+        decimal_places=4,
+        default=0,
+        validators=[MinValueValidator(0)],
+    )
+    price = models.DecimalField(
+        'Цена единицы, руб.',
+        max_digits=10,
+        decimal_places=4,
+        default=0,
+        validators=[MinValueValidator(0)],
+    )
+    updated_at = models.DateTimeField(
+        'Дата изменения',
+        auto_now=True,
+        db_index=True,
+    )
 
     class Meta:
         ordering = ('name',)
         verbose_name = 'Ингредиент'
         verbose_name_plural = 'Ингредиенты'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['name', 'measurement_unit'],
+                name='ingredient_name_unit_unique',
+            )
+        ]
 
     def __str__(self):
         return leight_field(self.name)
@@ -106,6 +162,12 @@ class Recipe(models.Model):
         'Изображение',
         upload_to='recipes/'
     )
+    image_variants = models.JSONField(
+        'Уменьшенные копии изображения',
+        default=dict,
+        blank=True,
+        editable=False,
+    )
     name = models.CharField('Название рецепта', max_length=200)
     text = models.TextField('Описание рецепта')
     cooking_time = models.PositiveSmallIntegerField(
@@ -117,15 +179,108 @@ class Recipe(models.Model):
                               'превышать 1440 минут')
         ]
     )
+    favorites_count = models.PositiveIntegerField(
+        'Добавлений в избранное',
+        default=0,
+        editable=False,
+    )
+    in_carts_count = models.PositiveIntegerField(
+        'Добавлений в список покупок',
+        default=0,
+        editable=False,
+    )
+    # Суммы по ингредиентам рецепта, их пересчитывает recipes.nutrition.
+    total_kcal = models.DecimalField(
+        'Калорийность, ккал',
+        max_digits=14,
+        decimal_places=2,
+        default=0,
+        editable=False,
+    )
+    total_protein = models.DecimalField(
+        'Белки, г',
+        max_digits=14,
+        decimal_places=2,
+        default=0,
+        editable=False,
+    )
+    total_fat = models.DecimalField(
+        'Жиры, г',
+        max_digits=14,
+        decimal_places=2,
+        default=0,
+        editable=False,
+    )
+    total_carbs = models.DecimalField(
+        'Углеводы, г',
+        max_digits=14,
+        decimal_places=2,
+        default=0,
+        editable=False,
+    )
+    total_price = models.DecimalField(
+        'Стоимость, руб.',
+        max_digits=14,
+        decimal_places=2,
+        default=0,
+        editable=False,
+    )
+    search_vector = SearchVectorField(
+        'Поисковый вектор',
+        null=True,
+        editable=False,
+    )
+    updated_at = models.DateTimeField(
+        'Дата изменения',
+        auto_now=True,
+        db_index=True,
+    )
+
+    PRESERVED_FIELDS = (
+        'favorites_count', 'in_carts_count', 'image_variants', 'search_vector',
+    )
 
     class Meta:
         ordering = ('name',)
         verbose_name = 'Рецепт'
         verbose_name_plural = 'Рецепты'
+        indexes = [
+            models.Index(
+                fields=['author', '-id'],
+                name='recipe_author_id_idx',
+            ),
+            models.Index(
+                models.F('author'), MD5('text'),
+                name='recipe_author_text_md5_idx',
+            ),
+            models.Index(
+                fields=['-favorites_count', '-id'],
+                name='recipe_favorites_count_idx',
+            ),
+            models.Index(
+                fields=['total_kcal', '-id'],
+                name='recipe_total_kcal_idx',
+            ),
+            models.Index(
+                fields=['total_price', '-id'],
+                name='recipe_total_price_idx',
+            ),
+        ]
 
     def __str__(self):
         return leight_field(self.name)
 
+    def save(self, *args, update_fields=None, **kwargs):
+        """
+        Сохраняет рецепт, не перезаписывая поля, которые меняются
+        отдельными запросами UPDATE: счётчики (recipes.counters),
+        уменьшенные копии изображения (api.images) и поисковый вектор
+        (триггер БД).
+        """
+        super().save(*args, update_fields=update_fields_except(
+            self, update_fields, self.PRESERVED_FIELDS
+        ), **kwargs)
+
 
 class IngredientInRecipe(models.Model):
     """Модель для хранения связей между рецептами и ингредиентами."""
@@ -210,6 +365,11 @@ class ShopingCartAndFavoriteRecipe(models.Model):
         related_name='favorited_by',
         verbose_name='Рецепт'
     )
+    created = models.DateTimeField(
+        'Дата добавления',
+        auto_now_add=True,
+        db_index=True,
+    )
 
     class Meta:
         abstract = True
@@ -260,3 +420,133 @@ class ShopingCart(ShopingCartAndFavoriteRecipe):
         verbose_name = 'Корзина'
         verbose_name_plural = 'Корзины'
         unique_together = ('user', 'recipe')
+
+
+class ShoppingListItem(models.Model):
+    """
+    Строка списка покупок пользователя: суммарное количество ингредиента
+    по всем рецептам в корзине. Совместимые единицы измерения
+    приведены к базовой (кг - к г, л - к мл).
+    Список поддерживается recipes.shopping_list при изменении корзины
+    и ингредиентов рецептов.
+    """
+
+    user = models.ForeignKey(
+        FoodgramUser,
+        on_delete=models.CASCADE,
+        related_name='shopping_list',
+        verbose_name='Пользователь'
+    )
+    name = models.CharField('Название ингредиента', max_length=200)
+    measurement_unit = models.CharField('Единица измерения', max_length=200)
+    amount = models.PositiveBigIntegerField('Количество')
+
+    class Meta:
+        ordering = ('name',)
+        verbose_name = 'Строка списка покупок'
+        verbose_name_plural = 'Списки покупок'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'name', 'measurement_unit'],
+                name='shopping_list_item_unique',
+            )
+        ]
+
+    def __str__(self):
+        return format_string(self.user.username, self.name)
+
+
+class FeedItem(models.Model):
+    """
+    Рецепт в ленте подписчика автора. Строки создаются recipes.feed
+    при публикации рецепта и при подписке, поэтому лента читается
+    по индексу без соединения подписок с рецептами.
+    Рецепты авторов с большим числом подписчиков в ленты
+    не раскладываются и читаются при запросе ленты.
+    """
+
+    user = models.ForeignKey(
+        FoodgramUser,
+        on_delete=models.CASCADE,
+        related_name='feed',
+        verbose_name='Подписчик',
+        db_index=False,
+    )
+    recipe = models.ForeignKey(
+        Recipe,
+        on_delete=models.CASCADE,
+        related_name='feed_items',
+        verbose_name='Рецепт'
+    )
+    author = models.ForeignKey(
+        FoodgramUser,
+        on_delete=models.CASCADE,
+        related_name='+',
+        verbose_name='Автор'
+    )
+
+    class Meta:
+        verbose_name = 'Рецепт в ленте'
+        verbose_name_plural = 'Ленты рецептов'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'recipe'],
+                name='feed_item_unique',
+            )
+        ]
+        indexes = [
+            models.Index(
+                fields=['user', 'author'],
+                name='feed_item_user_author_idx',
+            ),
+        ]
+
+    def __str__(self):
+        return format_string(self.user.username, self.recipe.name)
+
+
+class RecipeScore(models.Model):
+    """
+    Рассчитанные оценки популярности рецепта.
+    popular - число добавлений в избранное и список покупок за всё время,
+    trending - то же с затуханием по времени в логарифмической шкале.
+    Строка есть у каждого рецепта: её создаёт сигнал при создании
+    рецепта, а для рецептов из bulk_create - refresh_scores. Оценки
+    обновляет команда refresh_recipe_scores.
+    """
+
+    recipe = models.OneToOneField(
+        Recipe,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='score',
+        verbose_name='Рецепт'
+    )
+    popular = models.FloatField('Популярность', default=0)
+    trending = models.FloatField('Популярность сейчас', default=0)
+    # Пусто, пока события рецепта ещё не учитывались.
+    events_until = models.DateTimeField(
+        'Учтены события до',
+        null=True,
+        blank=True,
+        db_index=True,
+    )
+
+    class Meta:
+        verbose_name = 'Оценка рецепта'
+        verbose_name_plural = 'Оценки рецептов'
+        # Индексы совпадают с сортировкой ordering=-popular и -trending
+        # (id рецепта при равных оценках), по ним читается страница.
+        indexes = [
+            models.Index(
+                fields=['-popular', '-recipe'],
+                name='recipe_score_popular_idx',
+            ),
+            models.Index(
+                fields=['-trending', '-recipe'],
+                name='recipe_score_trending_idx',
+            ),
+        ]
+
+    def __str__(self):
+        return leight_field(self.recipe.name)
@@ -0,0 +1,150 @@
+from decimal import ROUND_HALF_UP, Decimal
+from functools import partial
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import DecimalField, F, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+
+from .counters import touch
+from .models import IngredientInRecipe, Recipe, ShopingCart
+
+# Пищевая ценность и цена ингредиента задаются на одну единицу
+# измерения, у рецепта хранятся суммы в полях total_<название>.
+NUTRIENTS = ('kcal', 'protein', 'fat', 'carbs', 'price')
+CENT = Decimal('0.01')
+# Атрибут соединения с БД: id рецептов, ждущих пересчёта после фиксации
+# транзакции, и обработчик on_commit, который их пересчитает.
+PENDING_ATTR = 'nutrition_pending_recompute'
+
+
+def total_field(nutrient):
+    return f'total_{nutrient}'
+
+
+def totals(rows):
+    """
+    Суммы для рецепта по строкам (ингредиент, количество).
+    Считаются в памяти по уже загруженным ингредиентам.
+    """
+    sums = dict.fromkeys(NUTRIENTS, Decimal(0))
+    for ingredient, amount in rows:
+        for nutrient in NUTRIENTS:
+            sums[nutrient] += getattr(ingredient, nutrient) * amount
+    return {
+        total_field(nutrient): value.quantize(CENT, ROUND_HALF_UP)
+        for nutrient, value in sums.items()
+    }
+
+
+def total_subquery(nutrient):
+    """Подзапрос с суммой по ингредиентам рецепта из внешнего запроса."""
+    output_field = DecimalField(max_digits=14, decimal_places=2)
+    return Coalesce(Subquery(
+        IngredientInRecipe.objects.filter(
+            recipe=OuterRef('pk')
+        ).order_by().values('recipe').annotate(total=Sum(
+            F('amount') * F(f'ingredient__{nutrient}'),
+            output_field=output_field,
+        )).values('total')
+    ), Value(Decimal(0)), output_field=output_field)
+
+
+def recompute(recipe_ids):
+    """
+    Пересчитывает суммы рецептов recipe_ids одним запросом UPDATE.
+    Применяется, когда ингредиенты рецепта изменены
+    не через create_update_recipes.
+    """
+    recipe_ids = list(recipe_ids)
+    if not recipe_ids:
+        return 0
+    return Recipe.objects.filter(pk__in=recipe_ids).update(**touch(Recipe, {
+        total_field(nutrient): total_subquery(nutrient)
+        for nutrient in NUTRIENTS
+    }))
+
+
+def pending_recompute(connection):
+    """
+    id рецептов, которые пересчитаются после фиксации текущей транзакции.
+    None, если пересчёт не запланирован или отменён откатом.
+    """
+    pending, callback = getattr(connection, PENDING_ATTR, (None, None))
+    if any(entry[1] is callback for entry in connection.run_on_commit):
+        return pending
+    return None
+
+
+def schedule_recompute(recipe_id):
+    """
+    Пересчитывает суммы рецепта после фиксации текущей транзакции.
+    Все изменённые в транзакции рецепты пересчитываются
+    одним запросом, сколько бы строк ингредиентов ни менялось.
+    """
+    connection = transaction.get_connection()
+    pending = pending_recompute(connection)
+    if pending is not None:
+        pending.add(recipe_id)
+        return
+    pending = {recipe_id}
+    callback = partial(recompute, pending)
+    setattr(connection, PENDING_ATTR, (pending, callback))
+    transaction.on_commit(callback)
+
+
+def discard_recompute(recipe_id):
+    """
+    Отменяет запланированный пересчёт рецепта: рецепт удалён
+    или его суммы уже сохранены вместе с ним.
+    """
+    pending = pending_recompute(transaction.get_connection())
+    if pending is not None:
+        pending.discard(recipe_id)
+
+
+def recipe_id_batches(ingredient_id):
+    """
+    id рецептов с ингредиентом пачками по NUTRITION_BATCH_SIZE.
+    Каждая пачка читается отдельным запросом по индексу
+    (ingredient, recipe), начиная после последнего id предыдущей.
+    """
+    last_id = 0
+    while True:
+        batch = list(IngredientInRecipe.objects.filter(
+            ingredient_id=ingredient_id, recipe_id__gt=last_id
+        ).order_by('recipe_id').values_list(
+            'recipe_id', flat=True
+        )[:settings.NUTRITION_BATCH_SIZE])
+        if not batch:
+            return
+        yield batch
+        last_id = batch[-1]
+
+
+def recompute_for_ingredient(ingredient_id, on_batch=None):
+    """
+    Пересчитывает суммы всех рецептов с ингредиентом после изменения
+    его пищевой ценности или цены. Каждая пачка пересчитывается
+    в своей короткой транзакции, после неё вызывается on_batch(ids).
+    Возвращает число пересчитанных рецептов.
+    """
+    total = 0
+    for batch in recipe_id_batches(ingredient_id):
+        with transaction.atomic():
+            total += recompute(batch)
+        if on_batch is not None:
+            on_batch(batch)
+    return total
+
+
+def cart_totals(user_id):
+    """
+    Суммы рецептов в корзине пользователя одним агрегирующим запросом
+    по уже посчитанным полям total_* рецептов.
+    """
+    sums = ShopingCart.objects.filter(user_id=user_id).aggregate(**{
+        total_field(nutrient): Sum(f'recipe__{total_field(nutrient)}')
+        for nutrient in NUTRIENTS
+    })
+    return {field: value or Decimal(0) for field, value in sums.items()}
@@ -0,0 +1,150 @@
+import math
+from collections import defaultdict
+from datetime import datetime, timezone as dt_timezone
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import (
+    ExpressionWrapper, F, FloatField, Max, OuterRef, Subquery)
+from django.utils import timezone
+
+from .models import FavoriteRecipe, Recipe, RecipeScore, ShopingCart
+
+# Точка отсчёта для затухания. Вклад события равен
+# weight * exp(decay * (t - EPOCH)) и растёт со временем события,
+# поэтому старые оценки не нужно пересчитывать: более свежие события
+# просто весят больше. Оценка хранится как логарифм суммы вкладов,
+# чтобы экспонента не переполнялась.
+EPOCH = datetime(2023, 1, 1, tzinfo=dt_timezone.utc).timestamp()
+
+
+def get_decay():
+    return math.log(2) / (settings.RECIPE_SCORE_HALF_LIFE_HOURS * 3600)
+
+
+def get_event_sources():
+    """Модели событий и их веса в оценке популярности."""
+    return (
+        (FavoriteRecipe, settings.RECIPE_SCORE_FAVORITE_WEIGHT),
+        (ShopingCart, settings.RECIPE_SCORE_CART_WEIGHT),
+    )
+
+
+def logaddexp(first, second):
+    """log(exp(first) + exp(second)) без переполнения."""
+    if first is None:
+        return second
+    high, low = max(first, second), min(first, second)
+    return high + math.log1p(math.exp(low - high))
+
+
+def trending_scores(since=None, until=None):
+    """
+    Логарифмические оценки trending по событиям в интервале
+    (since, until]. События читаются потоком без загрузки в память.
+    """
+    decay = get_decay()
+    scores = defaultdict(lambda: None)
+    for model, weight in get_event_sources():
+        events = model.objects.all()
+        if since is not None:
+            events = events.filter(created__gt=since)
+        if until is not None:
+            events = events.filter(created__lte=until)
+        offset = math.log(weight)
+        for recipe_id, created in events.values_list(
+            'recipe_id', 'created'
+        ).order_by().iterator(chunk_size=settings.RECIPE_SCORE_CHUNK_SIZE):
+            scores[recipe_id] = logaddexp(
+                scores[recipe_id],
+                decay * (created.timestamp() - EPOCH) + offset
+            )
+    return scores
+
+
+def popular_expression():
+    return ExpressionWrapper(
+        F('favorites_count') * settings.RECIPE_SCORE_FAVORITE_WEIGHT
+        + F('in_carts_count') * settings.RECIPE_SCORE_CART_WEIGHT,
+        output_field=FloatField()
+    )
+
+
+def refresh_popular():
+    """
+    Переносит оценку popular из счётчиков рецептов
+    одним запросом UPDATE для разошедшихся строк.
+    """
+    popular = Subquery(
+        Recipe.objects.filter(pk=OuterRef('pk')).annotate(
+            value=popular_expression()
+        ).values('value')
+    )
+    return RecipeScore.objects.exclude(popular=popular).update(
+        popular=popular
+    )
+
+
+def create_missing_scores():
+    """
+    Создаёт пустые оценки рецептов, у которых их нет: bulk_create
+    не отправляет сигнал, который создаёт оценку вместе с рецептом.
+    Рецепты читаются пачками по RECIPE_SCORE_CHUNK_SIZE.
+    """
+    created = 0
+    while True:
+        batch = list(Recipe.objects.filter(score__isnull=True).values_list(
+            'pk', flat=True
+        )[:settings.RECIPE_SCORE_CHUNK_SIZE])
+        if not batch:
+            return created
+        RecipeScore.objects.bulk_create(
+            [RecipeScore(recipe_id=pk) for pk in batch], ignore_conflicts=True
+        )
+        created += len(batch)
+
+
+def refresh_scores(full=False):
+    """
+    Обновляет таблицу оценок рецептов.
+    В обычном режиме учитываются только события после прошлого запуска
+    (максимального events_until), и меняются строки затронутых рецептов.
+    Удалённые события уменьшают trending только при полном пересчёте
+    (full=True), который стоит запускать раз в сутки.
+    Возвращает число обновлённых рецептов.
+    """
+    until = timezone.now()
+    since = None
+    if not full:
+        since = RecipeScore.objects.aggregate(
+            since=Max('events_until')
+        )['since']
+    full = since is None
+
+    scores = trending_scores(since, until)
+    with transaction.atomic():
+        create_missing_scores()
+        if full:
+            RecipeScore.objects.update(trending=0, events_until=None)
+        existing = RecipeScore.objects.select_for_update().in_bulk(
+            list(scores)
+        )
+
+        updated = []
+        for recipe_id, trending in scores.items():
+            score = existing.get(recipe_id)
+            if score is None:
+                # Рецепт удалён после чтения событий.
+                continue
+            if score.events_until is not None:
+                trending = logaddexp(score.trending, trending)
+            score.trending = trending
+            score.events_until = until
+            updated.append(score)
+
+        RecipeScore.objects.bulk_update(
+            updated, ('trending', 'events_until'),
+            batch_size=settings.RECIPE_SCORE_CHUNK_SIZE
+        )
+        refresh_popular()
+    return len(updated)
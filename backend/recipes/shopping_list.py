@@ -0,0 +1,184 @@
+from collections import Counter, defaultdict
+from itertools import islice
+
+from django.db import transaction
+from django.db.models import Sum
+
+from tasks.queue import task
+from users.models import FoodgramUser
+from .models import IngredientInRecipe, ShopingCart, ShoppingListItem
+
+# Совместимые единицы измерения приводятся к базовой:
+# единица -> (базовая единица, множитель).
+UNIT_CONVERSIONS = {
+    'г': ('г', 1),
+    'кг': ('г', 1000),
+    'мл': ('мл', 1),
+    'л': ('мл', 1000),
+}
+REBUILD_BATCH_SIZE = 500
+
+
+def normalize(measurement_unit, amount):
+    """Единица измерения и количество в базовых единицах."""
+    unit, factor = UNIT_CONVERSIONS.get(
+        measurement_unit.strip(), (measurement_unit, 1)
+    )
+    return unit, amount * factor
+
+
+def aggregate(rows):
+    """
+    Складывает строки (название, единица измерения, количество)
+    с приведением единиц. Возвращает Counter по (название, единица).
+    """
+    items = Counter()
+    for name, measurement_unit, amount in rows:
+        unit, amount = normalize(measurement_unit, amount)
+        items[name, unit] += amount
+    return items
+
+
+def recipe_items(recipe_id):
+    return recipes_items([recipe_id])
+
+
+def recipes_items(recipe_ids):
+    """Ингредиенты нескольких рецептов, сложенные одним запросом."""
+    return aggregate(IngredientInRecipe.objects.filter(
+        recipe_id__in=recipe_ids
+    ).values_list(
+        'ingredient__name', 'ingredient__measurement_unit', 'amount'
+    ))
+
+
+def lock_users(user_ids):
+    """
+    Блокирует записи пользователей до конца транзакции. Через них
+    упорядочиваются изменения списков покупок; порядок по id
+    исключает взаимную блокировку при пересборке нескольких списков.
+    """
+    list(FoodgramUser.objects.select_for_update().filter(
+        pk__in=user_ids
+    ).order_by('pk').values_list('pk'))
+
+
+@transaction.atomic
+def apply_changes(user_id, changes):
+    """
+    Прибавляет к списку покупок пользователя количества из changes
+    (словарь по (название, единица), значения могут быть отрицательными).
+    Строки пользователя блокируются через его запись, поэтому
+    параллельные изменения одного списка выполняются по очереди.
+    """
+    changes = {key: amount for key, amount in changes.items() if amount}
+    if not changes:
+        return
+    lock_users([user_id])
+
+    existing = {
+        (item.name, item.measurement_unit): item
+        for item in ShoppingListItem.objects.filter(
+            user_id=user_id, name__in={name for name, _ in changes}
+        )
+    }
+    created, updated, deleted = [], [], []
+    for (name, unit), amount in changes.items():
+        item = existing.get((name, unit))
+        if item is None:
+            if amount > 0:
+                created.append(ShoppingListItem(
+                    user_id=user_id, name=name, measurement_unit=unit,
+                    amount=amount
+                ))
+            continue
+        item.amount += amount
+        if item.amount > 0:
+            updated.append(item)
+        else:
+            deleted.append(item.pk)
+
+    ShoppingListItem.objects.bulk_create(created)
+    ShoppingListItem.objects.bulk_update(updated, ('amount',))
+    if deleted:
+        ShoppingListItem.objects.filter(pk__in=deleted).delete()
+
+
+def add_recipe(user_id, recipe_id):
+    """Добавляет ингредиенты рецепта в список покупок пользователя."""
+    apply_changes(user_id, recipe_items(recipe_id))
+
+
+def add_recipes(user_id, recipe_ids):
+    """Добавляет ингредиенты нескольких рецептов в список покупок."""
+    apply_changes(user_id, recipes_items(recipe_ids))
+
+
+def remove_recipe(user_id, recipe_id):
+    """Убирает ингредиенты рецепта из списка покупок пользователя."""
+    apply_changes(user_id, {
+        key: -amount for key, amount in recipe_items(recipe_id).items()
+    })
+
+
+@transaction.atomic
+def rebuild(user_ids):
+    """
+    Пересобирает списки покупок пользователей user_ids
+    по их корзинам одним агрегирующим запросом.
+    Пользователи блокируются до чтения корзин: изменение корзины,
+    зафиксированное между чтением и заменой строк, иначе бы потерялось.
+    """
+    user_ids = list(user_ids)
+    if not user_ids:
+        return
+    lock_users(user_ids)
+    rows = ShopingCart.objects.filter(user_id__in=user_ids).values_list(
+        'user_id',
+        'recipe__ingredient_recipe__ingredient__name',
+        'recipe__ingredient_recipe__ingredient__measurement_unit',
+    ).annotate(
+        amount=Sum('recipe__ingredient_recipe__amount')
+    ).order_by()
+
+    by_user = defaultdict(list)
+    for user_id, name, measurement_unit, amount in rows:
+        if name is not None:
+            by_user[user_id].append((name, measurement_unit, amount))
+
+    ShoppingListItem.objects.filter(user_id__in=user_ids).delete()
+    ShoppingListItem.objects.bulk_create([
+        ShoppingListItem(
+            user_id=user_id, name=name, measurement_unit=unit, amount=amount
+        )
+        for user_id, user_rows in by_user.items()
+        for (name, unit), amount in aggregate(user_rows).items()
+    ], batch_size=REBUILD_BATCH_SIZE)
+
+
+def schedule_rebuild_for_recipe(recipe_id):
+    """
+    Ставит пересборку списков покупок с рецептом в очередь фоновых задач.
+    Изменения ингредиентов одного рецепта, пока задача ждёт в очереди,
+    объединяются в одну пересборку.
+    """
+    rebuild_for_recipe.enqueue(
+        key=f'shopping-list-rebuild:{recipe_id}', recipe_id=recipe_id
+    )
+
+
+@task()
+def rebuild_for_recipe(recipe_id):
+    """
+    Пересобирает списки покупок всех пользователей,
+    у которых рецепт в корзине. Вызывается после изменения
+    ингредиентов рецепта.
+    """
+    user_ids = iter(ShopingCart.objects.filter(
+        recipe_id=recipe_id
+    ).values_list('user_id', flat=True))
+    while True:
+        batch = list(islice(user_ids, REBUILD_BATCH_SIZE))
+        if not batch:
+            return
+        rebuild(batch)
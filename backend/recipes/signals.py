@@ -0,0 +1,153 @@
+from django.db.models.signals import post_delete, post_save, pre_delete
+from django.dispatch import receiver
+
+from users.models import FoodgramUser
+from . import feed, nutrition, shopping_list
+from .counters import update_counters
+from .models import (
+    FavoriteRecipe, Follow, IngredientInRecipe, Recipe, RecipeScore,
+    ShopingCart)
+
+# Счётчики меняются запросом UPDATE с F(), поэтому post_save
+# у самих рецептов и пользователей при этом не отправляется.
+
+
+@receiver(post_save, sender=Recipe)
+def recipe_created(sender, instance, created, raw=False, **kwargs):
+    """Увеличивает счётчик рецептов автора."""
+    if created and not raw:
+        update_counters(FoodgramUser, [instance.author_id], recipes_count=1)
+
+
+@receiver(post_delete, sender=Recipe)
+def recipe_deleted(sender, instance, **kwargs):
+    """Уменьшает счётчик рецептов автора."""
+    update_counters(FoodgramUser, [instance.author_id], recipes_count=-1)
+
+
+@receiver(post_save, sender=Recipe)
+def score_recipe_created(sender, instance, created, raw=False, **kwargs):
+    """
+    Создаёт пустую оценку популярности рецепта: сортировка
+    по оценкам соединяет рецепты с оценками внутренним JOIN.
+    """
+    if created and not raw:
+        RecipeScore.objects.create(recipe=instance)
+
+
+@receiver(post_save, sender=FavoriteRecipe)
+def favorite_added(sender, instance, created, raw=False, **kwargs):
+    """Увеличивает счётчик добавлений рецепта в избранное."""
+    if created and not raw:
+        update_counters(Recipe, [instance.recipe_id], favorites_count=1)
+
+
+@receiver(post_delete, sender=FavoriteRecipe)
+def favorite_removed(sender, instance, **kwargs):
+    """Уменьшает счётчик добавлений рецепта в избранное."""
+    update_counters(Recipe, [instance.recipe_id], favorites_count=-1)
+
+
+@receiver(post_save, sender=ShopingCart)
+def cart_added(sender, instance, created, raw=False, **kwargs):
+    """Увеличивает счётчик добавлений рецепта в список покупок."""
+    if created and not raw:
+        update_counters(Recipe, [instance.recipe_id], in_carts_count=1)
+
+
+@receiver(post_delete, sender=ShopingCart)
+def cart_removed(sender, instance, **kwargs):
+    """Уменьшает счётчик добавлений рецепта в список покупок."""
+    update_counters(Recipe, [instance.recipe_id], in_carts_count=-1)
+
+
+@receiver(post_save, sender=Follow)
+def follow_added(sender, instance, created, raw=False, **kwargs):
+    """Увеличивает счётчики подписчиков автора и подписок пользователя."""
+    if created and not raw:
+        update_counters(FoodgramUser, [instance.author_id], followers_count=1)
+        update_counters(FoodgramUser, [instance.user_id], following_count=1)
+
+
+@receiver(post_delete, sender=Follow)
+def follow_removed(sender, instance, **kwargs):
+    """Уменьшает счётчики подписчиков автора и подписок пользователя."""
+    update_counters(FoodgramUser, [instance.author_id], followers_count=-1)
+    update_counters(FoodgramUser, [instance.user_id], following_count=-1)
+
+
+@receiver(post_save, sender=ShopingCart)
+def shopping_list_recipe_added(sender, instance, created, raw=False,
+                               **kwargs):
+    """Добавляет ингредиенты рецепта в список покупок."""
+    if created and not raw:
+        shopping_list.add_recipe(instance.user_id, instance.recipe_id)
+
+
+@receiver(pre_delete, sender=ShopingCart)
+def shopping_list_recipe_removed(sender, instance, **kwargs):
+    """
+    Убирает ингредиенты рецепта из списка покупок.
+    Используется pre_delete: при удалении самого рецепта его ингредиенты
+    удаляются в том же каскаде и в post_delete могут быть уже недоступны.
+    """
+    shopping_list.remove_recipe(instance.user_id, instance.recipe_id)
+
+
+@receiver(post_save, sender=IngredientInRecipe)
+@receiver(post_delete, sender=IngredientInRecipe)
+def shopping_list_recipe_changed(sender, instance, raw=False, **kwargs):
+    """Пересобирает списки покупок с изменённым рецептом."""
+    if raw:
+        return
+    shopping_list.schedule_rebuild_for_recipe(instance.recipe_id)
+
+
+@receiver(post_save, sender=IngredientInRecipe)
+@receiver(post_delete, sender=IngredientInRecipe)
+def nutrition_recipe_changed(sender, instance, raw=False, **kwargs):
+    """
+    Пересчитывает пищевую ценность и стоимость рецепта
+    после фиксации транзакции, один раз на рецепт.
+    create_update_recipes считает суммы сам и пересчёт отменяет.
+    """
+    if not raw:
+        nutrition.schedule_recompute(instance.recipe_id)
+
+
+@receiver(post_delete, sender=Recipe)
+def nutrition_recipe_deleted(sender, instance, **kwargs):
+    """
+    Отменяет пересчёт удалённого рецепта: его ингредиенты удаляются
+    каскадом раньше и успевают запланировать пересчёт.
+    """
+    nutrition.discard_recompute(instance.id)
+
+
+@receiver(post_save, sender=Recipe)
+def feed_recipe_created(sender, instance, created, raw=False, **kwargs):
+    """Добавляет новый рецепт в ленты подписчиков автора."""
+    if created and not raw:
+        feed.fan_out.enqueue(
+            key=f'feed-fan-out:{instance.pk}',
+            recipe_id=instance.pk, author_id=instance.author_id,
+        )
+
+
+@receiver(post_save, sender=Follow)
+def feed_follow_added(sender, instance, created, raw=False, **kwargs):
+    """Добавляет последние рецепты автора в ленту подписчика."""
+    if created and not raw:
+        feed.follow.enqueue(
+            user_id=instance.user_id, author_ids=[instance.author_id]
+        )
+
+
+@receiver(post_delete, sender=Follow)
+def feed_follow_removed(sender, instance, **kwargs):
+    """
+    Убирает рецепты автора из ленты бывшего подписчика.
+    Обработчик подключён после follow_removed и видит уже
+    уменьшенный счётчик подписчиков.
+    """
+    feed.unfollow(instance.user_id, instance.author_id)
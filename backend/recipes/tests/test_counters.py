@@ -0,0 +1,44 @@
+from api.utils import create_update_recipes
+from recipes.counters import update_counters
+from recipes.models import Recipe
+from users.models import FoodgramUser
+
+
+def test_recipe_save_keeps_concurrent_counter_updates(author, make_recipes):
+    recipe = Recipe.objects.get(pk=make_recipes(author, 1)[0].pk)
+    update_counters(Recipe, [recipe.pk], favorites_count=1, in_carts_count=2)
+    Recipe.objects.filter(pk=recipe.pk).update(
+        image_variants={'source': 'recipes/image.png'}
+    )
+
+    recipe.name = 'Новое название'
+    recipe.save()
+
+    recipe.refresh_from_db()
+    assert recipe.name == 'Новое название'
+    assert recipe.favorites_count == 1
+    assert recipe.in_carts_count == 2
+    assert recipe.image_variants == {'source': 'recipes/image.png'}
+
+
+def test_user_save_keeps_concurrent_counter_updates(user):
+    user = FoodgramUser.objects.get(pk=user.pk)
+    update_counters(FoodgramUser, [user.pk], followers_count=3)
+
+    user.set_password('new-foodgram-password')
+    user.save()
+
+    user.refresh_from_db()
+    assert user.followers_count == 3
+    assert user.check_password('new-foodgram-password')
+
+
+def test_recipe_update_saves_only_changed_fields(author, make_recipes):
+    recipe = Recipe.objects.get(pk=make_recipes(author, 1)[0].pk)
+    update_counters(Recipe, [recipe.pk], favorites_count=1)
+
+    create_update_recipes({'name': 'Новое название'}, {}, instance=recipe)
+
+    recipe.refresh_from_db()
+    assert recipe.name == 'Новое название'
+    assert recipe.favorites_count == 1
@@ -0,0 +1,37 @@
+from recipes import feed
+from recipes.models import FeedItem, Follow
+
+
+def test_recipes_stay_in_feed_when_author_stops_being_popular(
+    settings, user, author, make_user, make_recipes, run_tasks
+):
+    settings.FEED_FANOUT_MAX_FOLLOWERS = 1
+    other = make_user('other')
+    Follow.objects.create(user=user, author=author)
+    Follow.objects.create(user=other, author=author)
+    recipe = make_recipes(author, 1)[0]
+    run_tasks()
+
+    # Подписчиков больше порога: рецепт читается при запросе ленты.
+    assert not FeedItem.objects.filter(recipe=recipe).exists()
+    assert feed.recipe_ids(user.id) == [recipe.id]
+
+    Follow.objects.get(user=other, author=author).delete()
+    run_tasks()
+
+    assert feed.recipe_ids(user.id) == [recipe.id]
+    assert FeedItem.objects.filter(user=user, recipe=recipe).exists()
+
+
+def test_fan_out_for_author_below_threshold(
+    user, author, make_recipes, run_tasks
+):
+    Follow.objects.create(user=user, author=author)
+    recipes = make_recipes(author, 2)
+    run_tasks()
+
+    assert feed.recipe_ids(user.id) == [recipes[1].id, recipes[0].id]
+
+    Follow.objects.get(user=user, author=author).delete()
+
+    assert feed.recipe_ids(user.id) == []
@@ -0,0 +1,85 @@
+import pytest
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+
+from api.utils import create_update_recipes
+from recipes.models import Ingredient, Recipe
+
+
+def recompute_queries(queries):
+    """Запросы nutrition.recompute: UPDATE рецептов с суммой подзапросом."""
+    return [
+        query for query in queries.captured_queries
+        if query['sql'].startswith('UPDATE') and 'SUM(' in query['sql']
+    ]
+
+
+def test_ingredient_changes_recomputed_once(
+    author, make_recipes, django_capture_on_commit_callbacks
+):
+    recipe, = make_recipes(author, 1)
+    Ingredient.objects.update(kcal=10)
+    first, second, _ = recipe.ingredient_recipe.order_by('amount')
+
+    with CaptureQueriesContext(connection) as queries:
+        with django_capture_on_commit_callbacks(execute=True):
+            first.delete()
+            second.amount = 5
+            second.save()
+
+    assert len(recompute_queries(queries)) == 1
+    recipe.refresh_from_db()
+    assert recipe.total_kcal == (5 + 3) * 10
+
+
+def test_recipe_delete_skips_recompute(
+    author, make_recipes, django_capture_on_commit_callbacks
+):
+    recipe, = make_recipes(author, 1)
+
+    with CaptureQueriesContext(connection) as queries:
+        with django_capture_on_commit_callbacks(execute=True):
+            recipe.delete()
+
+    assert recompute_queries(queries) == []
+    assert not Recipe.objects.exists()
+
+
+def test_recipe_update_saves_totals_without_recompute(
+    author, make_recipes, django_capture_on_commit_callbacks
+):
+    recipe, = make_recipes(author, 1)
+    Ingredient.objects.update(kcal=10)
+    ingredient = Ingredient.objects.get(
+        pk=recipe.ingredient_recipe.order_by('amount')[0].ingredient_id
+    )
+
+    with CaptureQueriesContext(connection) as queries:
+        with django_capture_on_commit_callbacks(execute=True):
+            create_update_recipes(
+                {'ingredientin_recipe': [{'id': ingredient.id, 'amount': 4}]},
+                {ingredient.id: ingredient}, instance=recipe,
+            )
+
+    assert recompute_queries(queries) == []
+    recipe.refresh_from_db()
+    assert recipe.total_kcal == 40
+    assert recipe.ingredient_recipe.count() == 1
+
+
+def test_recompute_scheduled_again_after_rollback(
+    author, make_recipes, django_capture_on_commit_callbacks
+):
+    recipe, = make_recipes(author, 1)
+    Ingredient.objects.update(kcal=10)
+    first, second, _ = recipe.ingredient_recipe.order_by('amount')
+
+    with django_capture_on_commit_callbacks(execute=True):
+        with pytest.raises(ValueError):
+            with transaction.atomic():
+                first.delete()
+                raise ValueError
+        second.delete()
+
+    recipe.refresh_from_db()
+    assert recipe.total_kcal == (1 + 3) * 10
@@ -0,0 +1,33 @@
+from io import StringIO
+
+from django.core.management import call_command
+
+from recipes.models import FavoriteRecipe, Recipe, RecipeScore
+from recipes.scores import refresh_scores
+
+
+def test_recipe_created_with_empty_score(author, make_recipes):
+    recipe, = make_recipes(author, 1)
+
+    score = RecipeScore.objects.get(recipe=recipe)
+    assert (score.popular, score.trending, score.events_until) == (0, 0, None)
+
+
+def test_refresh_scores_covers_every_recipe(user, author, make_recipes):
+    recipe, idle = make_recipes(author, 2)
+    RecipeScore.objects.filter(recipe=idle).delete()
+    FavoriteRecipe.objects.create(user=user, recipe=recipe)
+
+    assert refresh_scores() == 1
+
+    scores = RecipeScore.objects.in_bulk([recipe.id, idle.id])
+    assert scores[recipe.id].popular == 1
+    assert scores[recipe.id].trending > 0
+    assert scores[recipe.id].events_until is not None
+    assert scores[idle.id].popular == 0
+    assert scores[idle.id].events_until is None
+
+    trending = scores[recipe.id].trending
+    call_command('refresh_recipe_scores', '--full', stdout=StringIO())
+    assert RecipeScore.objects.get(recipe=recipe).trending == trending
+    assert RecipeScore.objects.count() == Recipe.objects.count()
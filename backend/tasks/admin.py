@@ -0,0 +1,18 @@
+from django.contrib import admin
+
+from .models import Task
+
+
+class TaskAdmin(admin.ModelAdmin):
+    list_display = (
+        'id', 'name', 'status', 'attempts', 'duration', 'created', 'finished'
+    )
+    list_filter = ('status', 'name')
+    search_fields = ('key',)
+    readonly_fields = (
+        'name', 'kwargs', 'key', 'attempts', 'locked_until', 'created',
+        'finished', 'duration', 'error',
+    )
+
+
+admin.site.register(Task, TaskAdmin)
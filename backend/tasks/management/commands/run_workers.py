@@ -0,0 +1,93 @@
+import multiprocessing
+import signal
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+
+from tasks.worker import work
+
+
+def worker_process(poll_interval):
+    """
+    Процесс-обработчик. Соединения родителя не используются повторно,
+    SIGINT игнорируется (его получает вся группа процессов), а по SIGTERM
+    обработчик дописывает текущую задачу и завершается.
+    """
+    connections.close_all()
+    stopping = []
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    signal.signal(signal.SIGTERM, lambda signum, frame: stopping.append(1))
+    work(lambda: bool(stopping), poll_interval)
+    connections.close_all()
+
+
+class Command(BaseCommand):
+    help = (
+        'Запускает обработчики фоновых задач в отдельных процессах. '
+        'Упавший процесс перезапускается. По SIGTERM или Ctrl+C '
+        'обработчики дописывают текущие задачи и завершаются.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--processes', type=int, default=settings.TASKS_WORKERS,
+            help='Число процессов-обработчиков.'
+        )
+        parser.add_argument(
+            '--poll-interval', type=float,
+            default=settings.TASKS_POLL_INTERVAL,
+            help='Пауза при пустой очереди, в секундах.'
+        )
+        parser.add_argument(
+            '--burst', action='store_true',
+            help='Выполнить задачи из очереди в текущем процессе и выйти.'
+        )
+
+    def handle(self, *args, **options):
+        if options['burst']:
+            processed = work(lambda: False, 0, burst=True)
+            self.stdout.write(self.style.SUCCESS(
+                f'Выполнено задач: {processed}.'
+            ))
+            return
+        if options['processes'] < 1:
+            raise CommandError('Нужен хотя бы один процесс.')
+
+        self.stopping = False
+        signal.signal(signal.SIGTERM, self.stop)
+        signal.signal(signal.SIGINT, self.stop)
+        connections.close_all()
+        processes = [
+            self.start(options['poll_interval'])
+            for _ in range(options['processes'])
+        ]
+        self.stdout.write(f'Запущено обработчиков: {len(processes)}.')
+        while not self.stopping:
+            time.sleep(1)
+            for number, process in enumerate(processes):
+                if not process.is_alive() and not self.stopping:
+                    self.stderr.write(
+                        f'Обработчик {process.pid} завершился с кодом '
+                        f'{process.exitcode}, перезапуск.'
+                    )
+                    processes[number] = self.start(options['poll_interval'])
+
+        for process in processes:
+            if process.is_alive():
+                process.terminate()
+        for process in processes:
+            process.join()
+        self.stdout.write('Обработчики остановлены.')
+
+    def start(self, poll_interval):
+        # Дочерние процессы наследуют настроенный Django через fork.
+        process = multiprocessing.get_context('fork').Process(
+            target=worker_process, args=(poll_interval,), daemon=True
+        )
+        process.start()
+        return process
+
+    def stop(self, signum, frame):
+        self.stopping = True
@@ -0,0 +1,83 @@
+from django.db import models
+from django.db.models import Q
+from django.utils import timezone
+
+
+class Task(models.Model):
+    """
+    Фоновая задача. Строка создаётся в транзакции, изменившей данные,
+    поэтому задача видна обработчикам только после её фиксации
+    и пропадает при откате.
+    """
+
+    QUEUED = 'queued'
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+    STATUS_CHOICES = [
+        (QUEUED, 'в очереди'),
+        (RUNNING, 'выполняется'),
+        (DONE, 'выполнена'),
+        (FAILED, 'ошибка'),
+    ]
+
+    name = models.CharField('Задача', max_length=200)
+    kwargs = models.JSONField('Аргументы', default=dict, blank=True)
+    key = models.CharField(
+        'Ключ идемпотентности',
+        max_length=200,
+        null=True,
+        blank=True,
+    )
+    status = models.CharField(
+        'Статус',
+        max_length=20,
+        choices=STATUS_CHOICES,
+        default=QUEUED,
+    )
+    attempts = models.PositiveSmallIntegerField('Попыток', default=0)
+    max_attempts = models.PositiveSmallIntegerField(
+        'Наибольшее число попыток', default=3
+    )
+    run_after = models.DateTimeField('Выполнить после', default=timezone.now)
+    locked_until = models.DateTimeField(
+        'Занята обработчиком до', null=True, blank=True
+    )
+    created = models.DateTimeField('Дата создания', auto_now_add=True)
+    finished = models.DateTimeField('Дата завершения', null=True, blank=True)
+    duration = models.FloatField('Время выполнения, с', null=True, blank=True)
+    error = models.TextField('Ошибка', blank=True)
+
+    class Meta:
+        ordering = ('-id',)
+        verbose_name = 'Фоновая задача'
+        verbose_name_plural = 'Фоновые задачи'
+        indexes = [
+            models.Index(
+                fields=['run_after', 'id'],
+                condition=Q(status='queued'),
+                name='task_queued_idx',
+            ),
+            models.Index(
+                fields=['locked_until'],
+                condition=Q(status='running'),
+                name='task_running_idx',
+            ),
+            models.Index(
+                fields=['finished'],
+                condition=Q(status='done'),
+                name='task_done_idx',
+            ),
+        ]
+        constraints = [
+            # Задача с тем же ключом, ещё не взятая в работу, выполнит
+            # и повторный запрос: она прочитает данные при запуске.
+            models.UniqueConstraint(
+                fields=['key'],
+                condition=Q(status='queued'),
+                name='task_queued_key_unique',
+            )
+        ]
+
+    def __str__(self):
+        return f'{self.name} ({self.get_status_display()})'
@@ -0,0 +1,64 @@
+import logging
+from collections import namedtuple
+from datetime import timedelta
+from functools import partial
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from .models import Task
+
+logger = logging.getLogger(__name__)
+
+TaskSpec = namedtuple('TaskSpec', 'function max_attempts timeout')
+
+_registry = {}
+
+
+def task(max_attempts=3, timeout=None):
+    """
+    Регистрирует функцию как фоновую задачу. Функция остаётся обычной,
+    а её постановка в очередь доступна как function.enqueue(key, **kwargs).
+    Аргументы передаются только именованными и должны сериализоваться
+    в JSON. timeout в секундах, по умолчанию TASKS_DEFAULT_TIMEOUT.
+    """
+    def decorator(function):
+        name = f'{function.__module__}.{function.__name__}'
+        _registry[name] = TaskSpec(
+            function, max_attempts, timeout or settings.TASKS_DEFAULT_TIMEOUT
+        )
+        function.enqueue = partial(enqueue, name)
+        return function
+    return decorator
+
+
+def get_task(name):
+    return _registry.get(name)
+
+
+def enqueue(name, key=None, delay=0, **kwargs):
+    """
+    Ставит задачу name в очередь одним INSERT в текущей транзакции.
+    Если задача с таким же key ещё ждёт в очереди, новая не создаётся.
+    При TASKS_EAGER задача выполняется в этом же процессе сразу
+    после фиксации транзакции, без повторов.
+    """
+    spec = _registry[name]
+    if settings.TASKS_EAGER:
+        transaction.on_commit(lambda: run_eager(name, spec, kwargs))
+        return
+    Task.objects.bulk_create([Task(
+        name=name,
+        kwargs=kwargs,
+        key=key,
+        max_attempts=spec.max_attempts,
+        run_after=timezone.now() + timedelta(seconds=delay),
+    )], ignore_conflicts=True)
+
+
+def run_eager(name, spec, kwargs):
+    try:
+        spec.function(**kwargs)
+    except Exception:
+        logger.exception('Задача %s завершилась ошибкой', name)
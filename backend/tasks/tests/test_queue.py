@@ -0,0 +1,120 @@
+from datetime import timedelta
+from io import StringIO
+
+import pytest
+from django.core.management import call_command
+from django.utils import timezone
+
+from tasks.models import Task
+from tasks.queue import task
+from tasks.worker import requeue_stale, run_next
+
+pytestmark = pytest.mark.django_db
+
+calls = []
+
+
+@task()
+def record(number):
+    calls.append(number)
+
+
+@task(max_attempts=3)
+def broken():
+    raise ValueError('Ошибка задачи.')
+
+
+@pytest.fixture(autouse=True)
+def clear_calls():
+    calls.clear()
+
+
+def make_task(status=Task.QUEUED, key=None, attempts=0, locked_until=None):
+    return Task.objects.create(
+        name='tasks.tests.test_queue.record', kwargs={'number': 0},
+        key=key, status=status, attempts=attempts, max_attempts=3,
+        locked_until=locked_until,
+    )
+
+
+def test_enqueue_skips_queued_key():
+    record.enqueue(key='record:1', number=1)
+    record.enqueue(key='record:1', number=2)
+    record.enqueue(key='record:2', number=3)
+    record.enqueue(number=4)
+    record.enqueue(number=5)
+
+    assert Task.objects.filter(key='record:1').count() == 1
+    assert Task.objects.count() == 4
+
+    Task.objects.filter(key='record:1').update(status=Task.RUNNING)
+    record.enqueue(key='record:1', number=6)
+
+    assert Task.objects.filter(key='record:1', status=Task.QUEUED).exists()
+
+
+def test_failed_task_retried_with_backoff():
+    broken.enqueue()
+
+    for delay in (10, 20):
+        started = timezone.now()
+        assert run_next()
+        retried = Task.objects.get()
+        assert retried.status == Task.QUEUED
+        assert 'Ошибка задачи.' in retried.error
+        assert (
+            started + timedelta(seconds=delay)
+            <= retried.run_after
+            <= timezone.now() + timedelta(seconds=delay)
+        )
+        assert not run_next()
+        Task.objects.update(run_after=timezone.now())
+
+    assert run_next()
+    failed = Task.objects.get()
+    assert failed.status == Task.FAILED
+    assert failed.attempts == 3
+    assert failed.finished is not None
+
+
+def test_run_workers_burst_drains_queue():
+    for number in range(3):
+        record.enqueue(number=number)
+    record.enqueue(delay=60, number=3)
+    stdout = StringIO()
+
+    call_command('run_workers', '--burst', stdout=stdout)
+
+    assert sorted(calls) == [0, 1, 2]
+    assert Task.objects.filter(status=Task.DONE).count() == 3
+    assert Task.objects.filter(status=Task.QUEUED).count() == 1
+    assert 'Выполнено задач: 3.' in stdout.getvalue()
+
+
+def test_requeue_stale():
+    expired = timezone.now() - timedelta(seconds=1)
+    stale = make_task(Task.RUNNING, attempts=1, locked_until=expired)
+    exhausted = make_task(Task.RUNNING, attempts=3, locked_until=expired)
+    running = make_task(
+        Task.RUNNING, attempts=1,
+        locked_until=timezone.now() + timedelta(minutes=5),
+    )
+    make_task(key='queued')
+    duplicate_of_queued = make_task(
+        Task.RUNNING, key='queued', attempts=1, locked_until=expired
+    )
+    first, second = (
+        make_task(Task.RUNNING, key='stale', attempts=1, locked_until=expired)
+        for _ in range(2)
+    )
+
+    assert requeue_stale() == 2
+
+    statuses = dict(Task.objects.values_list('pk', 'status'))
+    assert statuses[stale.pk] == Task.QUEUED
+    assert statuses[first.pk] == Task.QUEUED
+    assert statuses[second.pk] == Task.FAILED
+    assert statuses[duplicate_of_queued.pk] == Task.FAILED
+    assert statuses[exhausted.pk] == Task.FAILED
+    assert statuses[running.pk] == Task.RUNNING
+    assert requeue_stale() == 0
@@ -0,0 +1,198 @@
+import logging
+import signal
+import threading
+import time
+import traceback
+from contextlib import contextmanager
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import IntegrityError, close_old_connections, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from api.metrics import record_task, registry
+from .models import Task
+from .queue import get_task
+
+logger = logging.getLogger(__name__)
+
+
+class TaskTimeout(Exception):
+    pass
+
+
+@contextmanager
+def time_limit(seconds):
+    """
+    Прерывает задачу исключением TaskTimeout через seconds секунд.
+    Работает только в главном потоке процесса на POSIX, иначе
+    зависшую задачу вернёт в очередь requeue_stale.
+    """
+    if (
+        not hasattr(signal, 'setitimer')
+        or threading.current_thread() is not threading.main_thread()
+    ):
+        yield
+        return
+
+    def interrupt(signum, frame):
+        raise TaskTimeout(f'Задача выполнялась дольше {seconds} с.')
+
+    previous = signal.signal(signal.SIGALRM, interrupt)
+    signal.setitimer(signal.ITIMER_REAL, seconds)
+    try:
+        yield
+    finally:
+        signal.setitimer(signal.ITIMER_REAL, 0)
+        signal.signal(signal.SIGALRM, previous)
+
+
+def claim():
+    """
+    Берёт в работу самую раннюю готовую задачу. Строка блокируется
+    с SKIP LOCKED, поэтому обработчики не ждут друг друга, а условный
+    UPDATE не даст взять задачу дважды и без блокировок (SQLite).
+    """
+    now = timezone.now()
+    with transaction.atomic():
+        task = Task.objects.select_for_update(skip_locked=True).filter(
+            status=Task.QUEUED, run_after__lte=now
+        ).order_by('run_after', 'id').first()
+        if task is None:
+            return None
+        spec = get_task(task.name)
+        timeout = spec.timeout if spec else settings.TASKS_DEFAULT_TIMEOUT
+        claimed = Task.objects.filter(pk=task.pk, status=Task.QUEUED).update(
+            status=Task.RUNNING,
+            attempts=F('attempts') + 1,
+            locked_until=now + timedelta(seconds=timeout),
+        )
+    if not claimed:
+        return None
+    task.attempts += 1
+    return task
+
+
+def execute(task):
+    """Выполняет задачу и записывает результат и метрики."""
+    spec = get_task(task.name)
+    wait = (timezone.now() - task.run_after).total_seconds()
+    started = time.monotonic()
+    try:
+        if spec is None:
+            raise LookupError(f'Неизвестная задача {task.name}.')
+        with time_limit(spec.timeout):
+            spec.function(**task.kwargs)
+    except Exception:
+        duration = time.monotonic() - started
+        logger.exception('Задача %s (%s) завершилась ошибкой',
+                         task.name, task.pk)
+        status = fail(task, duration, traceback.format_exc())
+    else:
+        duration = time.monotonic() - started
+        Task.objects.filter(pk=task.pk).update(
+            status=Task.DONE, finished=timezone.now(), duration=duration,
+            locked_until=None, error='',
+        )
+        status = Task.DONE
+    record_task(task.name, status, duration, wait)
+    return status
+
+
+def fail(task, duration, error):
+    """
+    Возвращает задачу в очередь с экспоненциальной задержкой
+    или, если попытки кончились, помечает её ошибкой.
+    Повтор не нужен, если в очереди уже есть задача с тем же ключом.
+    """
+    values = {
+        'status': Task.FAILED, 'finished': timezone.now(),
+        'duration': duration, 'locked_until': None, 'error': error,
+    }
+    if task.attempts < task.max_attempts:
+        delay = settings.TASKS_RETRY_DELAY * 2 ** (task.attempts - 1)
+        try:
+            with transaction.atomic():
+                Task.objects.filter(pk=task.pk).update(**{
+                    **values, 'status': Task.QUEUED, 'finished': None,
+                    'run_after': timezone.now() + timedelta(seconds=delay),
+                })
+            return Task.QUEUED
+        except IntegrityError:
+            pass
+    Task.objects.filter(pk=task.pk).update(**values)
+    return Task.FAILED
+
+
+def requeue_stale():
+    """
+    Возвращает в очередь задачи, обработчик которых завершился,
+    не успев записать результат. Задачи без оставшихся попыток
+    и с ключом, уже стоящим в очереди, помечаются ошибкой.
+    Задачи возвращаются по одной: из нескольких зависших задач
+    с одним ключом в очередь встанет только первая.
+    Возвращает число задач, вернувшихся в очередь.
+    """
+    stale = Task.objects.filter(
+        status=Task.RUNNING, locked_until__lt=timezone.now()
+    )
+    error = 'Обработчик не завершил задачу в отведённое время.'
+    failed = {'status': Task.FAILED, 'locked_until': None, 'error': error}
+    stale.filter(attempts__gte=F('max_attempts')).update(**failed)
+    requeued = 0
+    for pk in stale.order_by('id').values_list('pk', flat=True):
+        try:
+            with transaction.atomic():
+                requeued += stale.filter(pk=pk).update(
+                    status=Task.QUEUED, run_after=timezone.now(),
+                    locked_until=None, error=error
+                )
+        except IntegrityError:
+            stale.filter(pk=pk).update(**failed)
+    return requeued
+
+
+def purge():
+    """Удаляет выполненные задачи старше TASKS_KEEP_DONE секунд."""
+    return Task.objects.filter(
+        status=Task.DONE,
+        finished__lt=timezone.now() - timedelta(
+            seconds=settings.TASKS_KEEP_DONE
+        ),
+    ).delete()[0]
+
+
+def run_next():
+    """Выполняет одну задачу. Возвращает False, если очередь пуста."""
+    close_old_connections()
+    task = claim()
+    if task is None:
+        return False
+    execute(task)
+    return True
+
+
+def work(should_stop, poll_interval, burst=False):
+    """
+    Цикл обработчика: задачи выполняются по одной, при пустой очереди
+    обработчик ждёт poll_interval секунд. Раз в TASKS_MAINTENANCE_INTERVAL
+    зависшие задачи возвращаются в очередь, а старые удаляются.
+    burst завершает цикл, как только очередь опустеет.
+    Возвращает число выполненных задач.
+    """
+    processed = 0
+    maintained = 0.0
+    while not should_stop():
+        if time.monotonic() - maintained > settings.TASKS_MAINTENANCE_INTERVAL:
+            requeue_stale()
+            purge()
+            maintained = time.monotonic()
+        if run_next():
+            processed += 1
+        elif burst:
+            break
+        else:
+            time.sleep(poll_interval)
+    registry.flush(force=True)
+    return processed
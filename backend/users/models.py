@@ -7,6 +7,26 @@ USER_EMAIL_MAX_LENGTH = 254
 USER_USERNAME_MAX_LENGTH = 150
 
 
+def update_fields_except(instance, update_fields, excluded):
+    """
+    Поля для save() уже сохранённого объекта без полей excluded.
+    Такие поля меняются отдельными запросами UPDATE (например, счётчики
+    через F()), и полное сохранение перезаписало бы их значениями,
+    прочитанными до этих изменений.
+    Для нового объекта возвращает update_fields без изменений,
+    отложенные поля (defer, only) не сохраняются, как и в save().
+    """
+    if instance._state.adding:
+        return update_fields
+    if update_fields is None:
+        deferred = instance.get_deferred_fields()
+        update_fields = [
+            field.name for field in instance._meta.concrete_fields
+            if not field.primary_key and field.attname not in deferred
+        ]
+    return [field for field in update_fields if field not in excluded]
+
+
 class FoodgramUser(AbstractUser):
     """
     Модель пользователей.
@@ -48,6 +68,24 @@ class FoodgramUser(AbstractUser):
         max_length=128,
         verbose_name='Пароль'
     )
+    recipes_count = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        verbose_name='Количество рецептов'
+    )
+    followers_count = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        verbose_name='Количество подписчиков'
+    )
+    following_count = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        verbose_name='Количество подписок'
+    )
+
+    # Счётчики меняет recipes.counters запросами UPDATE через F().
+    COUNTER_FIELDS = ('recipes_count', 'followers_count', 'following_count')
 
     USERNAME_FIELD = 'email'
     REQUIRED_FIELDS = ('username', 'first_name', 'last_name', 'password')
@@ -60,6 +98,12 @@ class FoodgramUser(AbstractUser):
     def __str__(self):
         return self.username
 
+    def save(self, *args, update_fields=None, **kwargs):
+        """Сохраняет пользователя, не перезаписывая счётчики."""
+        super().save(*args, update_fields=update_fields_except(
+            self, update_fields, self.COUNTER_FIELDS
+        ), **kwargs)
+
     @property
     def is_user_role(self):
         return self.status == self.USER
@@ -70,4 +114,4 @@ class FoodgramUser(AbstractUser):
 
     @property
     def get_recipes_count(self):
-        return self.recipe.count()
+        return self.recipes_count